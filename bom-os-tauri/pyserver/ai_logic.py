@@ -1,66 +1,177 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import accuracy_score
-import joblib
 import os
 
+try:  # imported as part of the pyserver package
+    from .common import profiling
+    from .common.cancellation import checkpoint
+    from .common.memory_usage import track_peak_rss
+    from .model_registry import ModelRegistry, new_version_id
+    from .feedback_store import FeedbackStore
+except ImportError:  # run as a local module
+    from common import profiling  # type: ignore
+    from common.cancellation import checkpoint  # type: ignore
+    from common.memory_usage import track_peak_rss  # type: ignore
+    from model_registry import ModelRegistry, new_version_id  # type: ignore
+    from feedback_store import FeedbackStore  # type: ignore
+
 MODEL_DIR = "saved_models"
-MODEL_PATH = os.path.join(MODEL_DIR, "ai_model.joblib")
+MODEL_PATH = os.path.join(MODEL_DIR, "ai_model.joblib")  # single-file model written by older versions
 ENCODER_PATH = os.path.join(MODEL_DIR, "label_encoder.joblib")
+FEATURES = ['stan', 'minimum', 'ilośćBom', 'sprzedaż']
+PREDICTION_CHUNK_ROWS = 50_000  # rows scored per predict_proba call
+TRAINING_MAX_ROWS = 300_000  # larger training sets are subsampled (stratified by alert)
+TRAINING_MEMORY_BUDGET_MB = None  # optional cap on the estimated memory of the fit
+TRAINING_N_JOBS = -1  # trees are built on all cores
+MIN_ROWS_PER_CLASS = 2  # kept from every alert type, so the stratified split still works
+DRIFT_THRESHOLD = 0.01  # share of the training rows corrected since training that triggers a full retrain
+RETRAIN_AFTER_CORRECTIONS = 500  # ... or this many corrections, whichever comes first
+
+# Versioned models with an active-version pointer, shared by every process using MODEL_DIR
+registry = ModelRegistry(MODEL_DIR)
 
 def ensure_model_dir_exists():
     """Ensures the directory for saving models exists."""
     os.makedirs(MODEL_DIR, exist_ok=True)
 
-def train_and_save_model(df: pd.DataFrame, feedback_log_path: str):
+def estimate_training_rows(memory_budget_mb, n_features=len(FEATURES), n_jobs=TRAINING_N_JOBS):
+    """
+    Rough number of training rows that fit in memory_budget_mb: the float32 feature
+    matrix the trees are built on, the encoded labels, and the bootstrap sample
+    weights and index buffers of every tree being built in parallel.
+    """
+    workers = (os.cpu_count() or 1) if n_jobs is None or n_jobs < 0 else n_jobs
+    bytes_per_row = 4 * n_features + 8 + workers * 24
+    return max(1, int(memory_budget_mb * 2**20 // bytes_per_row))
+
+
+def stratified_sample(codes: np.ndarray, max_rows: int, random_state=42):
     """
-    Trains a RandomForest model on the provided DataFrame, incorporating feedback, and saves it.
+    Sorted positions of at most ~max_rows rows, drawn from every class in proportion
+    to its size (at least MIN_ROWS_PER_CLASS rows of each class are kept), or None
+    when all rows fit.
     """
+    n_rows = len(codes)
+    if n_rows <= max_rows:
+        return None
+    rng = np.random.default_rng(random_state)
+    counts = np.bincount(codes)
+    quotas = np.maximum(counts * max_rows // n_rows, np.minimum(counts, MIN_ROWS_PER_CLASS))
+    by_class = np.argsort(codes, kind="stable")
+    starts = np.cumsum(counts) - counts
+    picks = [rng.choice(by_class[start:start + count], size=quota, replace=False)
+             for start, count, quota in zip(starts, counts, quotas) if quota]
+    return np.sort(np.concatenate(picks))
+
+
+def train_and_save_model(df: pd.DataFrame, feedback_store: FeedbackStore = None, max_rows=TRAINING_MAX_ROWS,
+                         memory_budget_mb=TRAINING_MEMORY_BUDGET_MB, n_jobs=TRAINING_N_JOBS,
+                         progress_callback=None, should_cancel=None):
+    """
+    Trains a RandomForest model on the provided DataFrame, incorporating the latest
+    correction of every indeks from the feedback store, and saves it.
+
+    The trees are built on n_jobs cores (-1: all). Training sets above max_rows, or above
+    what memory_budget_mb is estimated to hold, are subsampled stratified by alert; the
+    row counts, fit time and peak memory end up in model_data['training_stats'].
+
+    progress_callback(progress, message) gets the progress (0..1) between stages and
+    training stops with TaskCancelled at the next of them once should_cancel() returns
+    True (see common.cancellation). The fit itself cannot be interrupted; a cancelled
+    run never saves a model.
+    """
+    def step(progress, message):
+        checkpoint(should_cancel, progress_callback, progress, message)
+
+    step(0.0, "Wczytywanie korekt użytkownika")
     ensure_model_dir_exists()
     
-    features = ['stan', 'minimum', 'ilośćBom', 'sprzedaż']
+    features = FEATURES
     target = 'alert'
 
     # --- Incorporate Feedback ---
-    training_df = df.copy()
-    if os.path.exists(feedback_log_path):
-        print(f"Znaleziono plik z informacjami zwrotnymi: {feedback_log_path}")
-        feedback_df = pd.read_csv(feedback_log_path)
-        
+    # df is only read from; a modified frame is created only when feedback is applied
+    training_df = df
+    feedback_rows = feedback_store.count() if feedback_store is not None else 0
+    if feedback_rows:
+        print(f"Znaleziono {feedback_rows} korekt w magazynie informacji zwrotnych.")
+        # One row per indeks (its latest correction), so the frames align one to one
+        feedback_df = feedback_store.latest()[['indeks', *features, target]]
+
         # Combine original data with feedback, giving precedence to feedback
         # We assume 'indeks' is a unique identifier for a row
-        if 'indeks' in training_df.columns and 'indeks' in feedback_df.columns:
-            training_df.set_index('indeks', inplace=True)
-            feedback_df.set_index('indeks', inplace=True)
+        if 'indeks' in training_df.columns:
+            training_df = training_df.set_index('indeks')
+            feedback_df = feedback_df.set_index('indeks')
+            # Categorical columns (compact mode) cannot take values outside their categories
+            for col in training_df.columns.intersection(feedback_df.columns):
+                if isinstance(training_df[col].dtype, pd.CategoricalDtype):
+                    training_df[col] = training_df[col].astype(object)
             training_df.update(feedback_df)
-            training_df.reset_index(inplace=True)
+            training_df = training_df.reset_index()
             print(f"Zaktualizowano {len(feedback_df)} wierszy na podstawie informacji zwrotnych.")
 
+    step(0.1, "Przygotowanie danych treningowych")
     # Ensure target is not all the same class
     if training_df[target].nunique() < 2:
         print("Not enough class diversity to train the model. Need at least 2 different alert types.")
-        return None, None
-
-    X = training_df[features]
-    y = training_df[target]
+        return None
 
-    # Encode target labels
+    # Encode target labels (on all rows, so the encoder knows every alert type)
     encoder = LabelEncoder()
-    y_encoded = encoder.fit_transform(y)
+    y_encoded = encoder.fit_transform(training_df[target])
 
+    # Cap the training set; only the sampled rows of the feature columns are copied
+    rows_total = len(training_df)
+    row_limit = max_rows
+    if memory_budget_mb is not None:
+        row_limit = min(row_limit or rows_total, estimate_training_rows(memory_budget_mb, len(features), n_jobs))
+    sample = stratified_sample(y_encoded, row_limit) if row_limit else None
+    if sample is not None:
+        X = training_df[features].take(sample)
+        y_encoded = y_encoded[sample]
+        print(f"Training on a stratified sample of {len(sample)} of {rows_total} rows.")
+    else:
+        X = training_df[features]
+
+    step(0.2, "Trenowanie modelu AI")
     # Split data for validation
     X_train, X_test, y_train, y_test = train_test_split(X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded)
 
     # Train model
-    model = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced')
-    model.fit(X_train, y_train)
+    model = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced', n_jobs=n_jobs)
+    with profiling.stage("ai_training", rows=len(X_train)), track_peak_rss() as memory:
+        fit_started = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_s = time.perf_counter() - fit_started
+    step(0.9, "Ocena modelu AI")
+    # Scoring is parallelised by chunk (_iter_chunks), not inside each predict_proba call
+    model.set_params(n_jobs=None)
 
     # Evaluate model
     y_pred = model.predict(X_test)
     accuracy = accuracy_score(y_test, y_pred)
     print(f"Model training complete. Accuracy on test set: {accuracy:.2f}")
+    training_stats = {
+        'rows_total': rows_total,
+        'rows_used': len(X),
+        'sampled': sample is not None,
+        'n_jobs': n_jobs,
+        'fit_s': round(fit_s, 3),
+        'peak_memory_mb': round(memory['peak_mb'], 1) if memory['peak_mb'] is not None else None,
+        'accuracy': round(float(accuracy), 4),
+        'feedback_rows': feedback_rows,  # corrections already learned by this model
+    }
+    print(f"Fit: {training_stats['fit_s']:.2f}s on {len(X_train)} rows, peak memory {training_stats['peak_memory_mb']} MB")
 
     # Create a DataFrame for feature importances
     importances_df = pd.DataFrame({
@@ -71,38 +182,322 @@ def train_and_save_model(df: pd.DataFrame, feedback_log_path: str):
     print("Feature Importances:")
     print(importances_df)
 
-    # Save model, encoder and importances
+    step(0.95, "Zapisywanie modelu AI")  # last point where cancelling leaves the active model unchanged
+    # Save model, encoder and importances as a new active version; the version also
+    # identifies this model in prediction caches
     model_data = {
         'model': model,
         'encoder': encoder,
-        'importances': importances_df
+        'importances': importances_df,
+        'training_stats': training_stats,
+        'version': new_version_id(),
     }
-    joblib.dump(model_data, MODEL_PATH)
-    print(f"Model data (model, encoder, importances) saved to {MODEL_PATH}")
+    registry.save(model_data)
+    print(f"Model data (model, encoder, importances) saved as version {model_data['version']} in {MODEL_DIR}")
     
     return model_data
 
 def load_model():
     """
-    Loads the trained model, label encoder, and feature importances from disk.
+    Returns the active model version (model, label encoder, feature importances,
+    version) or None. Cheap to call often: the model is loaded (memory-mapped) only
+    when another version has been activated, e.g. by training in another process.
+    A single-file model from older versions is imported into the registry first.
     """
-    if os.path.exists(MODEL_PATH):
-        model_data = joblib.load(MODEL_PATH)
-        print("AI model data loaded successfully.")
-        return model_data
-    return None
+    if registry.active_version() is None and os.path.exists(MODEL_PATH):
+        print(f"Importing {MODEL_PATH} into the model registry.")
+        registry.import_file(MODEL_PATH, remove=True)
+    return registry.current()
+
+def _predict_proba(model, X: pd.DataFrame):
+    """Encoded labels and class probabilities (columns follow model.classes_) of the rows of X."""
+    probabilities = model.predict_proba(X)
+    return model.classes_[probabilities.argmax(axis=1)], probabilities
 
-def predict_with_model(model, encoder, df: pd.DataFrame):
+
+def _iter_chunks(score, n_rows, chunk_rows, max_workers):
     """
-    Makes predictions on new data using the loaded model.
+    Runs score(start, stop) for consecutive chunks of rows on a thread pool (the trees
+    release the GIL) and yields the results in row order as soon as they are done.
+    Only a few chunks are in flight, so memory stays bounded.
+    """
+    chunk_rows = max(1, chunk_rows)
+    starts = range(0, n_rows, chunk_rows)
+    workers = min(max_workers or os.cpu_count() or 1, len(starts))
+    if workers <= 1:
+        for start in starts:
+            yield score(start, min(start + chunk_rows, n_rows))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="predict") as executor:
+        pending = deque()
+        try:
+            for start in starts:
+                pending.append(executor.submit(score, start, min(start + chunk_rows, n_rows)))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:  # the consumer stopped early
+                future.cancel()
+
+
+def _predict_proba_chunked(model, X: pd.DataFrame, chunk_rows=PREDICTION_CHUNK_ROWS, max_workers=None):
+    """_predict_proba of all rows of X, scored in parallel chunks."""
+    if not len(X):
+        return model.classes_[:0], np.empty((0, len(model.classes_)))
+    chunks = list(_iter_chunks(lambda start, stop: _predict_proba(model, X.iloc[start:stop]),
+                               len(X), chunk_rows, max_workers))
+    return np.concatenate([codes for codes, _ in chunks]), np.concatenate([proba for _, proba in chunks])
+
+
+class PredictionCache:
+    """
+    Encoded labels and class probabilities of one model version, keyed by a hash
+    of the feature row. Only feature vectors not seen before go to the model (each
+    distinct vector once); the cache is emptied when a model of another version is
+    used. Chunks of one frame may be scored concurrently - the lock is not held
+    while the model runs.
+    """
+    def __init__(self, max_entries=5_000_000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._reset(None)
+
+    def _reset(self, version):
+        self.version = version
+        self._keys = np.empty(0, dtype=np.uint64)  # sorted row hashes
+        self._codes = np.empty(0, dtype=np.int64)  # encoded label of each hash
+        self._probabilities = None  # class probabilities of each hash
+        self.hits = self.misses = 0  # rows of the last call served from the cache / distinct rows scored
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _lookup(self, hashes):
+        if not len(self._keys):
+            return np.zeros(len(hashes), dtype=np.int64), np.zeros(len(hashes), dtype=bool)
+        positions = np.minimum(np.searchsorted(self._keys, hashes), len(self._keys) - 1)
+        return positions, self._keys[positions] == hashes
+
+    def _insert(self, keys, codes, probabilities):
+        """Adds sorted, distinct keys (skipping those another call has added meanwhile)."""
+        _, present = self._lookup(keys)
+        keys, codes, probabilities = keys[~present], codes[~present], probabilities[~present]
+        if len(self._keys) + len(keys) > self.max_entries:
+            self._reset(self.version)  # keep the cache bounded - start over with this batch
+        if self._probabilities is None:
+            self._probabilities = np.empty((0, probabilities.shape[1]))
+        positions = np.searchsorted(self._keys, keys)
+        self._keys = np.insert(self._keys, positions, keys)
+        self._codes = np.insert(self._codes, positions, codes)
+        self._probabilities = np.insert(self._probabilities, positions, probabilities, axis=0)
+
+    def predict(self, model, version, X: pd.DataFrame, chunk_rows=PREDICTION_CHUNK_ROWS, max_workers=1):
+        """
+        Encoded labels and class probabilities for the rows of X, scoring only rows
+        missing from the cache (in chunks on max_workers threads).
+        """
+        hashes = pd.util.hash_pandas_object(X, index=False).to_numpy()
+        codes = np.empty(len(hashes), dtype=np.int64)
+        probabilities = np.empty((len(hashes), len(model.classes_)))
+        with self._lock:
+            if version != self.version:
+                self._reset(version)
+            positions, found = self._lookup(hashes)
+            if found.any():
+                codes[found] = self._codes[positions[found]]
+                probabilities[found] = self._probabilities[positions[found]]
+        missing = np.flatnonzero(~found)
+
+        distinct = missing[:0]
+        if len(missing):
+            # One model call for the distinct unseen feature vectors (first row of each hash)
+            by_hash = missing[np.argsort(hashes[missing], kind="stable")]
+            distinct = by_hash[np.r_[True, hashes[by_hash[1:]] != hashes[by_hash[:-1]]]]
+            new_keys = hashes[distinct]  # ascending
+            new_codes, new_probabilities = _predict_proba_chunked(model, X.iloc[distinct], chunk_rows, max_workers)
+            slots = np.searchsorted(new_keys, hashes[missing])
+            codes[missing] = new_codes[slots]
+            probabilities[missing] = new_probabilities[slots]
+
+        with self._lock:
+            if len(distinct) and self.version == version:
+                self._insert(new_keys, new_codes, new_probabilities)
+            self.hits, self.misses = len(hashes) - len(missing), len(distinct)
+        return codes, probabilities
+
+
+class CorrectionLayer:
+    """
+    User corrections from a FeedbackStore, applied on top of model predictions
+    without retraining. A correction is keyed by indeks and holds the features the
+    row had when it was corrected; it overrides the prediction (with confidence 1.0)
+    while the row still has those features. Only corrections newer than the last
+    ones read are fetched, including those made in another process.
+    """
+    def __init__(self, store: FeedbackStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self._last_id = 0  # newest correction read from the store
+        self._set(pd.DataFrame(columns=['indeks', *FEATURES, 'alert']), 0)
+
+    def _set(self, latest: pd.DataFrame, logged_rows):
+        self._latest = latest  # last correction of every indeks
+        self._index = pd.Index(latest['indeks'].astype(str))
+        self._features = latest[FEATURES].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        self._labels = latest['alert'].to_numpy(dtype=object)
+        self.logged_rows = logged_rows  # corrections in the store, superseded ones included
+
+    def _refresh(self):
+        last_id = self.store.last_id()
+        if last_id == self._last_id:
+            return
+        if last_id < self._last_id:  # another store (e.g. the database was replaced) - read it anew
+            self._last_id = 0
+            self._latest = self._latest.iloc[:0]
+        newer = self.store.latest(self._last_id)[['indeks', *FEATURES, 'alert']]
+        latest = pd.concat([self._latest, newer]) if len(self._latest) else newer
+        latest = latest.drop_duplicates('indeks', keep='last')
+        self._set(latest.reset_index(drop=True), self.store.count())
+        self._last_id = last_id
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+    def add(self, rows: pd.DataFrame, label):
+        """Stores rows (with label as their alert) as corrections; they apply from the next prediction on."""
+        with self._lock:
+            self.store.add(rows, label)
+            self._refresh()
+
+    @staticmethod
+    def _positions(index: pd.Index, indeks: pd.Series):
+        """Position in index of every row's indeks (-1: no correction)."""
+        if isinstance(indeks.dtype, pd.CategoricalDtype):
+            by_category = index.get_indexer(indeks.cat.categories.astype(str))
+            codes = indeks.cat.codes.to_numpy()
+            return np.where(codes >= 0, by_category[codes], -1)
+        values = indeks.to_numpy()
+        return index.get_indexer(values if values.dtype == object else values.astype(str))
+
+    def apply(self, df: pd.DataFrame, labels: np.ndarray, probabilities: np.ndarray = None, classes=None):
+        """
+        Overrides, in place, the labels of the rows of df matching a correction, and
+        their probabilities (columns follow classes) with certainty of the corrected
+        alert. Returns the number of corrected rows.
+        """
+        with self._lock:
+            self._refresh()
+            index, features, corrected = self._index, self._features, self._labels
+        if not len(index) or 'indeks' not in df.columns or not len(df):
+            return 0
+        positions = self._positions(index, df['indeks'])
+        rows = np.flatnonzero(positions >= 0)
+        if not len(rows):
+            return 0
+        current = df[FEATURES].iloc[rows].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        expected = features[positions[rows]]
+        unchanged = ((current == expected) | (np.isnan(current) & np.isnan(expected))).all(axis=1)
+        rows = rows[unchanged]
+        new_labels = corrected[positions[rows]]
+        labels[rows] = new_labels
+        if probabilities is not None and classes is not None:
+            columns = pd.Index(classes).get_indexer(new_labels)
+            known = columns >= 0
+            probabilities[rows[known]] = 0.0
+            probabilities[rows[known], columns[known]] = 1.0
+        return len(rows)
+
+    def pending(self, model_data):
+        """Corrections logged since model_data was trained (all of them for models without training stats)."""
+        stats = (model_data or {}).get('training_stats') or {}
+        with self._lock:
+            self._refresh()
+            return max(0, self.logged_rows - stats.get('feedback_rows', 0))
+
+    def needs_retraining(self, model_data, threshold=DRIFT_THRESHOLD, max_pending=RETRAIN_AFTER_CORRECTIONS):
+        """
+        True when the corrections since training have drifted far enough from the
+        model to rebuild it: threshold of its training rows, or max_pending corrections.
+        Models without training_stats (e.g. imported from older versions) use only the latter.
+        """
+        pending = self.pending(model_data)
+        if not pending:
+            return False
+        rows = ((model_data or {}).get('training_stats') or {}).get('rows_total')
+        if not rows:
+            return pending >= max_pending
+        return pending >= max_pending or pending / rows >= threshold
+
+
+def class_labels(model, encoder):
+    """Alert labels of the probability columns returned by iter_predictions."""
+    return encoder.inverse_transform(model.classes_)
+
+
+def iter_predictions(model, encoder, df: pd.DataFrame, cache: PredictionCache = None, model_version=None,
+                     chunk_rows=PREDICTION_CHUNK_ROWS, max_workers=None, corrections: CorrectionLayer = None):
+    """
+    Scores df in chunks of chunk_rows across cores and yields (start, labels,
+    probabilities) for every chunk in row order, as soon as it is done - e.g. to
+    fill a table progressively. Probability columns follow class_labels(model, encoder).
+    With a cache and model_version, rows this model version has already scored
+    come from the cache; user corrections override the predictions of their rows.
+    """
+    X = df[FEATURES]
+    classes = class_labels(model, encoder)
+
+    def score(start, stop):
+        chunk = X.iloc[start:stop]
+        if cache is not None and model_version is not None:
+            codes, probabilities = cache.predict(model, model_version, chunk)
+        else:
+            codes, probabilities = _predict_proba(model, chunk)
+        labels = encoder.inverse_transform(codes)
+        if corrections is not None:
+            corrections.apply(df.iloc[start:stop], labels, probabilities, classes)
+        return start, labels, probabilities
+
+    yield from _iter_chunks(score, len(X), chunk_rows, max_workers)
+
+
+def predict_with_probabilities(model, encoder, df: pd.DataFrame, cache: PredictionCache = None, model_version=None,
+                               chunk_rows=PREDICTION_CHUNK_ROWS, max_workers=None, corrections: CorrectionLayer = None):
+    """
+    Labels and class probabilities (columns follow class_labels) of all rows of df,
+    scored in chunks across cores; (None, None) without a model. With a cache, the
+    whole frame is looked up at once and only unseen feature vectors are scored.
+    User corrections (a CorrectionLayer) override the predictions of their rows.
     """
     if model is None or encoder is None:
-        return None
-        
-    features = ['stan', 'minimum', 'ilośćBom', 'sprzedaż']
-    X_new = df[features]
-    
-    predictions_encoded = model.predict(X_new)
-    predictions = encoder.inverse_transform(predictions_encoded)
-    
+        return None, None
+
+    X = df[FEATURES]
+    with profiling.stage("ai_prediction", rows=len(X)):
+        if cache is not None and model_version is not None:
+            codes, probabilities = cache.predict(model, model_version, X, chunk_rows, max_workers)
+        else:
+            codes, probabilities = _predict_proba_chunked(model, X, chunk_rows, max_workers)
+    labels = encoder.inverse_transform(codes)
+    if corrections is not None:
+        corrections.apply(df, labels, probabilities, class_labels(model, encoder))
+    return labels, probabilities
+
+
+def predict_with_model(model, encoder, df: pd.DataFrame, cache: PredictionCache = None, model_version=None,
+                       corrections: CorrectionLayer = None):
+    """
+    Makes predictions on new data using the loaded model.
+    With a PredictionCache and the model's version (model_data['version']),
+    rows whose features this model version has already scored come from the cache.
+    """
+    predictions, _ = predict_with_probabilities(model, encoder, df, cache, model_version, corrections=corrections)
     return predictions
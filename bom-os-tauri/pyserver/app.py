@@ -1,119 +1,565 @@
-import React, { useState } from 'react'
-
-type TableRow = Record<string, any>
-
-async function postJSON(url: string, payload: any) {
-  const res = await fetch(url, {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify(payload)
-  })
-  if (!res.ok) throw new Error(await res.text())
-  return res.json()
-}
-
-export default function App() {
-  const [rows, setRows] = useState<TableRow[]>([])
-  const [status, setStatus] = useState<string>('Gotowy')
-  const [aiInfo, setAiInfo] = useState<any>(null)
-  const [selectedRowIndex, setSelectedRowIndex] = useState<number | null>(null)
-
-  const handleProcess = async () => {
-    setStatus('Przetwarzanie...')
-    try {
-      const data = await postJSON('http://127.0.0.1:5005/process', {
-        stany: null, bomy: null, minimum: null, sprzedaz: null
-      })
-      setRows(data.rows || [])
-      setSelectedRowIndex(null)
-      setStatus('OK')
-    } catch (e:any) {
-      setStatus(e.message)
-    }
-  }
-
-  const handleTrain = async () => {
-    setStatus('Trenowanie...')
-    try {
-      const data = await postJSON('http://127.0.0.1:5005/train', {})
-      setAiInfo(data)
-      setStatus('Model zaktualizowany')
-    } catch (e:any) {
-      setStatus(e.message)
-    }
-  }
-
-  const handlePredict = async () => {
-    setStatus('Predykcja...')
-    try {
-      const data = await postJSON('http://127.0.0.1:5005/predict', { rows })
-      setRows(data.rows || rows)
-      setAiInfo({ importances: data.importances || null })
-      setStatus('Gotowe')
-    } catch (e:any) {
-      setStatus(e.message)
-    }
-  }
+"""
+Flask sidecar used by the Tauri frontend (http://127.0.0.1:5005).
+
+Processed tables stay in server memory under a dataset id returned by /process;
+/train, /predict, /forecast and /export refer to that id, so the table is never
+sent back by the client. Responses carry only a preview page of rows; /rows
+returns any sorted, filtered or searched window of a dataset. Tables are sent as
+JSON, or as an Arrow IPC stream to clients sending
+"Accept: application/vnd.apache.arrow.stream".
+
+/predict/stream scores a dataset chunk by chunk and streams each chunk as soon
+as it is done, so a table can be filled progressively.
+
+/train and /forecast run as jobs on a small worker pool; with "async": true they
+return a job id at once (progress via /jobs/<id> or the /jobs/<id>/events stream,
+cancellation via /jobs/<id>/cancel). Identical requests still in progress share
+one job, e.g. two forecasts of the same indeks share one model fit.
+"""
+import io
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from flask import Flask, Response, jsonify, request
+
+try:  # pyarrow is optional - without it every response is JSON
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# --- Imports: as a package (python -m pyserver.app) or as local modules (python pyserver/app.py) ---
+try:
+    from . import ai_logic
+    from . import forecasting_logic
+    from .common import data_processing
+    from .dataset_store import DatasetStore, FILTER_COLUMNS
+    from .feedback_store import FeedbackStore
+    from .jobs import JobManager, CANCELLED, DONE
+except ImportError:
+    import ai_logic  # type: ignore
+    import forecasting_logic  # type: ignore
+    from common import data_processing  # type: ignore
+    from dataset_store import DatasetStore, FILTER_COLUMNS  # type: ignore
+    from feedback_store import FeedbackStore  # type: ignore
+    from jobs import JobManager, CANCELLED, DONE  # type: ignore
+
+HOST = "127.0.0.1"
+PORT = 5005
+FEEDBACK_DB_PATH = "feedback.sqlite3"
+FEEDBACK_LOG_PATH = "feedback_log.csv"  # written by older versions; migrated into FEEDBACK_DB_PATH
+PREVIEW_ROWS = 200  # rows returned with /process and /predict unless "limit" is given
+MAX_PAGE_ROWS = 5000
+JSON_MIMETYPE = "application/json"
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MIMETYPE = "application/x-ndjson"
+ARROW_METADATA_KEY = b"bom_os"  # schema metadata entry holding the non-tabular part of a response
+INPUT_FILES = ("stany", "bomy", "minimum", "sprzedaz")
+JOB_WORKERS = 2
+EVENT_KEEPALIVE_S = 15
+STREAM_CHUNK_ROWS = 10_000  # rows per streamed prediction chunk
+# Origins of the Tauri webview (tauri://localhost; http(s)://tauri.localhost on Windows) and the Vite dev server.
+# Requests from any other origin are rejected, so a web page cannot drive the local sidecar.
+ALLOWED_ORIGINS = ("tauri://localhost", "http://tauri.localhost", "https://tauri.localhost",
+                   "http://localhost:5173", "http://127.0.0.1:5173")
+EXPORT_DIR = "exports"  # /export writes only below this directory
+
+app = Flask(__name__)
+datasets = DatasetStore()
+jobs = JobManager(max_workers=JOB_WORKERS)
+prediction_cache = ai_logic.PredictionCache()  # shared by all datasets; keyed by model version
+feedback_store = FeedbackStore(FEEDBACK_DB_PATH, legacy_csv_path=FEEDBACK_LOG_PATH)
+corrections = ai_logic.CorrectionLayer(feedback_store)  # user corrections applied on top of the model
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@app.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({"error": error.message}), error.status
+
+
+@app.before_request
+def reject_foreign_origin():
+    # Browsers send Origin with every cross-origin request; clients without one (the desktop app, scripts) are local
+    origin = request.headers.get("Origin")
+    if origin is not None and origin not in ALLOWED_ORIGINS:
+        return jsonify({"error": f"Niedozwolone pochodzenie żądania: {origin}"}), 403
+
+
+@app.after_request
+def allow_frontend_origin(response):
+    # The webview (tauri://localhost or the Vite dev server) has a different origin than the sidecar.
+    origin = request.headers.get("Origin")
+    if origin in ALLOWED_ORIGINS:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, DELETE, OPTIONS"
+    response.vary.add("Origin")
+    return response
+
+
+def current_model_data():
+    """
+    The active model version from the registry. A model trained by another process
+    (e.g. the desktop app) is picked up on the next request; requests already
+    predicting keep the model they started with.
+    """
+    return ai_logic.load_model()
+
+
+def records(df: pd.DataFrame):
+    """JSON-safe list of row dicts (NaN -> null, timestamps as ISO strings)."""
+    return json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+
+
+def arrow_table(df: pd.DataFrame):
+    # Narrow types make the stream smaller: repeated labels become dictionary-encoded
+    # and integers fit JS numbers instead of BigInt
+    df = data_processing.compact_dtypes(df)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        # columns mixing numbers and text cannot be typed - send them as text
+        mixed = {
+            col: df[col].astype("str") for col in df.columns
+            if df[col].dtype == object or isinstance(df[col].dtype, pd.CategoricalDtype)
+        }
+        return pa.Table.from_pandas(df.assign(**mixed), preserve_index=False)
+
+
+def wants_arrow():
+    # JSON is listed first, so it wins for "*/*" and any other tie
+    return pa is not None and request.accept_mimetypes.best_match([JSON_MIMETYPE, ARROW_STREAM_MIMETYPE]) == ARROW_STREAM_MIMETYPE
+
+
+def table_response(meta: dict, df: pd.DataFrame):
+    """
+    Rows of df plus metadata, as JSON ({**meta, "rows": [...]}) or - if the client
+    accepts it - as an Arrow IPC stream of the columns with meta stored as JSON
+    in the schema metadata under ARROW_METADATA_KEY.
+    """
+    if not wants_arrow():
+        response = jsonify({**meta, "rows": records(df)})
+    else:
+        table = arrow_table(df)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            ARROW_METADATA_KEY: json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8"),
+        })
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        response = Response(sink.getvalue(), mimetype=ARROW_STREAM_MIMETYPE)
+    response.vary.add("Accept")
+    return response
+
+
+def payload():
+    return request.get_json(silent=True) or {}
+
+
+def require_dataset(body):
+    dataset_id = body.get("dataset_id")
+    if not dataset_id:
+        raise ApiError("Brak 'dataset_id' - najpierw wywołaj /process.")
+    dataset = datasets.get(dataset_id)
+    if dataset is None:
+        raise ApiError(f"Nieznany lub wygasły zbiór danych: {dataset_id}", 404)
+    return dataset
+
+
+def int_param(body, name, default, maximum=None):
+    try:
+        value = max(0, int(body.get(name, default)))
+    except (TypeError, ValueError):
+        raise ApiError(f"'{name}' musi być liczbą całkowitą.")
+    return min(value, maximum) if maximum is not None else value
+
+
+def preview_limit(body):
+    return int_param(body, "limit", PREVIEW_ROWS, MAX_PAGE_ROWS)
+
+
+def with_predictions(df: pd.DataFrame, model_data):
+    """
+    Returns df with fresh ai_alert and ai_confidence (probability of the predicted
+    alert) columns - a new frame; the stored one is never mutated.
+    """
+    if not model_data or df.empty:
+        return df
+    labels, probabilities = ai_logic.predict_with_probabilities(
+        model_data.get("model"), model_data.get("encoder"), df, prediction_cache, model_data.get("version"),
+        corrections=corrections,
+    )
+    return df.assign(ai_alert=labels, ai_confidence=probabilities.max(axis=1))
+
+
+def importances_payload(model_data):
+    importances = (model_data or {}).get("importances")
+    return records(importances) if importances is not None else None
+
+
+@app.get("/health")
+def health():
+    return jsonify({"status": "ok", "datasets": len(datasets), "model_loaded": current_model_data() is not None})
+
+
+@app.post("/process")
+def process():
+    body = payload()
+    paths = {f"{name}_path": body.get(name) or None for name in INPUT_FILES}
+    if not paths["stany_path"]:
+        raise ApiError("Plik 'stany' jest wymagany.")
+
+    df, monthly_sales_df = data_processing.process_data_files(**paths, compact=bool(body.get("compact", False)))
+    if df.empty:
+        raise ApiError("Nie udało się przetworzyć plików wejściowych.", 422)
+
+    try:
+        df = with_predictions(df, current_model_data())
+    except Exception as e:
+        print(f"Prediction failed: {e}")
+
+    dataset = datasets.add(df, monthly_sales_df, source={name: body.get(name) for name in INPUT_FILES})
+    threading.Thread(target=dataset.warm_up, daemon=True).start()
+    return table_response(dataset.describe(), df.head(preview_limit(body)))
+
+
+@app.post("/rows")
+def rows():
+    """
+    Window of a stored dataset: {"dataset_id", "offset", "limit", "sort", "descending",
+    "filters": {"alert"|"bom"|"ai_alert": value}, "search": substring of nazwa/indeks}.
+    """
+    body = payload()
+    dataset = require_dataset(body)
+    sort = body.get("sort") or None
+    if sort is not None and sort not in dataset.df.columns:
+        raise ApiError(f"Nieznana kolumna sortowania: {sort}")
+    filters = {col: str(value) for col, value in (body.get("filters") or {}).items() if value not in (None, "")}
+    unknown = [col for col in filters if col not in FILTER_COLUMNS or col not in dataset.df.columns]
+    if unknown:
+        raise ApiError(f"Nie można filtrować po kolumnach: {', '.join(unknown)}")
+
+    offset = int_param(body, "offset", 0)
+    window, total = dataset.rows(
+        offset, preview_limit(body),
+        sort=sort, descending=bool(body.get("descending")), filters=filters, search=body.get("search") or None,
+    )
+    return table_response({
+        "dataset_id": dataset.id,
+        "row_count": len(dataset.df),
+        "total": total,
+        "offset": offset,
+    }, window)
+
 
-  const handleForecast = async () => {
-    if (selectedRowIndex === null) {
-      setStatus('Błąd: Proszę zaznaczyć wiersz w tabeli, aby wygenerować prognozę.')
-      return
+def run_job(body, kind, fn, *args, key):
+    """
+    Runs fn(job, *args) as a job (sharing a job still in progress under the same key).
+    With "async": true returns the job state at once (202), otherwise waits for its result.
+    """
+    job, created = jobs.submit(kind, fn, *args, key=key)
+    if body.get("async"):
+        return jsonify({**job.to_dict(), "deduplicated": not created}), 202
+
+    version = job.version
+    while not job.finished:
+        version = job.wait_for_change(version)
+    if job.status == DONE:
+        return jsonify(job.result)
+    if job.status == CANCELLED:
+        raise ApiError("Zadanie zostało anulowane.", 409)
+    raise ApiError(job.error, job.error_status or 500)
+
+
+def training_job(job, dataset, max_rows, memory_budget_mb):
+    # job.report stops a cancelled job at every training stage; the fit itself runs to its end
+    model_data = ai_logic.train_and_save_model(dataset.df, feedback_store, max_rows=max_rows,
+                                               memory_budget_mb=memory_budget_mb, progress_callback=job.report)
+    if not model_data:
+        raise ApiError("Nie udało się wytrenować modelu (potrzebne są co najmniej 2 różne alerty).", 422)
+    # The model is already saved and active, so from here on the job runs to completion
+    dataset.df = with_predictions(dataset.df, model_data)
+    return {"dataset_id": dataset.id, "trained": True, "importances": importances_payload(model_data),
+            "training_stats": model_data.get("training_stats")}
+
+
+@app.post("/train")
+def train():
+    body = payload()
+    dataset = require_dataset(body)
+    # Training sets above max_rows (0: no limit) or the memory budget are subsampled
+    max_rows = int_param(body, "max_rows", ai_logic.TRAINING_MAX_ROWS or 0) or None
+    memory_budget_mb = int_param(body, "memory_budget_mb", ai_logic.TRAINING_MEMORY_BUDGET_MB or 0) or None
+    return run_job(body, "train", training_job, dataset, max_rows, memory_budget_mb,
+                   key=("train", dataset.id, max_rows, memory_budget_mb))
+
+
+@app.post("/feedback")
+def feedback():
+    """
+    Records a user correction ({"dataset_id", "indeks", "alert"}). It applies to the
+    dataset's predictions at once; the model is retrained in the background only once
+    the corrections since its training pass the drift threshold.
+    """
+    body = payload()
+    dataset = require_dataset(body)
+    indeks, alert = body.get("indeks"), body.get("alert")
+    if indeks in (None, "") or not alert:
+        raise ApiError("Podaj 'indeks' i poprawny 'alert'.")
+    df = dataset.df
+    rows = df[df["indeks"].astype(str) == str(indeks)] if "indeks" in df.columns else df.iloc[:0]
+    if rows.empty:
+        raise ApiError(f"Brak indeksu w zbiorze: {indeks}", 404)
+    corrections.add(rows, alert)
+
+    model_data = current_model_data()
+    if model_data and dataset.df is df:
+        dataset.df = with_predictions(df, model_data)
+    response = {"dataset_id": dataset.id, "corrected_rows": len(rows), "pending": corrections.pending(model_data)}
+    if model_data and corrections.needs_retraining(model_data):
+        max_rows, memory_budget_mb = ai_logic.TRAINING_MAX_ROWS, ai_logic.TRAINING_MEMORY_BUDGET_MB
+        job, _ = jobs.submit("train", training_job, dataset, max_rows, memory_budget_mb,
+                             key=("train", dataset.id, max_rows, memory_budget_mb))
+        response["retraining"] = job.to_dict()
+    return jsonify(response)
+
+
+@app.post("/predict")
+def predict():
+    body = payload()
+    dataset = require_dataset(body)
+    model_data = current_model_data()
+    if not model_data:
+        raise ApiError("Brak wytrenowanego modelu - najpierw wywołaj /train.", 409)
+    dataset.df = with_predictions(dataset.df, model_data)
+    return table_response({
+        "dataset_id": dataset.id,
+        "row_count": len(dataset.df),
+        "ai_alert_counts": {str(k): int(v) for k, v in dataset.df["ai_alert"].value_counts().items()},
+        "facets": dataset.facets(),
+        "importances": importances_payload(model_data),
+    }, dataset.df.head(preview_limit(body)))
+
+
+@app.post("/predict/stream")
+def predict_stream():
+    """
+    Scores a dataset in chunks ({"dataset_id", "chunk_rows"}) and streams every chunk
+    when it is done: rows {"row" (position in the dataset), "indeks", "ai_alert",
+    "ai_confidence"}, as Arrow record batches or as JSON lines (the first line holds
+    the metadata). Once the whole dataset is scored it keeps the new columns.
+    """
+    body = payload()
+    dataset = require_dataset(body)
+    model_data = current_model_data()
+    if not model_data:
+        raise ApiError("Brak wytrenowanego modelu - najpierw wywołaj /train.", 409)
+    model, encoder = model_data.get("model"), model_data.get("encoder")
+    chunk_rows = max(1, int_param(body, "chunk_rows", STREAM_CHUNK_ROWS, ai_logic.PREDICTION_CHUNK_ROWS))
+    df = dataset.df
+    indeks = df["indeks"].astype("str").to_numpy() if "indeks" in df.columns else None
+    meta = {
+        "dataset_id": dataset.id,
+        "row_count": len(df),
+        "chunk_rows": chunk_rows,
+        "classes": [str(c) for c in ai_logic.class_labels(model, encoder)],
+        "importances": importances_payload(model_data),
     }
-    setStatus('Prognozowanie...')
-    try {
-      const selectedRow = rows[selectedRowIndex]
-      if (!selectedRow) throw new Error('Brak danych w zaznaczonym wierszu')
-      const indeks = selectedRow?.indeks
-      const stan = selectedRow?.stan ?? 0
-      const data = await postJSON('http://127.0.0.1:5005/forecast', { indeks, stan })
-      setAiInfo({ forecast: data })
-      setStatus('Gotowe')
-    } catch (e:any) {
-      setStatus(e.message)
+
+    def chunks():
+        labels, confidence = [], []
+        for start, chunk_labels, probabilities in ai_logic.iter_predictions(
+                model, encoder, df, prediction_cache, model_data.get("version"), chunk_rows, corrections=corrections):
+            labels.append(chunk_labels)
+            confidence.append(probabilities.max(axis=1))
+            stop = start + len(chunk_labels)
+            yield pd.DataFrame({
+                "row": np.arange(start, stop),
+                "indeks": indeks[start:stop] if indeks is not None else None,
+                "ai_alert": pd.Series(chunk_labels, dtype="str"),
+                "ai_confidence": confidence[-1],
+            })
+        # Only a complete run replaces the columns, and only of the frame that was scored
+        if labels and dataset.df is df:
+            dataset.df = df.assign(ai_alert=np.concatenate(labels), ai_confidence=np.concatenate(confidence))
+
+    if wants_arrow():
+        schema = pa.schema(
+            [("row", pa.int64()), ("indeks", pa.string()), ("ai_alert", pa.string()), ("ai_confidence", pa.float64())],
+            metadata={ARROW_METADATA_KEY: json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8")},
+        )
+
+        def stream():
+            sink = io.BytesIO()
+
+            def drain():
+                data = sink.getvalue()
+                sink.seek(0)
+                sink.truncate()
+                return data
+
+            with pa.ipc.new_stream(sink, schema) as writer:
+                for frame in chunks():
+                    writer.write_batch(pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False))
+                    yield drain()
+            yield drain()  # end-of-stream marker
+
+        response = Response(stream(), mimetype=ARROW_STREAM_MIMETYPE)
+    else:
+        def stream():
+            yield json.dumps(meta, ensure_ascii=False, default=str) + "\n"
+            for frame in chunks():
+                yield json.dumps({"start": int(frame["row"].iloc[0]), "rows": records(frame)}, ensure_ascii=False) + "\n"
+
+        response = Response(stream(), mimetype=NDJSON_MIMETYPE)
+    response.vary.add("Accept")
+    return response
+
+
+@app.post("/forecast")
+def forecast():
+    body = payload()
+    dataset = require_dataset(body)
+    product_id = body.get("indeks")
+    if product_id is None:
+        raise ApiError("Brak 'indeks' produktu do prognozy.")
+
+    current_stock = body.get("stan")
+    if current_stock is None:
+        matches = dataset.df.loc[dataset.df["indeks"] == product_id, "stan"]
+        if matches.empty:
+            raise ApiError(f"Produkt {product_id} nie występuje w zbiorze danych.", 404)
+        current_stock = matches.iloc[0]
+
+    sales = dataset.monthly_sales_df
+    product_sales = sales[sales["indeks"] == product_id] if "indeks" in sales.columns else sales.iloc[0:0]
+    if product_sales.empty:
+        raise ApiError(f"Brak danych sprzedażowych dla produktu {product_id}.", 404)
+
+    current_stock = float(current_stock)
+    use_sarimax = bool(body.get("sarimax", False))
+    return run_job(
+        body, "forecast", forecast_job, dataset.id, product_id, product_sales.set_index("date")["sales"], current_stock,
+        use_sarimax, key=("forecast", dataset.id, str(product_id), current_stock, use_sarimax),
+    )
+
+
+def forecast_job(job, dataset_id, product_id, sales_series, current_stock, use_sarimax):
+    job.report(0.1, f"Prognoza produktu {product_id}")
+    forecast_df, stockout_date = forecasting_logic.forecast_for_product(
+        sales_series, product_id, current_stock, use_sarimax=use_sarimax)
+    if forecast_df is None:
+        raise ApiError(f"Nie udało się stworzyć prognozy produktu {product_id}.", 422)
+    return {
+        "dataset_id": dataset_id,
+        "indeks": product_id,
+        "stan": current_stock,
+        "stockout_date": pd.Timestamp(stockout_date).strftime("%Y-%m-%d") if stockout_date is not None else None,
+        "forecast": records(forecast_df.rename_axis("date").reset_index()),
     }
-  }
-
-  return (
-    <div style={{ padding: 16, fontFamily: 'Inter, system-ui, sans-serif' }}>
-      <h1>BOM OS – Dashboard (Tauri + React + Flask)</h1>
-      <div style={{ display:'flex', gap:8, marginBottom:12 }}>
-        <button onClick={handleProcess}>1. Przetwórz</button>
-        <button onClick={handleTrain}>2. Trenuj AI</button>
-        <button onClick={handlePredict}>3. Predykcja</button>
-        <button onClick={handleForecast}>4. Prognoza</button>
-      </div>
-      <div style={{ marginBottom:12 }}>
-        <strong>Status:</strong> {status}
-      </div>
-
-      <div style={{ maxHeight: 300, overflow: 'auto', border: '1px solid #ddd' }}>
-        <table cellPadding={6} style={{ width: '100%', borderCollapse: 'collapse' }}>
-          <thead>
-            <tr style={{ textAlign: 'left', background: '#f6f8fa' }}>
-              {rows[0] && Object.keys(rows[0]).map(key => <th key={key} style={{ padding: '8px' }}>{key}</th>)}
-            </tr>
-          </thead>
-          <tbody>
-            {rows.map((r, i) => (
-              <tr
-                key={i}
-                onClick={() => setSelectedRowIndex(i)}
-                style={{
-                  cursor: 'pointer',
-                  backgroundColor: selectedRowIndex === i ? '#e0f7fa' : 'transparent'
-                }}
-              >
-                {Object.keys(rows[0] || {}).map(k => <td key={k + i} style={{ padding: '8px', borderBottom: '1px solid #eee' }}>{String(r[k])}</td>)}
-              </tr>
-            ))}
-          </tbody>
-        </table>
-      </div>
-
-      <pre style={{ background:'#f6f8fa', padding:12, borderRadius:8, marginTop: 12 }}>
-        {JSON.stringify(aiInfo, null, 2)}
-      </pre>
-    </div>
-  )
-}
+
+
+@app.post("/forecast/batch")
+def forecast_batch():
+    """Forecasts every product of a dataset at once ({"dataset_id"}): method, sales and stockout date per indeks."""
+    body = payload()
+    dataset = require_dataset(body)
+    return run_job(body, "forecast_batch", forecast_batch_job, dataset, key=("forecast_batch", dataset.id))
+
+
+def forecast_batch_job(job, dataset):
+    if dataset.monthly_sales_df is None or dataset.monthly_sales_df.empty:
+        raise ApiError("Brak danych sprzedażowych w zbiorze danych.", 404)
+    job.report(0.1, "Prognozy wszystkich produktów")
+    df = dataset.df
+    stock = df.drop_duplicates("indeks").set_index("indeks")["stan"] if {"indeks", "stan"} <= set(df.columns) else None
+    summary = forecasting_logic.forecast_catalog(dataset.monthly_sales_df, stock)
+    if "stockout_date" in summary.columns:
+        summary["stockout_date"] = summary["stockout_date"].dt.strftime("%Y-%m-%d")
+    return {"dataset_id": dataset.id, "product_count": len(summary), "forecasts": records(summary)}
+
+
+def export_path(path):
+    """Absolute path of an export file given relative to EXPORT_DIR; anything resolving outside it is rejected."""
+    if not path:
+        raise ApiError("Brak ścieżki pliku 'path' do eksportu.")
+    root = os.path.realpath(EXPORT_DIR)
+    target = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, target]) != root or target == root:
+        raise ApiError(f"Eksport jest możliwy tylko do katalogu {root}.", 403)
+    return target
+
+
+@app.post("/export")
+def export():
+    body = payload()
+    dataset = require_dataset(body)
+    path = export_path(body.get("path"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    dataset.df.to_csv(path, index=False, encoding="utf-8-sig")
+    return jsonify({"dataset_id": dataset.id, "path": path, "row_count": len(dataset.df)})
+
+
+@app.get("/datasets")
+def list_datasets():
+    return jsonify([dataset.describe() for dataset in datasets.list()])
+
+
+@app.delete("/datasets/<dataset_id>")
+def drop_dataset(dataset_id):
+    if not datasets.remove(dataset_id):
+        raise ApiError(f"Nieznany zbiór danych: {dataset_id}", 404)
+    return jsonify({"dataset_id": dataset_id, "removed": True})
+
+
+def require_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise ApiError(f"Nieznane zadanie: {job_id}", 404)
+    return job
+
+
+@app.get("/jobs")
+def list_jobs():
+    return jsonify([job.to_dict(include_result=False) for job in jobs.list()])
+
+
+@app.get("/jobs/<job_id>")
+def job_state(job_id):
+    return jsonify(require_job(job_id).to_dict())
+
+
+@app.get("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-sent events with the job state after every change, until the job finishes."""
+    job = require_job(job_id)
+
+    def stream():
+        version = None
+        while True:
+            version = job.wait_for_change(version, timeout=EVENT_KEEPALIVE_S)
+            yield f"data: {json.dumps(job.to_dict(), ensure_ascii=False, default=str)}\n\n"
+            if job.finished:
+                return
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/jobs/<job_id>/cancel")
+def cancel_job(job_id):
+    require_job(job_id)
+    return jsonify(jobs.cancel(job_id).to_dict(include_result=False))
+
+
+if __name__ == "__main__":
+    app.run(host=HOST, port=PORT, threaded=True)
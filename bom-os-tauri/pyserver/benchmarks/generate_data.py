@@ -0,0 +1,112 @@
+"""
+Deterministyczny generator syntetycznych plików wejściowych (stany, bomy,
+minimum, sprzedaz) w formacie oczekiwanym przez process_data_files.
+
+    python -m benchmarks.generate_data --skus 10000 --months 36 --out bench_data
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+MONTH_ABBR = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+NAME_WORDS = [
+    "Śruba", "Nakrętka", "Podkładka", "Obudowa", "Kabel", "Uszczelka", "Zawór", "Filtr",
+    "Pompa", "Wspornik", "Łożysko", "Sprężyna", "Płytka", "Przewód", "Złączka", "Czujnik",
+]
+NAME_ATTRS = ["ocynk", "stal", "czarny", "biały", "mosiądz", "PCV", "nierdzewna", "duży", "mały"]
+
+
+def month_columns(months, start_year=2020):
+    """Nazwy kolumn sprzedaży w formacie 'Jan-20', 'Feb-20', ... (months kolejnych miesięcy)."""
+    return [f"{MONTH_ABBR[i % 12]}-{(start_year + i // 12) % 100:02d}" for i in range(months)]
+
+
+def _product_names(rng, skus):
+    words = rng.choice(NAME_WORDS, skus)
+    attrs = rng.choice(NAME_ATTRS, skus)
+    sizes = rng.integers(2, 40, skus)
+    return [f"{w} M{s} {a} {i}" for i, (w, s, a) in enumerate(zip(words, sizes, attrs))]
+
+
+def _with_typos(rng, names, share=0.3):
+    """Kopie nazw z drobnymi zmianami (wielkość liter, zamiana znaku), jak w ręcznie pisanych BOM-ach."""
+    result = []
+    for name in names:
+        if rng.random() < share:
+            pos = int(rng.integers(0, len(name)))
+            name = name[:pos] + "x" + name[pos + 1:]
+        if rng.random() < share:
+            name = name.lower()
+        result.append(name)
+    return result
+
+
+def generate_frames(skus, months, seed=42):
+    """Zwraca słownik ramek {'stany', 'bomy', 'minimum', 'sprzedaz'} dla podanej liczby SKU."""
+    rng = np.random.default_rng(seed)
+    indeks = [f"SKU-{i:07d}" for i in range(skus)]
+    names = _product_names(rng, skus)
+
+    stany = pd.DataFrame({
+        "Indeks": indeks,
+        "Name": names,
+        "Ilość na stanie": rng.integers(-5, 500, skus),
+    })
+
+    minimum = pd.DataFrame({
+        "Indeks": indeks,
+        "Minimum": rng.integers(0, 200, skus),
+    })
+
+    # Ok. 40% produktów ma BOM, średnio 3 pozycje na produkt
+    bom_skus = rng.choice(skus, size=max(1, int(0.4 * skus)), replace=False)
+    lines = rng.integers(1, 6, len(bom_skus))
+    bom_idx = np.repeat(bom_skus, lines)
+    bomy = pd.DataFrame({
+        "Indeks": np.asarray(indeks, dtype=object)[bom_idx],
+        "Nazwa": _with_typos(rng, np.asarray(names, dtype=object)[bom_idx]),
+        "Ilość": rng.integers(1, 20, len(bom_idx)),
+    })
+
+    # Sprzedaż: poziom, trend i sezonowość roczna; ok. 20% produktów o popycie sporadycznym
+    level = rng.gamma(2.0, 20.0, skus)[:, None]
+    trend = rng.normal(0.0, 0.01, skus)[:, None] * np.arange(months)[None, :]
+    season = 1 + 0.3 * np.sin(2 * np.pi * (np.arange(months)[None, :] + rng.integers(0, 12, skus)[:, None]) / 12)
+    sales = rng.poisson(np.clip(level * season * (1 + trend), 0, None))
+    intermittent = rng.random(skus) < 0.2
+    sales[intermittent] *= rng.random((intermittent.sum(), months)) < 0.25
+
+    sprzedaz = pd.DataFrame(sales, columns=month_columns(months))
+    sprzedaz.insert(0, "Name", names)
+    sprzedaz.insert(0, "GSM1", indeks)
+    sprzedaz.insert(0, "ID", np.arange(1, skus + 1))
+
+    return {"stany": stany, "bomy": bomy, "minimum": minimum, "sprzedaz": sprzedaz}
+
+
+def write_dataset(out_dir, skus, months, seed=42):
+    """Zapisuje pliki CSV do out_dir i zwraca słownik ścieżek w formacie argumentów process_data_files."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for kind, frame in generate_frames(skus, months, seed).items():
+        path = os.path.join(out_dir, f"{kind}_{skus}x{months}.csv")
+        frame.to_csv(path, index=False)
+        paths[f"{kind}_path"] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generator syntetycznych danych BOM OS")
+    parser.add_argument("--skus", type=int, default=10_000)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_data")
+    args = parser.parse_args()
+    for path in write_dataset(args.out, args.skus, args.months, args.seed).values():
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark całego potoku BOM OS na danych syntetycznych.
+
+Dla każdego rozmiaru katalogu generuje dane (generate_data), a następnie mierzy
+czas (ścienny i CPU), liczbę wierszy oraz pamięć każdego etapu: wczytania,
+agregacji BOM, sprzedaży, dopasowania nazw, łączenia, alertów, trenowania
+i predykcji modelu AI oraz trenowania i generowania prognoz. Wyniki trafiają
+do pliku JSON, który można porównać z wcześniejszym przebiegiem (--compare).
+
+    cd pyserver
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 100000 --months 36 --output bench.json
+    python -m benchmarks.run_benchmarks --sizes 1000 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+PYSERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PYSERVER_DIR)
+
+from benchmarks.generate_data import write_dataset  # noqa: E402
+from common.memory_usage import memory_snapshot  # noqa: E402
+
+
+class StageTimer:
+    """Zbiera pomiary kolejnych etapów jednego przebiegu."""
+
+    def __init__(self):
+        self.stages = []
+
+    def measure(self, name, fn, *args, rows=None, **kwargs):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = fn(*args, **kwargs)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        _, peak = tracemalloc.get_traced_memory()
+        row_count = rows(result) if callable(rows) else rows
+        self.stages.append({
+            "stage": name,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rows": row_count,
+            "peak_alloc_mb": round((peak - before) / 2**20, 3),
+            "rss_mb": memory_snapshot()["rss_mb"],
+        })
+        print(f"  {name:<22} {wall:9.3f} s  {(peak - before) / 2**20:9.1f} MB  rows={row_count}")
+        return result
+
+
+def run_pipeline(paths, fuzzy_max_names, forecast_skus):
+    # Import dopiero tutaj: moduły tworzą katalogi modeli względem bieżącego katalogu
+    import ai_logic
+    import forecasting_logic
+    from common import data_processing
+
+    timer = StageTimer()
+    read = data_processing.read_input_file
+    stany = timer.measure("read_stany", read, paths["stany_path"], use_snapshot=False, rows=len)
+    minimum = timer.measure("read_minimum", read, paths["minimum_path"], use_snapshot=False, rows=len)
+    bomy = timer.measure("read_bomy", read, paths["bomy_path"], use_snapshot=False, rows=len)
+    sprzedaz = timer.measure("read_sprzedaz", read, paths["sprzedaz_path"], use_snapshot=False, rows=len)
+    if data_processing.feather is not None:
+        read(paths["sprzedaz_path"])  # zapis migawki, poza pomiarem
+        timer.measure("read_sprzedaz_snapshot", read, paths["sprzedaz_path"], rows=len)
+
+    bomy_agg, bom_names = timer.measure(
+        "bom_aggregation", data_processing.aggregate_bom, bomy, rows=lambda r: len(r[0])
+    )
+    sprzedaz_agg, monthly_sales_df = timer.measure(
+        "sales_aggregation", data_processing.aggregate_sales, sprzedaz, rows=lambda r: len(r[1])
+    )
+
+    stany_names = stany["Name"].unique()[:fuzzy_max_names]
+    timer.measure(
+        "fuzzy_match", data_processing.fuzzy_match, bom_names[:fuzzy_max_names], stany_names,
+        blocking=False, rows=len
+    )
+    mapping = timer.measure(
+        "fuzzy_match_blocked", data_processing.fuzzy_match, bom_names[:fuzzy_max_names], stany_names,
+        blocking=True, rows=len
+    )
+
+    merged = timer.measure(
+        "merges", data_processing.merge_inputs, stany, bomy_agg, minimum, sprzedaz_agg, rows=len
+    )
+    df = timer.measure("alerts", data_processing.finalize_frame, merged, mapping, rows=len)
+
+    model_data = timer.measure(
+        "ai_train", ai_logic.train_and_save_model, df, None, rows=len(df)
+    )
+    if model_data:
+        timer.measure(
+            "ai_predict", ai_logic.predict_with_model, model_data["model"], model_data["encoder"], df, rows=len
+        )
+
+    series = forecasting_logic.split_sales_by_product(monthly_sales_df)
+    sample = list(series.items())[:forecast_skus]
+
+    def train_forecasts():
+        return [forecasting_logic.train_and_save_forecast_model(s, pid) for pid, s in sample]
+
+    def generate_forecasts(models):
+        return [forecasting_logic.generate_forecast(m, 100) for m in models if m is not None]
+
+    models = timer.measure("forecast_train", train_forecasts, rows=len)
+    timer.measure("forecast_generate", generate_forecasts, models, rows=len)
+    return timer.stages
+
+
+def environment_info():
+    import sklearn
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Wypisuje etapy wolniejsze niż w pliku bazowym o więcej niż tolerance (np. 0.2 = 20%)."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    base = {(r["skus"], r["months"], s["stage"]): s for r in baseline["runs"] for s in r["stages"]}
+    regressions = 0
+    for run in results["runs"]:
+        for stage in run["stages"]:
+            old = base.get((run["skus"], run["months"], stage["stage"]))
+            if not old or not old["wall_s"]:
+                continue
+            ratio = stage["wall_s"] / old["wall_s"]
+            flag = "REGRESJA" if ratio > 1 + tolerance else ""
+            regressions += bool(flag)
+            print(f"{run['skus']:>8} {stage['stage']:<22} {old['wall_s']:9.3f} -> {stage['wall_s']:9.3f} s  x{ratio:5.2f} {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark potoku BOM OS")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--months", type=int, default=36, help="liczba miesięcy sprzedaży (24-60)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fuzzy-max-names", type=int, default=5_000,
+                        help="limit nazw w dopasowaniu rozmytym (pełna macierz rośnie kwadratowo)")
+    parser.add_argument("--forecast-skus", type=int, default=10, help="liczba SKU do trenowania prognoz SARIMA")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="plik JSON z poprzedniego przebiegu do porównania")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    results = {"environment": environment_info(), "runs": []}
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # modele i migawki benchmarku nie trafiają do katalogu roboczego aplikacji
+        for skus in args.sizes:
+            print(f"=== {skus} SKU x {args.months} miesięcy ===")
+            paths = write_dataset(os.path.join(workdir, "data"), skus, args.months, args.seed)
+            stages = run_pipeline(paths, args.fuzzy_max_names, args.forecast_skus)
+            results["runs"].append({"skus": skus, "months": args.months, "seed": args.seed, "stages": stages})
+        os.chdir(PYSERVER_DIR)
+    tracemalloc.stop()
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Zapisano wyniki do {output}")
+
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
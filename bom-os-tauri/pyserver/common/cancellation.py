@@ -0,0 +1,20 @@
+"""
+Kooperatywne anulowanie i raportowanie postępu długich zadań.
+
+Zadanie przyjmuje opcjonalne should_cancel() i progress_callback(postęp, opis)
+i wywołuje checkpoint(...) między etapami (lub porcjami pracy). Po żądaniu
+anulowania checkpoint rzuca TaskCancelled, więc zadanie kończy się w miejscu,
+w którym nie zostawia niespójnego stanu. Bez obu funkcji checkpoint nic nie robi.
+"""
+
+
+class TaskCancelled(Exception):
+    """Zadanie przerwane na punkcie kontrolnym po żądaniu anulowania."""
+
+
+def checkpoint(should_cancel=None, progress_callback=None, progress=None, message=""):
+    """Przerywa zadanie, jeśli zażądano anulowania; w przeciwnym razie zgłasza postęp (0..1)."""
+    if should_cancel is not None and should_cancel():
+        raise TaskCancelled()
+    if progress_callback is not None and progress is not None:
+        progress_callback(progress, message)
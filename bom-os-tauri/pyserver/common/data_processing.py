@@ -1,61 +1,387 @@
 import pandas as pd
 import os
 import re # Import modułu do wyrażeń regularnych
+import glob
+import hashlib
+import threading
 import numpy as np
+import joblib
 from rapidfuzz import process, fuzz
 
-def fuzzy_match(new_names, known_names, threshold=80):
+from . import profiling
+from .cancellation import TaskCancelled, checkpoint
+from .memory_usage import memory_snapshot, format_memory
+
+try:  # pyarrow jest opcjonalny - bez niego pliki CSV są zawsze parsowane od nowa
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = feather = None
+
+# Maksymalna liczba komórek macierzy wyników liczonej jednym wywołaniem cdist
+# (float64, więc ~128 MB); dłuższe listy nazw są dzielone na bloki wierszy.
+FUZZY_CHUNK_CELLS = 16_000_000
+
+# Trwała pamięć podręczna dopasowań nazw, obok zapisanych modeli
+MATCH_CACHE_PATH = os.path.join("saved_models", "fuzzy_match_cache.joblib")
+
+# Kolumnowe migawki (Feather) wczytanych plików CSV
+SNAPSHOT_DIR = "saved_snapshots"
+
+# Kolumny ze sprzedażą w formacie 'Xxx-YY', np. 'Sty-23', 'Lut-24'
+SALES_COLUMN_PATTERN = re.compile(r"^[A-Za-z]{3}-\d{2}$")
+
+# Pliki sprzedaży większe niż ten limit są przetwarzane strumieniowo, w porcjach
+# mieszczących się w limicie (patrz aggregate_sales_streaming)
+SALES_MEMORY_LIMIT_MB = 512
+
+
+def _name_tokens(name):
+    """Tokeny używane do blokowania (jak w token_set_ratio, ale bez rozróżniania wielkości liter)."""
+    return set(str(name).lower().split()) if isinstance(name, str) else set()
+
+
+def _best_matches_full(queries, choices, threshold, workers, should_cancel=None):
+    """
+    Liczy pełną macierz podobieństw blokami wierszy i zwraca (indeks, wynik)
+    najlepszego kandydata dla każdej nazwy; -1 gdy żaden wynik nie przekracza progu.
+    Przed każdym blokiem sprawdzane jest should_cancel (patrz cancellation.checkpoint).
+    """
+    best_idx = np.full(len(queries), -1, dtype=np.int64)
+    best_score = np.zeros(len(queries), dtype=np.float64)
+    if len(queries) == 0 or len(choices) == 0:
+        return best_idx, best_score
+
+    rows_per_chunk = max(1, FUZZY_CHUNK_CELLS // len(choices))
+    for start in range(0, len(queries), rows_per_chunk):
+        checkpoint(should_cancel)
+        chunk = queries[start:start + rows_per_chunk]
+        scores = process.cdist(
+            chunk, choices, scorer=fuzz.token_set_ratio,
+            score_cutoff=threshold, dtype=np.float64, workers=workers
+        )
+        # argmax zwraca pierwsze maksimum - tak samo jak extractOne przy remisach
+        idx = scores.argmax(axis=1)
+        score = scores[np.arange(len(chunk)), idx]
+        matched = score > threshold
+        best_idx[start:start + len(chunk)] = np.where(matched, idx, -1)
+        best_score[start:start + len(chunk)] = np.where(matched, score, 0.0)
+    return best_idx, best_score
+
+
+def _best_matches_blocked(queries, choices, threshold, workers, max_token_share, should_cancel=None):
+    """
+    Wariant z blokowaniem po tokenach: ocenia tylko pary nazw, które mają co najmniej
+    jeden wspólny token (z pominięciem tokenów występujących w więcej niż
+    max_token_share nazw kandydatów). Nazwy, które nie mają wspólnego tokenu
+    z żadnym kandydatem (w tym nazwy bez użytecznych tokenów), są dopasowywane
+    pełnym przeszukaniem.
+    """
+    from scipy import sparse
+
+    best_idx = np.full(len(queries), -1, dtype=np.int64)
+    best_score = np.zeros(len(queries), dtype=np.float64)
+    if len(queries) == 0 or len(choices) == 0:
+        return best_idx, best_score
+
+    choice_tokens = [_name_tokens(c) for c in choices]
+    token_counts = {}
+    for tokens in choice_tokens:
+        for token in tokens:
+            token_counts[token] = token_counts.get(token, 0) + 1
+    max_count = max(1, int(max_token_share * len(choices)))
+    vocabulary = {t: i for i, t in enumerate(t for t, n in token_counts.items() if n <= max_count)}
+
+    def incidence(token_sets):
+        rows, cols = [], []
+        for row, tokens in enumerate(token_sets):
+            for token in tokens:
+                col = vocabulary.get(token)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        data = np.ones(len(rows), dtype=np.int32)
+        return sparse.csr_matrix((data, (rows, cols)), shape=(len(token_sets), len(vocabulary)))
+
+    query_matrix = incidence([_name_tokens(q) for q in queries])
+    choice_matrix_t = incidence(choice_tokens).T.tocsc()
+
+    rows_per_chunk = max(1, FUZZY_CHUNK_CELLS // len(choices))
+    no_candidates = []
+    for start in range(0, len(queries), rows_per_chunk):
+        checkpoint(should_cancel)
+        candidates = (query_matrix[start:start + rows_per_chunk] @ choice_matrix_t).tocsr()
+        candidates.sort_indices()
+        no_candidates.append(start + np.flatnonzero(np.diff(candidates.indptr) == 0))
+        pair_rows, pair_cols = candidates.nonzero()
+        if len(pair_rows):
+            scores = process.cpdist(
+                queries[start + pair_rows], choices[pair_cols], scorer=fuzz.token_set_ratio,
+                score_cutoff=threshold, dtype=np.float64, workers=workers
+            )
+            # Najlepszy wynik w wierszu, przy remisie najmniejszy indeks kandydata
+            order = np.lexsort((pair_cols, -scores, pair_rows))
+            first_rows, first_pos = np.unique(pair_rows[order], return_index=True)
+            top = order[first_pos]
+            matched = scores[top] > threshold
+            best_idx[start + first_rows[matched]] = pair_cols[top[matched]]
+            best_score[start + first_rows[matched]] = scores[top[matched]]
+
+    no_candidates = np.concatenate(no_candidates)
+    if len(no_candidates):
+        idx, score = _best_matches_full(queries[no_candidates], choices, threshold, workers, should_cancel)
+        best_idx[no_candidates], best_score[no_candidates] = idx, score
+    return best_idx, best_score
+
+
+def best_matches(new_names, known_names, threshold=80, workers=-1, blocking=False, max_token_share=0.05,
+                 should_cancel=None):
+    """
+    Wektorowe dopasowanie rozmyte: dla każdej nazwy z new_names zwraca indeks
+    najlepszej nazwy w known_names oraz jej wynik token_set_ratio
+    (-1 i 0, gdy żaden wynik nie przekracza progu).
+
+    Domyślnie liczona jest pełna macierz wyników w wielu wątkach (workers=-1 -
+    wszystkie rdzenie), co daje dokładnie te same wyniki co extractOne w pętli.
+    blocking=True ocenia tylko pary nazw ze wspólnym tokenem (nazwy bez takiej
+    pary - pełnym przeszukaniem); jest znacznie szybsze dla dużych katalogów,
+    ale nie jest dokładne: pomija kandydatów podobnych wyłącznie na poziomie
+    znaków i zmienia rozstrzyganie remisów, a w małych katalogach (poniżej
+    1 / max_token_share nazw) pomija każdy token występujący w więcej niż jednej nazwie.
+    should_cancel() jest sprawdzane przed każdym blokiem wierszy (TaskCancelled).
+    """
+    queries = np.asarray(new_names, dtype=object)
+    choices = np.asarray(known_names, dtype=object)
+    if blocking:
+        return _best_matches_blocked(queries, choices, threshold, workers, max_token_share, should_cancel)
+    return _best_matches_full(queries, choices, threshold, workers, should_cancel)
+
+
+def fuzzy_match(new_names, known_names, threshold=80, workers=-1, blocking=False, max_token_share=0.05,
+                should_cancel=None):
     """
     Znajduje najlepsze dopasowanie dla każdej nazwy w new_names z listy known_names.
     """
-    mapping = {}
-    for name in new_names:
-        match = process.extractOne(name, known_names, scorer=fuzz.token_set_ratio)
-        if match and match[1] > threshold:
-            mapping[name] = match[0]
-    return mapping
+    new_names = np.asarray(new_names, dtype=object)
+    known_names = np.asarray(known_names, dtype=object)
+    best_idx, _ = best_matches(
+        new_names, known_names, threshold,
+        workers=workers, blocking=blocking, max_token_share=max_token_share, should_cancel=should_cancel
+    )
+    matched = np.flatnonzero(best_idx >= 0)
+    return dict(zip(new_names[matched].tolist(), known_names[best_idx[matched]].tolist()))
 
-def process_data_files(stany_path, bomy_path, minimum_path, sprzedaz_path):
+class FuzzyMatchCache:
     """
-    Wczytuje i przetwarza dane z plików CSV, tworząc ujednoliconą ramkę danych.
+    Trwała, przyrostowa pamięć podręczna wyników fuzzy_match.
+
+    Dla każdej nazwy BOM pamięta najlepsze dopasowanie i jego wynik. Przy kolejnym
+    przebiegu pełne dopasowanie liczone jest tylko dla nowych nazw; zapamiętane
+    nazwy są porównywane wyłącznie z nowo dodanymi kandydatami. Wpis jest
+    unieważniany, gdy jego dopasowanie zniknęło z listy kandydatów, a cała pamięć -
+    gdy zmienił się próg lub kolejność kandydatów (od której zależą remisy).
+    Wynik jest zawsze taki sam, jak z fuzzy_match liczonego od zera
+    (blocking=True dopasowuje nowe nazwy z blokowaniem - patrz best_matches).
     """
-    # ZMIANA: Usunięto definicje pustych kolumn, logika została ulepszona
-    
-    # Wczytywanie danych, tworzenie pustych ramek w razie braku plików
+    FORMAT_VERSION = 1
+
+    def __init__(self, path=MATCH_CACHE_PATH):
+        self.path = path
+        self.threshold = None
+        self.known_names = []
+        self.entries = {}  # nazwa -> (dopasowanie lub None, wynik)
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            state = joblib.load(self.path)
+        except Exception as e:
+            print(f"Nie udało się wczytać pamięci dopasowań {self.path}: {e}")
+            return
+        if state.get("version") == self.FORMAT_VERSION:
+            self.threshold = state["threshold"]
+            self.known_names = state["known_names"]
+            self.entries = state["entries"]
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        joblib.dump({
+            "version": self.FORMAT_VERSION,
+            "threshold": self.threshold,
+            "known_names": self.known_names,
+            "entries": self.entries,
+        }, tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def match(self, new_names, known_names, threshold=80, workers=-1, blocking=False, should_cancel=None):
+        """Odpowiednik fuzzy_match korzystający z zapamiętanych wyników."""
+        # Wartości nietekstowe (np. NaN) nigdy nie przekraczają progu - można je pominąć
+        known = [n for n in dict.fromkeys(known_names) if isinstance(n, str)]
+        names = [n for n in dict.fromkeys(new_names) if isinstance(n, str)]
+
+        known_set = set(known)
+        previous_set = set(self.known_names)
+        survivors_before = [n for n in self.known_names if n in known_set]
+        survivors_now = [n for n in known if n in previous_set]
+        if threshold != self.threshold or survivors_before != survivors_now:
+            self.entries = {}
+
+        position = {n: i for i, n in enumerate(known)}
+        added = [n for n in known if n not in previous_set]
+        entries = {
+            name: self.entries[name] for name in names
+            if name in self.entries and (self.entries[name][0] is None or self.entries[name][0] in known_set)
+        }
+
+        # Zapamiętane nazwy porównujemy tylko z nowymi kandydatami - zawsze dokładnie, bo częstość
+        # tokenów wśród samych nowych kandydatów nie mówi nic o całej liście
+        cached_names = list(entries)
+        if cached_names and added:
+            idx, score = best_matches(cached_names, added, threshold, workers=workers, blocking=False,
+                                      should_cancel=should_cancel)
+            for name, i, sc in zip(cached_names, idx.tolist(), score.tolist()):
+                if i < 0:
+                    continue
+                current, current_score = entries[name]
+                candidate = added[i]
+                if (current is None or sc > current_score
+                        or (sc == current_score and position[candidate] < position[current])):
+                    entries[name] = (candidate, sc)
+
+        # Nowe nazwy dopasowujemy do pełnej listy kandydatów
+        uncached = [n for n in names if n not in entries]
+        if uncached:
+            idx, score = best_matches(uncached, known, threshold, workers=workers, blocking=blocking,
+                                      should_cancel=should_cancel)
+            for name, i, sc in zip(uncached, idx.tolist(), score.tolist()):
+                entries[name] = (known[i], sc) if i >= 0 else (None, 0.0)
+
+        print(f"Dopasowanie nazw: {len(names) - len(uncached)} z pamięci, {len(uncached)} liczonych od nowa.")
+        if entries != self.entries or known != self.known_names or threshold != self.threshold:
+            self.entries, self.known_names, self.threshold = entries, known, threshold
+            self.save()
+        return {name: match for name, (match, _) in entries.items() if match is not None}
+
+
+# Pamięć podręczna etapów przetwarzania: nazwa etapu -> (klucz, wynik).
+# Kluczem są odciski plików wejściowych (ścieżka, rozmiar, czas modyfikacji),
+# więc zmiana jednego pliku przelicza tylko zależne od niego etapy.
+# Zwracane z niej ramki są współdzielone - nie należy ich modyfikować w miejscu.
+_stage_cache = {}
+_stage_cache_lock = threading.Lock()
+
+
+def file_fingerprint(path):
+    """Zwraca (ścieżka, rozmiar, mtime) pliku lub None, gdy pliku nie ma."""
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def clear_processing_cache():
+    """Czyści pamięć podręczną etapów przetwarzania."""
+    with _stage_cache_lock:
+        _stage_cache.clear()
+
+
+def _cached_stage(name, key, compute):
+    with _stage_cache_lock:
+        entry = _stage_cache.get(name)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+    value = compute()
+    with _stage_cache_lock:
+        _stage_cache[name] = (key, value)
+    return value
+
+
+def snapshot_path(path):
+    """Ścieżka migawki Feather dla bieżącej wersji pliku (nazwa zależy od ścieżki, rozmiaru i mtime)."""
+    source, size, mtime = file_fingerprint(path)
+    source_hash = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, f"{source_hash}_{size}_{mtime}.feather")
+
+
+def _write_snapshot(df, path):
+    """Zapisuje migawkę pliku i usuwa migawki jego poprzednich wersji."""
+    target = snapshot_path(path)
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    prefix = os.path.basename(target).split("_")[0]
+    for old in glob.glob(os.path.join(SNAPSHOT_DIR, f"{prefix}_*.feather")):
+        if old != target:
+            os.remove(old)
+    tmp_path = f"{target}.tmp"
     try:
-        stany = pd.read_csv(stany_path) if stany_path and os.path.exists(stany_path) else pd.DataFrame()
-        bomy = pd.read_csv(bomy_path) if bomy_path and os.path.exists(bomy_path) else pd.DataFrame()
-        minimum = pd.read_csv(minimum_path) if minimum_path and os.path.exists(minimum_path) else pd.DataFrame()
-        sprzedaz = pd.read_csv(sprzedaz_path) if sprzedaz_path and os.path.exists(sprzedaz_path) else pd.DataFrame()
-    except Exception as e:
-        print(f"Błąd podczas wczytywania plików CSV: {e}")
-        return pd.DataFrame(), pd.DataFrame()
+        df.to_feather(tmp_path)
+        os.replace(tmp_path, target)
+    except Exception as e:  # np. kolumny z mieszanymi typami
+        print(f"Nie udało się zapisać migawki dla {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
-    if stany.empty:
-        return pd.DataFrame(), pd.DataFrame()
+def read_input_file(path, usecols=None, use_snapshot=True):
+    """
+    Wczytuje plik CSV lub zwraca pustą ramkę, gdy pliku nie podano lub go nie ma.
 
-    # 1. Przetwarzanie BOM-ów
+    usecols (lista lub funkcja nazwa -> bool) ogranicza wczytywane kolumny.
+    Przy use_snapshot=True i dostępnym pyarrow plik jest przy pierwszym odczycie
+    zapisywany jako migawka Feather; kolejne odczyty tej samej wersji pliku
+    mapują migawkę do pamięci i materializują tylko wybrane kolumny.
+    """
+    if not path or not os.path.exists(path):
+        return pd.DataFrame()
+    if not use_snapshot or feather is None:
+        return pd.read_csv(path, usecols=usecols)
+
+    target = snapshot_path(path)
+    if not os.path.exists(target):
+        df = pd.read_csv(path)
+        _write_snapshot(df, path)
+        if usecols is None:
+            return df
+        return df[[c for c in df.columns if (usecols(c) if callable(usecols) else c in usecols)]]
+
+    columns = None
+    if usecols is not None:
+        with pa.memory_map(target) as source:
+            schema_names = pa.ipc.open_file(source).schema.names
+        columns = [c for c in schema_names if (usecols(c) if callable(usecols) else c in usecols)]
+    return feather.read_table(target, columns=columns, memory_map=True).to_pandas()
+
+
+def aggregate_bom(bomy):
+    """Sumuje ilości z BOM-ów per indeks i zwraca (bomy_agg, unikalne nazwy z BOM-ów)."""
     bomy_agg = pd.DataFrame()
     if not bomy.empty and "Indeks" in bomy.columns and "Ilość" in bomy.columns:
         bomy_agg = bomy.groupby("Indeks")["Ilość"].sum().reset_index()
         bomy_agg = bomy_agg.rename(columns={"Ilość": "ilośćBom"})
+    bom_names = bomy["Nazwa"].unique() if "Nazwa" in bomy.columns else None
+    return bomy_agg, bom_names
 
-    # 2. Przetwarzanie Sprzedaży (UELASTYCZNIONE)
+
+def aggregate_sales(sprzedaz):
+    """
+    Zwraca (sprzedaz_agg, monthly_sales_df): sumę sprzedaży per indeks oraz
+    sprzedaż miesięczną w formacie długim (indeks, date, sales) do prognozowania.
+    """
     monthly_sales_df = pd.DataFrame()
     sprzedaz_agg = pd.DataFrame()
     if not sprzedaz.empty and 'GSM1' in sprzedaz.columns:
         # ZMIANA: Dynamiczne wykrywanie kolumn ze sprzedażą za pomocą wyrażenia regularnego
         # Szuka kolumn w formacie 'Xxx-YY', np. 'Sty-23', 'Lut-24'
-        sales_cols = [col for col in sprzedaz.columns if re.match(r"^[A-Za-z]{3}-\d{2}$", col)]
+        sales_cols = [col for col in sprzedaz.columns if SALES_COLUMN_PATTERN.match(col)]
         
         if sales_cols:
             print(f"Wykryto kolumny sprzedaży: {sales_cols}")
             # Obliczanie sumy sprzedaży
-            sprzedaz_total = sprzedaz.copy()
-            sprzedaz_total["sprzedaż"] = sprzedaz_total[sales_cols].sum(axis=1)
-            sprzedaz_total = sprzedaz_total.rename(columns={"GSM1": "Indeks"})
-            sprzedaz_agg = sprzedaz_total[["Indeks", "sprzedaż"]]
+            sprzedaz_agg = pd.DataFrame({"Indeks": sprzedaz["GSM1"], "sprzedaż": sprzedaz[sales_cols].sum(axis=1)})
             
             # Przekształcanie danych do prognozowania
             id_vars = ['GSM1', 'Name']
@@ -73,31 +399,145 @@ def process_data_files(stany_path, bomy_path, minimum_path, sprzedaz_path):
             monthly_sales_df = sprzedaz_long[['indeks', 'date', 'sales']].dropna(subset=['date'])
         else:
             print("Ostrzeżenie: Nie znaleziono kolumn pasujących do formatu sprzedaży (np. 'Sty-23').")
+    return sprzedaz_agg, monthly_sales_df
 
-    # 3. Fuzzy Match
-    if "Name" in stany.columns and "Nazwa" in bomy.columns:
-        stany_names = stany["Name"].unique()
-        bom_names = bomy["Nazwa"].unique()
-        mapping = fuzzy_match(bom_names, stany_names)
+
+def _parse_month_columns(sales_cols):
+    """Zamienia nazwy kolumn miesięcy na daty - tak samo jak aggregate_sales robi to dla każdego wiersza."""
+    months = pd.Series(sales_cols, name="month")
+    try:
+        return pd.to_datetime(months, format='%b-%y', errors='coerce')
+    except Exception: # Obsługa różnych lokalizacji (np. polskich nazw miesięcy)
+        return pd.to_datetime(months, errors='coerce')
+
+
+def aggregate_sales_streaming(sprzedaz_path, memory_limit_mb=SALES_MEMORY_LIMIT_MB):
+    """
+    Strumieniowy odpowiednik aggregate_sales(read_input_file(sprzedaz_path)).
+
+    Plik jest czytany porcjami dobranymi tak, by przetwarzanie porcji mieściło się
+    w memory_limit_mb. Pierwszy przebieg czyta tylko kolumnę GSM1 (liczba wierszy
+    i indeksy), drugi - kolumny miesięcy: wartości każdej porcji trafiają od razu
+    na swoje miejsce w kolumnie sprzedaży ramki długiej, zaalokowanej raz na
+    pełny rozmiar. Szczyt pamięci to więc wynik plus jedna porcja, bez
+    odkładania porcji i sklejania ich na końcu.
+    Wynik jest równy wynikowi ścieżki w pamięci.
+    """
+    columns = pd.read_csv(sprzedaz_path, nrows=0).columns
+    if 'GSM1' not in columns:
+        return pd.DataFrame(), pd.DataFrame()
+    sales_cols = [col for col in columns if SALES_COLUMN_PATTERN.match(col)]
+    if not sales_cols:
+        print("Ostrzeżenie: Nie znaleziono kolumn pasujących do formatu sprzedaży (np. 'Sty-23').")
+        return pd.DataFrame(), pd.DataFrame()
+    print(f"Wykryto kolumny sprzedaży: {sales_cols}")
+
+    # Szacunek pamięci na wiersz z próbki; porcja, jej sumy i transponowana kopia
+    # wartości miesięcznych zajmują łącznie ok. 3x tyle, co sama porcja
+    sample = pd.read_csv(sprzedaz_path, usecols=["GSM1"] + sales_cols, nrows=1000)
+    bytes_per_row = max(1, int(sample.memory_usage(deep=True, index=False).sum() / max(1, len(sample))))
+    chunk_rows = max(1000, int(memory_limit_mb * 1024 * 1024 / (3 * bytes_per_row)))
+
+    indeks = pd.concat(pd.read_csv(sprzedaz_path, usecols=["GSM1"], chunksize=chunk_rows), ignore_index=True)["GSM1"]
+    row_count = len(indeks)
+
+    # Kolejność i indeks wierszy jak w pd.melt: wszystkie wiersze miesiąca 1, potem 2, ...
+    # (miesiące, których nazwy nie są datą, są pomijane jak przez dropna)
+    dates = _parse_month_columns(sales_cols)
+    valid = dates.notna().to_numpy()
+    month_cols = [col for col, keep in zip(sales_cols, valid) if keep]
+    sales = None  # miesiące x wiersze; typ poszerzany jak w pd.melt, gdy kolejna porcja tego wymaga
+    total_pieces = []
+    offset = 0
+    for chunk in pd.read_csv(sprzedaz_path, usecols=sales_cols, chunksize=chunk_rows):
+        total_pieces.append(chunk[sales_cols].sum(axis=1))
+        if month_cols:
+            block = chunk[month_cols].to_numpy().T
+            if sales is None:
+                sales = np.empty((len(month_cols), row_count), dtype=block.dtype)
+            elif np.result_type(sales.dtype, block.dtype) != sales.dtype:
+                sales = sales.astype(np.result_type(sales.dtype, block.dtype))
+            sales[:, offset:offset + block.shape[1]] = block
+        offset += len(chunk)
+        del chunk
+
+    totals = pd.concat(total_pieces, ignore_index=True) if total_pieces else pd.Series(dtype=np.float64)
+    sprzedaz_agg = pd.DataFrame({"Indeks": indeks, "sprzedaż": totals})
+    if sales is None:
+        return sprzedaz_agg, pd.DataFrame(columns=["indeks", "date", "sales"])
+
+    positions = np.flatnonzero(valid)
+    if len(positions) == len(sales_cols):
+        index = pd.RangeIndex(len(positions) * row_count)
     else:
-        mapping = {}
+        index = pd.Index(np.concatenate([np.arange(p * row_count, (p + 1) * row_count) for p in positions]))
+    monthly_sales_df = pd.DataFrame({
+        "indeks": pd.concat([indeks] * len(positions), ignore_index=True).array,
+        "date": np.repeat(dates.to_numpy()[valid], row_count),
+        "sales": sales.reshape(-1),
+    }, index=index, copy=False)
+    return sprzedaz_agg, monthly_sales_df
 
-    # 4. Łączenie Danych
-    df = stany.copy()
-    if not bomy_agg.empty:
-        df = pd.merge(df, bomy_agg, on="Indeks", how="left")
-    if not minimum.empty:
-        df = pd.merge(df, minimum, on="Indeks", how="left")
-    if not sprzedaz_agg.empty:
-        df = pd.merge(df, sprzedaz_agg, on="Indeks", how="left")
 
+def _compact_series(series, category_max_share=0.5):
+    """Zwęża typ kolumny bez utraty informacji (patrz compact_dtypes)."""
+    if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if pd.api.types.is_float_dtype(series):
+        narrow = series.astype(np.float32)
+        if np.array_equal(narrow.to_numpy(dtype=np.float64), series.to_numpy(dtype=np.float64), equal_nan=True):
+            return narrow
+        return series
+    if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+        if len(series) and series.nunique(dropna=False) <= category_max_share * len(series):
+            return series.astype("category")
+        if pa is not None:
+            return series.astype(pd.StringDtype("pyarrow"))
+    return series
+
+
+def compact_dtypes(df, category_max_share=0.5):
+    """
+    Zwraca ramkę ze zwężonymi typami: liczby całkowite do najmniejszego
+    wystarczającego typu, float64 do float32 tylko bez utraty wartości,
+    powtarzające się teksty (unikalnych <= category_max_share wierszy) jako
+    kategorie, pozostałe teksty jako string[pyarrow] (jeśli jest pyarrow).
+    """
+    return pd.DataFrame(
+        {col: _compact_series(df[col], category_max_share) for col in df.columns},
+        index=df.index,
+    )
+
+
+def _report_memory(stage, enabled):
+    if enabled:
+        print(f"[pamięć] {stage}: {format_memory(memory_snapshot())}")
+
+
+def merge_inputs(stany, bomy_agg, minimum, sprzedaz_agg):
+    """Dołącza do stanów sumy BOM, minima i sumy sprzedaży (po kolumnie 'Indeks')."""
+    # stany pochodzą z pamięci podręcznej - nie kopiujemy ich, ale też nie modyfikujemy
+    # w miejscu (merge i rename zwracają nowe ramki)
+    df = stany
+    for name, other in (("merge_bom", bomy_agg), ("merge_minimum", minimum), ("merge_sales", sprzedaz_agg)):
+        if not other.empty:
+            with profiling.stage(name) as record:
+                df = pd.merge(df, other, on="Indeks", how="left")
+                record["rows"] = len(df)
+    return df
+
+
+def finalize_frame(df, mapping, compact=False):
+    """Ujednolica kolumny połączonej ramki, wylicza alerty i dopasowania nazw."""
     # Czyszczenie i przygotowanie finalnych kolumn
-    df.rename(columns={
+    df = df.rename(columns={
         "Indeks": "indeks",
         "Name": "nazwa",
         "Ilość na stanie": "stan",
         "Minimum": "minimum"
-    }, inplace=True)
+    })
 
     # Upewnienie się, że kluczowe kolumny istnieją i mają odpowiedni typ
     final_cols_spec = {
@@ -129,4 +569,133 @@ def process_data_files(stany_path, bomy_path, minimum_path, sprzedaz_path):
     if "nazwa" in df.columns and mapping:
          df["match"] = df["nazwa"].map(mapping).fillna("-")
 
-    return df[list(final_cols_spec.keys())], monthly_sales_df
+    df = df[list(final_cols_spec.keys())]
+    return compact_dtypes(df) if compact else df
+
+
+def build_final_frame(stany, bomy_agg, minimum, sprzedaz_agg, mapping, compact=False):
+    """Łączy dane wejściowe w ujednoliconą ramkę i wylicza alerty."""
+    return finalize_frame(merge_inputs(stany, bomy_agg, minimum, sprzedaz_agg), mapping, compact=compact)
+
+
+def _is_used_sales_column(col):
+    return col in ("GSM1", "Name") or bool(SALES_COLUMN_PATTERN.match(col))
+
+
+def process_data_files(stany_path, bomy_path, minimum_path, sprzedaz_path, match_cache_path=MATCH_CACHE_PATH,
+                       use_snapshots=True, sales_memory_limit_mb=SALES_MEMORY_LIMIT_MB,
+                       compact=False, report_memory=False, progress_callback=None, should_cancel=None):
+    """
+    Wczytuje i przetwarza dane z plików CSV, tworząc ujednoliconą ramkę danych.
+    match_cache_path wskazuje trwałą pamięć dopasowań nazw (None - bez pamięci).
+    use_snapshots włącza kolumnowe migawki plików wejściowych (patrz read_input_file).
+    Plik sprzedaży większy niż sales_memory_limit_mb jest przetwarzany strumieniowo
+    (None - zawsze w całości w pamięci).
+    compact=True zwraca ramki ze zwężonymi typami i kategoriami (patrz compact_dtypes),
+    report_memory=True wypisuje bieżące i szczytowe zużycie pamięci po każdym etapie.
+    progress_callback(postęp, opis) dostaje postęp (0..1) po każdym etapie, a gdy
+    should_cancel() zwróci True, przetwarzanie przerywa się między etapami (lub blokami
+    dopasowania nazw) wyjątkiem TaskCancelled.
+    Wczytane i zagregowane dane są zapamiętywane per plik, więc ponowne
+    wywołanie po zmianie jednego pliku przelicza tylko zależne od niego etapy.
+    """
+    fingerprints = {
+        "stany": file_fingerprint(stany_path),
+        "bomy": file_fingerprint(bomy_path),
+        "minimum": file_fingerprint(minimum_path),
+        "sprzedaz": file_fingerprint(sprzedaz_path),
+    }
+
+    def step(progress, message):
+        checkpoint(should_cancel, progress_callback, progress, message)
+
+    # Wczytywanie danych, tworzenie pustych ramek w razie braku plików
+    try:
+        step(0.0, "Wczytywanie stanów")
+        # Stany i minimum trafiają w całości do łączenia, więc wczytujemy wszystkie kolumny;
+        # z BOM-ów i sprzedaży tylko kolumny używane w dalszych etapach.
+        with profiling.stage("read_stany") as record:
+            stany = _cached_stage(
+                "stany", fingerprints["stany"], lambda: read_input_file(stany_path, use_snapshot=use_snapshots)
+            )
+            record["rows"] = len(stany)
+        if stany.empty:
+            return pd.DataFrame(), pd.DataFrame()
+
+        step(0.1, "Wczytywanie minimum")
+        with profiling.stage("read_minimum") as record:
+            minimum = _cached_stage(
+                "minimum", fingerprints["minimum"], lambda: read_input_file(minimum_path, use_snapshot=use_snapshots)
+            )
+            record["rows"] = len(minimum)
+        _report_memory("wczytanie stanów i minimum", report_memory)
+
+        # 1. Przetwarzanie BOM-ów
+        step(0.15, "Agregacja BOM")
+        def compute_bom():
+            with profiling.stage("read_bomy") as record:
+                bomy = read_input_file(
+                    bomy_path, usecols=lambda c: c in ("Indeks", "Ilość", "Nazwa"), use_snapshot=use_snapshots
+                )
+                record["rows"] = len(bomy)
+            return aggregate_bom(bomy)
+
+        with profiling.stage("bom_agg") as record:
+            bomy_agg, bom_names = _cached_stage("bomy", fingerprints["bomy"], compute_bom)
+            record["rows"] = len(bomy_agg)
+        _report_memory("agregacja BOM", report_memory)
+
+        # 2. Przetwarzanie Sprzedaży (UELASTYCZNIONE)
+        step(0.3, "Agregacja sprzedaży")
+        def compute_sales():
+            if sales_memory_limit_mb and fingerprints["sprzedaz"] \
+                    and fingerprints["sprzedaz"][1] > sales_memory_limit_mb * 1024 * 1024:
+                with profiling.stage("sales_streaming"):
+                    sales_agg, monthly = aggregate_sales_streaming(sprzedaz_path, sales_memory_limit_mb)
+            else:
+                with profiling.stage("read_sprzedaz") as record:
+                    sprzedaz = read_input_file(
+                        sprzedaz_path, usecols=_is_used_sales_column, use_snapshot=use_snapshots
+                    )
+                    record["rows"] = len(sprzedaz)
+                with profiling.stage("sales_melt"):
+                    sales_agg, monthly = aggregate_sales(sprzedaz)
+            return sales_agg, compact_dtypes(monthly) if compact else monthly
+
+        with profiling.stage("sales") as record:
+            sprzedaz_agg, monthly_sales_df = _cached_stage(
+                "sprzedaz", (fingerprints["sprzedaz"], compact), compute_sales
+            )
+            record["rows"] = len(monthly_sales_df)
+        _report_memory("sprzedaż (suma i format długi)", report_memory)
+    except TaskCancelled:
+        raise
+    except Exception as e:
+        print(f"Błąd podczas wczytywania plików CSV: {e}")
+        return pd.DataFrame(), pd.DataFrame()
+
+    # 3. Fuzzy Match
+    step(0.5, "Dopasowanie nazw")
+    def compute_mapping():
+        if "Name" in stany.columns and bom_names is not None:
+            stany_names = stany["Name"].unique()
+            if match_cache_path:
+                return FuzzyMatchCache(match_cache_path).match(bom_names, stany_names, should_cancel=should_cancel)
+            return fuzzy_match(bom_names, stany_names, should_cancel=should_cancel)
+        return {}
+
+    with profiling.stage("fuzzy_match") as record:
+        mapping = _cached_stage(
+            "mapping", (fingerprints["stany"], fingerprints["bomy"], match_cache_path), compute_mapping
+        )
+        record["rows"] = len(mapping)
+    _report_memory("dopasowanie nazw", report_memory)
+
+    # 4. Łączenie Danych
+    step(0.8, "Łączenie danych i alerty")
+    merged = merge_inputs(stany, bomy_agg, minimum, sprzedaz_agg)
+    with profiling.stage("alerts", rows=len(merged)):
+        df = finalize_frame(merged, mapping, compact=compact)
+    _report_memory("łączenie i alerty", report_memory)
+    step(1.0, "Gotowe")
+    return df, monthly_sales_df
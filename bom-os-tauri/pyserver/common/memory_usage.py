@@ -0,0 +1,70 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:  # psutil jest opcjonalny - bez niego RSS nie jest dostępny na każdej platformie
+    import psutil
+except ImportError:
+    psutil = None
+
+try:  # moduł resource nie istnieje na Windows
+    import resource
+except ImportError:
+    resource = None
+
+
+def memory_snapshot():
+    """
+    Zwraca bieżące (rss_mb) i szczytowe (peak_mb) zużycie pamięci procesu w MB.
+    Wartości niedostępne na danej platformie są równe None.
+    """
+    rss_mb = peak_mb = None
+    if psutil is not None:
+        info = psutil.Process(os.getpid()).memory_info()
+        rss_mb = info.rss / 2**20
+        if hasattr(info, "peak_wset"):  # Windows
+            peak_mb = info.peak_wset / 2**20
+    if peak_mb is None and resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux podaje ru_maxrss w KB, macOS w bajtach
+        peak_mb = max_rss / 2**20 if os.uname().sysname == "Darwin" else max_rss / 2**10
+    return {"rss_mb": rss_mb, "peak_mb": peak_mb}
+
+
+def format_memory(snapshot):
+    """Krótki opis migawki pamięci do logów."""
+    def mb(value):
+        return f"{value:.1f} MB" if value is not None else "n/d"
+    return f"RSS {mb(snapshot['rss_mb'])}, szczyt {mb(snapshot['peak_mb'])}"
+
+
+@contextmanager
+def track_peak_rss(interval=0.05):
+    """
+    Mierzy szczytowe RSS (MB) bloku kodu - także pamięć alokowaną poza Pythonem
+    (np. drzewa scikit-learn), której tracemalloc nie widzi. Wynik trafia do
+    zwracanego słownika pod kluczem peak_mb po wyjściu z bloku. Bez psutil
+    zwracany jest szczyt całego procesu (ru_maxrss), o ile jest dostępny.
+    """
+    result = {"peak_mb": None}
+    if psutil is None:
+        yield result
+        result["peak_mb"] = memory_snapshot()["peak_mb"]
+        return
+    process = psutil.Process(os.getpid())
+    peak = process.memory_info().rss
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(interval):
+            peak = max(peak, process.memory_info().rss)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield result
+    finally:
+        done.set()
+        sampler.join()
+        result["peak_mb"] = max(peak, process.memory_info().rss) / 2**20
@@ -0,0 +1,148 @@
+"""
+Opcjonalne pomiary etapów przetwarzania (czas, CPU, liczba wierszy, pamięć).
+
+Kod aplikacji oznacza etapy przez `with profiling.stage("nazwa") as record:`;
+bez aktywnego nagrywania jest to praktycznie darmowe. Nagrywanie włącza się
+w wątku wykonującym zadanie:
+
+    with profiling.recording(cprofile_path="last_run.prof") as recorder:
+        process_data_files(...)
+    print(recorder.summary())
+    recorder.to_json("profile.json")
+"""
+import cProfile
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from .memory_usage import memory_snapshot
+
+_state = threading.local()
+_last_run = None
+_last_run_lock = threading.Lock()
+
+
+class StageRecorder:
+    """Zbiera rekordy kolejnych (także zagnieżdżonych) etapów jednego przebiegu."""
+
+    def __init__(self, label="", trace_memory=True):
+        self.label = label
+        self.trace_memory = trace_memory
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.stages = []
+        self.cprofile_path = None
+        self._open = []
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        record = {"stage": name, "depth": len(self._open), "rows": rows}
+        if self.trace_memory and tracemalloc.is_tracing():
+            self._fold_peak()
+            record["_alloc_start"] = tracemalloc.get_traced_memory()[0]
+            record["_peak"] = record["_alloc_start"]
+        self._open.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall, 6)
+            record["cpu_s"] = round(time.process_time() - cpu, 6)
+            self._open.pop()
+            if "_alloc_start" in record:
+                self._fold_peak(record)
+                record["alloc_mb"] = round((record.pop("_peak") - record.pop("_alloc_start")) / 2**20, 3)
+            record["rss_mb"] = memory_snapshot()["rss_mb"]
+            self.stages.append(record)
+
+    def _fold_peak(self, closing=None):
+        """Przenosi szczyt tracemalloc do otwartych etapów i zeruje go dla kolejnego pomiaru."""
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self._open + ([closing] if closing else []):
+            record["_peak"] = max(record["_peak"], peak)
+        tracemalloc.reset_peak()
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "started_at": self.started_at,
+            "cprofile_path": self.cprofile_path,
+            "stages": self.stages,
+        }
+
+    def to_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    def summary(self, limit=4):
+        """Krótki opis najwolniejszych etapów najwyższego poziomu, np. do paska stanu."""
+        top = sorted((s for s in self.stages if s["depth"] == 0), key=lambda s: s["wall_s"], reverse=True)
+        total = sum(s["wall_s"] for s in self.stages if s["depth"] == 0)
+        parts = [f"{s['stage']} {s['wall_s']:.2f}s" for s in top[:limit]]
+        return f"{self.label or 'Profil'}: {total:.2f}s ({', '.join(parts)})"
+
+
+class _NullRecord(dict):
+    """Rekord zwracany, gdy nagrywanie jest wyłączone - przypisania są ignorowane."""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+@contextmanager
+def stage(name, rows=None):
+    """Oznacza etap w aktywnym nagrywaniu bieżącego wątku (bez nagrywania nic nie robi)."""
+    recorder = getattr(_state, "recorder", None)
+    if recorder is None:
+        yield _NullRecord()
+        return
+    with recorder.stage(name, rows) as record:
+        yield record
+
+
+@contextmanager
+def recording(label="", trace_memory=True, cprofile_path=None):
+    """
+    Włącza nagrywanie etapów w bieżącym wątku. trace_memory uruchamia tracemalloc
+    (liczone są alokacje każdego etapu), cprofile_path zapisuje dodatkowo profil
+    cProfile całego przebiegu (do obejrzenia np. w snakeviz jako wykres płomieniowy).
+    Po zakończeniu nagranie jest dostępne przez last_run().
+    """
+    global _last_run
+    recorder = StageRecorder(label, trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if cprofile_path else None
+    previous = getattr(_state, "recorder", None)
+    _state.recorder = recorder
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield recorder
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+            recorder.cprofile_path = cprofile_path
+        _state.recorder = previous
+        if started_tracing:
+            tracemalloc.stop()
+        with _last_run_lock:
+            _last_run = recorder
+
+
+def last_run():
+    """Ostatnie zakończone nagranie (z dowolnego wątku) albo None."""
+    with _last_run_lock:
+        return _last_run
+
+
+def profiled(fn, label="", **recording_kwargs):
+    """Opakowuje funkcję tak, by każde jej wywołanie było nagrywane."""
+    def wrapper(*args, **kwargs):
+        with recording(label or getattr(fn, "__name__", ""), **recording_kwargs):
+            return fn(*args, **kwargs)
+    return wrapper
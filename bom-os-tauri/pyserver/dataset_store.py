@@ -0,0 +1,258 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+FILTER_COLUMNS = ("alert", "bom", "ai_alert")
+SEARCH_COLUMNS = ("nazwa", "indeks")
+MAX_CACHED_VIEWS = 32
+
+
+class SearchIndex:
+    """
+    Case-insensitive substring search over the nazwa/indeks text of every row.
+    Rows are indexed by the trigrams of their text (three characters packed into
+    one integer): a query of 3+ characters only scans the rows containing all of its
+    trigrams, shorter queries scan everything.
+    """
+    def __init__(self, df: pd.DataFrame, columns=SEARCH_COLUMNS):
+        text = pd.Series("", index=pd.RangeIndex(len(df)), dtype="str")
+        for col in columns:
+            if col in df.columns:
+                text = text + "\x1f" + df[col].astype("str").fillna("").str.lower().reset_index(drop=True)
+        self.text = text
+        self._build_postings()
+
+    def _trigram_codes(self, code_points):
+        """Trigram starting at every character, as one integer over the dense alphabet of the text."""
+        letters = self._alphabet[np.minimum(code_points, len(self._alphabet) - 1)].astype(np.int64)
+        size = self._alphabet_size
+        return (letters[:-2] * size + letters[1:-1]) * size + letters[2:]
+
+    def _build_postings(self):
+        lengths = self.text.str.len().to_numpy()
+        code_points = np.frombuffer("".join(self.text.tolist()).encode("utf-32-le"), dtype=np.uint32)
+        # Dense ids of the characters present; 0 is reserved for characters absent from the text
+        present = np.bincount(code_points, minlength=1) > 0
+        self._alphabet = np.r_[np.where(present, np.cumsum(present), 0), 0].astype(np.int32)
+        self._alphabet_size = int(present.sum()) + 1
+        if len(code_points) < 3:
+            self._keys, self._rows, self._bounds = np.empty(0, np.int64), np.empty(0, np.int32), np.zeros(1, np.int64)
+            return
+
+        # Trigrams starting at every character, except those spanning two rows
+        row_of_char = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+        codes = self._trigram_codes(code_points)
+        rows = row_of_char[:-2]
+        within_row = rows == row_of_char[2:]
+
+        codes, rows = codes[within_row], rows[within_row]
+        if len(codes) and codes.max() < 2**31 and len(lengths) <= 2**32:
+            # (trigram, row) packed into one int64 - sorting groups rows by trigram, ascending
+            pairs = np.sort((codes << 32) | rows)
+            pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]  # a trigram repeated within one row
+            codes, rows = pairs >> 32, pairs & 0xFFFFFFFF
+        else:
+            # Large alphabets (e.g. many CJK characters) overflow the packed pair
+            order = np.lexsort((rows, codes))
+            codes, rows = codes[order], rows[order]
+            keep = np.r_[True, (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])]
+            codes, rows = codes[keep], rows[keep]
+        self._rows = rows.astype(np.int32)
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        self._keys = codes[starts]
+        self._bounds = np.r_[starts, len(codes)]
+
+    def _postings(self, code):
+        i = np.searchsorted(self._keys, code)
+        if i == len(self._keys) or self._keys[i] != code:
+            return self._rows[:0]
+        return self._rows[self._bounds[i]:self._bounds[i + 1]]
+
+    def search(self, query: str) -> np.ndarray:
+        """Sorted positions of the rows whose nazwa or indeks contains query."""
+        query = query.lower()
+        if len(query) < 3:
+            candidates = np.arange(len(self.text))
+        else:
+            query_codes = np.unique(self._trigram_codes(np.frombuffer(query.encode("utf-32-le"), dtype=np.uint32)))
+            postings = sorted((self._postings(code) for code in query_codes), key=len)
+            candidates = postings[0]
+            in_posting = np.zeros(len(self.text), dtype=bool)
+            for other in postings[1:]:
+                if not len(candidates):
+                    break
+                in_posting[:] = False
+                in_posting[other] = True
+                candidates = candidates[in_posting[candidates]]
+        if not len(candidates):
+            return candidates
+        found = self.text.iloc[candidates].str.contains(query, regex=False).to_numpy()
+        return candidates[found]
+
+
+class Dataset:
+    """
+    One processed table held by the sidecar: the merged frame shown to the user
+    and the long-format monthly sales used for forecasting. Sort orders, filter
+    codes, the search index and recent row views are built lazily and dropped
+    whenever the frame is replaced.
+    """
+    def __init__(self, df: pd.DataFrame, monthly_sales_df: pd.DataFrame, source=None):
+        self.id = uuid.uuid4().hex
+        self.monthly_sales_df = monthly_sales_df
+        self.source = source or {}
+        self.created_at = time.time()
+        self._lock = threading.Lock()
+        self.df = df
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame):
+        with self._lock:
+            self._df = df
+            self._sort_orders = {}  # (column, descending) -> row positions
+            self._filter_codes = {}  # column -> (codes, uniques)
+            self._search_index = None
+            self._views = OrderedDict()  # view key -> row positions
+
+    def memory_bytes(self):
+        return int(self.df.memory_usage(deep=True).sum() + self.monthly_sales_df.memory_usage(deep=True).sum())
+
+    def facets(self):
+        """Distinct values of the filterable columns, e.g. for filter drop-downs."""
+        with self._lock:
+            return {
+                col: [str(v) for v in self._codes(col)[1]]
+                for col in FILTER_COLUMNS if col in self._df.columns
+            }
+
+    def describe(self):
+        return {
+            "dataset_id": self.id,
+            "row_count": len(self.df),
+            "columns": [str(c) for c in self.df.columns],
+            "facets": self.facets(),
+            "source": self.source,
+        }
+
+    def _sort_order(self, column, descending):
+        key = (column, descending)
+        order = self._sort_orders.get(key)
+        if order is None:
+            values = self._df[column].reset_index(drop=True)
+            try:
+                ordered = values.sort_values(ascending=not descending, kind="stable", na_position="last")
+            except TypeError:  # mixed types in one column - compare as text
+                ordered = values.astype("str").sort_values(ascending=not descending, kind="stable", na_position="last")
+            order = ordered.index.to_numpy()
+            self._sort_orders[key] = order
+        return order
+
+    def _codes(self, column):
+        codes = self._filter_codes.get(column)
+        if codes is None:
+            codes = pd.factorize(self._df[column].astype("str"))
+            self._filter_codes[column] = codes
+        return codes
+
+    def _filter_mask(self, filters):
+        mask = np.ones(len(self._df), dtype=bool)
+        for column, value in filters:
+            codes, uniques = self._codes(column)
+            matches = np.flatnonzero(uniques == value)
+            if not len(matches):
+                return np.zeros(len(self._df), dtype=bool)
+            mask &= codes == matches[0]
+        return mask
+
+    def view(self, sort=None, descending=False, filters=None, search=None) -> np.ndarray:
+        """
+        Positions of the rows matching filters ({column: value} on FILTER_COLUMNS)
+        and search (substring of nazwa/indeks), in the requested sort order.
+        Recent views are cached, so paging through one view only slices it.
+        """
+        filters = tuple(sorted((filters or {}).items()))
+        key = (sort, bool(descending), filters, search or None)
+        with self._lock:
+            positions = self._views.get(key)
+            if positions is not None:
+                self._views.move_to_end(key)
+                return positions
+
+            mask = self._filter_mask(filters) if filters else None
+            if search:
+                if self._search_index is None:
+                    self._search_index = SearchIndex(self._df)
+                found = np.zeros(len(self._df), dtype=bool)
+                found[self._search_index.search(search)] = True
+                mask = found if mask is None else mask & found
+
+            if sort is not None:
+                positions = self._sort_order(sort, bool(descending))
+                if mask is not None:
+                    positions = positions[mask[positions]]
+            else:
+                positions = np.arange(len(self._df)) if mask is None else np.flatnonzero(mask)
+
+            self._views[key] = positions
+            while len(self._views) > MAX_CACHED_VIEWS:
+                self._views.popitem(last=False)
+            return positions
+
+    def warm_up(self):
+        """Builds the search index ahead of the first search (meant for a background thread)."""
+        df = self.df
+        index = SearchIndex(df)
+        with self._lock:
+            if self._df is df and self._search_index is None:
+                self._search_index = index
+
+    def rows(self, offset=0, limit=100, **view_kwargs):
+        """Returns (window of the view as a frame, number of rows in the whole view)."""
+        positions = self.view(**view_kwargs)
+        return self.df.iloc[positions[offset:offset + limit]], len(positions)
+
+
+class DatasetStore:
+    """
+    Datasets addressed by id, so that clients refer to a processed table instead
+    of sending it back with every request. The least recently used dataset is
+    dropped once more than max_datasets are held.
+    """
+    def __init__(self, max_datasets=4):
+        self.max_datasets = max_datasets
+        self._datasets = OrderedDict()  # dataset_id -> Dataset
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._datasets)
+
+    def add(self, df: pd.DataFrame, monthly_sales_df: pd.DataFrame, source=None) -> Dataset:
+        dataset = Dataset(df, monthly_sales_df, source)
+        with self._lock:
+            self._datasets[dataset.id] = dataset
+            while len(self._datasets) > self.max_datasets:
+                self._datasets.popitem(last=False)
+        return dataset
+
+    def get(self, dataset_id):
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+            if dataset is not None:
+                self._datasets.move_to_end(dataset_id)
+            return dataset
+
+    def remove(self, dataset_id) -> bool:
+        with self._lock:
+            return self._datasets.pop(dataset_id, None) is not None
+
+    def list(self):
+        with self._lock:
+            return list(self._datasets.values())
@@ -0,0 +1,126 @@
+"""
+Append-only store of user corrections of AI alerts.
+
+Corrections live in an SQLite table indexed on (indeks, id) and created_at:
+appends are a single INSERT, the latest correction of every indeks is an index
+lookup, and the whole history can be exported for training. The database runs
+in WAL mode, so the Qt app and the sidecar can write to it at the same time.
+A feedback_log.csv written by older versions is migrated on first use.
+"""
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+# Row values kept with every correction - the features of the AI model (ai_logic.FEATURES)
+VALUE_COLUMNS = ("stan", "minimum", "ilośćBom", "sprzedaż")
+BUSY_TIMEOUT_S = 30
+
+_VALUES_SQL = ", ".join(f'"{col}"' for col in VALUE_COLUMNS)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    indeks TEXT NOT NULL,
+    alert TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    {", ".join(f'"{col}" NUMERIC' for col in VALUE_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS feedback_indeks ON feedback (indeks, id);
+CREATE INDEX IF NOT EXISTS feedback_created_at ON feedback (created_at);
+"""
+_INSERT_SQL = (f"INSERT INTO feedback (indeks, alert, created_at, {_VALUES_SQL}) "
+               f"VALUES ({', '.join('?' * (3 + len(VALUE_COLUMNS)))})")
+_COLUMNS_SQL = f"id, indeks, alert, created_at, {_VALUES_SQL}"
+
+
+class FeedbackStore:
+    """
+    Corrections (indeks, corrected alert, time, row values) in the SQLite database
+    at path. Every call uses its own short-lived connection, so one store can be
+    shared by threads and passed to worker processes.
+    """
+    def __init__(self, path, legacy_csv_path=None):
+        self.path = path
+        self.legacy_csv_path = legacy_csv_path
+        self._ready = False
+
+    def _exists(self):
+        """Whether there is anything to read - reads never create an empty database."""
+        return self._ready or os.path.exists(self.path) or bool(
+            self.legacy_csv_path and os.path.exists(self.legacy_csv_path))
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_S)
+        if not self._ready:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            if self.legacy_csv_path and os.path.exists(self.legacy_csv_path):
+                self._migrate_csv(connection, self.legacy_csv_path)
+            self._ready = True
+        return connection
+
+    @staticmethod
+    def _records(rows: pd.DataFrame, alerts, created_at):
+        values = rows.reindex(columns=list(VALUE_COLUMNS)).astype(object)
+        values = values.where(values.notna(), None).to_numpy().tolist()
+        return [(str(indeks), str(alert), created_at, *row)
+                for indeks, alert, row in zip(rows["indeks"].tolist(), alerts, values)]
+
+    def _migrate_csv(self, connection, csv_path):
+        """Moves the rows of a feedback_log.csv into the table (in file order) and renames the file."""
+        connection.execute("BEGIN IMMEDIATE")  # a second process waits here, then finds the file gone
+        try:
+            if os.path.exists(csv_path):
+                log = pd.read_csv(csv_path, dtype={"indeks": str})
+                if "indeks" in log.columns and "alert" in log.columns:
+                    log = log.dropna(subset=["indeks", "alert"])
+                    connection.executemany(_INSERT_SQL, self._records(log, log["alert"].tolist(),
+                                                                      os.path.getmtime(csv_path)))
+                os.replace(csv_path, csv_path + ".migrated")
+                print(f"Migrated {len(log)} corrections from {csv_path} to {self.path}.")
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def add(self, rows: pd.DataFrame, alert):
+        """Appends one correction per row (its indeks and values) with the corrected alert; returns their count."""
+        records = self._records(rows, [alert] * len(rows), time.time())
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(_INSERT_SQL, records)
+        return len(records)
+
+    def last_id(self):
+        """Id of the newest correction (0 when empty); grows with every append, from any process."""
+        if not self._exists():
+            return 0
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT MAX(id) FROM feedback").fetchone()[0] or 0
+
+    def count(self):
+        if not self._exists():
+            return 0
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+
+    def _query(self, sql, params=()):
+        if not self._exists():
+            return pd.DataFrame(columns=["id", "indeks", "alert", "created_at", *VALUE_COLUMNS])
+        with closing(self._connect()) as connection:
+            frame = pd.read_sql_query(sql, connection, params=params)
+        frame["indeks"] = frame["indeks"].astype(str)
+        return frame
+
+    def latest(self, since_id=0):
+        """The newest correction of every indeks among corrections newer than since_id, oldest first."""
+        return self._query(
+            f"SELECT {_COLUMNS_SQL} FROM feedback "
+            "WHERE id IN (SELECT MAX(id) FROM feedback WHERE id > ? GROUP BY indeks) ORDER BY id",
+            (since_id,),
+        )
+
+    def export(self, since_id=0):
+        """All corrections newer than since_id, oldest first (e.g. for training or backups)."""
+        return self._query(f"SELECT {_COLUMNS_SQL} FROM feedback WHERE id > ? ORDER BY id", (since_id,))
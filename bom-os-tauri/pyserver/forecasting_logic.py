@@ -1,60 +1,559 @@
 import pandas as pd
 import statsmodels.api as sm
 import os
+import glob
+import json
+import hashlib
+import threading
 import joblib
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
+try:  # imported as part of the pyserver package
+    from .common import profiling
+    from .common.cancellation import TaskCancelled, checkpoint
+except ImportError:  # run as a local module
+    from common import profiling  # type: ignore
+    from common.cancellation import TaskCancelled, checkpoint  # type: ignore
+
 FORECAST_MODEL_DIR = "saved_forecast_models"
 os.makedirs(FORECAST_MODEL_DIR, exist_ok=True)
 
+MIN_HISTORY_MONTHS = 24  # Need enough data for seasonality
+
+# Every product uses the same SARIMA specification
+SARIMA_SPEC = {
+    "order": (1, 1, 1),
+    "seasonal_order": (1, 1, 1, 12),
+    "enforce_stationarity": False,
+    "enforce_invertibility": False,
+}
+COMPACT_FORMAT_VERSION = 1
+
+# Batch engine: every product at once on a product x month matrix
+FORECAST_STEPS = 24
+SEASON_LENGTH = 12
+INTERMITTENT_ADI = 1.32  # average demand interval above which demand is intermittent (Syntetos-Boylan)
+SES_ALPHAS = np.linspace(0.1, 0.9, 9)  # each product uses the one with the lowest in-sample error
+HOLT_WINTERS_PARAMS = {"alpha": 0.3, "beta": 0.05, "gamma": 0.2, "phi": 0.9}  # phi damps the trend
+CROSTON_ALPHA = 0.1
+METHOD_SES, METHOD_HOLT_WINTERS, METHOD_CROSTON, METHOD_SARIMAX = "ses", "holt_winters", "croston", "sarimax"
+
 def get_model_path(product_id):
+    return os.path.join(FORECAST_MODEL_DIR, f"forecast_model_{product_id}.npz")
+
+def get_legacy_model_path(product_id):
+    """Path of a model pickled as a full SARIMAXResults object by older versions."""
     return os.path.join(FORECAST_MODEL_DIR, f"forecast_model_{product_id}.joblib")
 
+def saved_model_exists(product_id) -> bool:
+    return os.path.exists(get_model_path(product_id)) or os.path.exists(get_legacy_model_path(product_id))
+
+def get_fingerprint_path(product_id):
+    return os.path.join(FORECAST_MODEL_DIR, f"forecast_model_{product_id}.sha1")
+
+def series_fingerprint(sales_data: pd.Series) -> str:
+    """
+    Returns a stable hash of the sales history (dates and values) a model is trained on.
+    """
+    hashed = pd.util.hash_pandas_object(sales_data, index=True)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()
+
+def read_saved_fingerprint(product_id):
+    """
+    Returns the fingerprint stored next to a saved model, or None if there is no model.
+    """
+    fingerprint_path = get_fingerprint_path(product_id)
+    if not saved_model_exists(product_id) or not os.path.exists(fingerprint_path):
+        return None
+    with open(fingerprint_path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+def is_forecast_model_up_to_date(sales_data: pd.Series, product_id) -> bool:
+    """
+    Checks whether a saved model exists and was trained on exactly this sales history.
+    """
+    return read_saved_fingerprint(product_id) == series_fingerprint(sales_data)
+
+def fit_forecast_model(sales_data: pd.Series):
+    """
+    Fits the SARIMA model used for every product. Raises on failure.
+    """
+    # A simple SARIMA model, assuming monthly data with yearly seasonality
+    model = sm.tsa.SARIMAX(sales_data, **SARIMA_SPEC)
+    with profiling.stage("forecast_fit", rows=len(sales_data)):
+        return model.fit(disp=False)
+
+class CompactForecastModel:
+    """
+    A fitted SARIMA model kept as what is needed to rebuild it without refitting:
+    the fitted parameters, the model specification and the observed series.
+    The Kalman filter runs only when a forecast is requested, so a cached model
+    takes a few KB instead of the several MB of a full SARIMAXResults.
+    """
+    def __init__(self, endog: pd.Series, spec: dict, params: np.ndarray):
+        self.endog = endog
+        self.spec = spec
+        self.params = params
+
+    @classmethod
+    def from_results(cls, results):
+        model = results.model
+        spec = {
+            "format_version": COMPACT_FORMAT_VERSION,
+            "order": list(model.order),
+            "seasonal_order": list(model.seasonal_order),
+            "enforce_stationarity": bool(model.enforce_stationarity),
+            "enforce_invertibility": bool(model.enforce_invertibility),
+            "param_names": list(model.param_names),
+            "freq": getattr(model._index, "freqstr", None),
+        }
+        index = model._index if isinstance(model._index, pd.DatetimeIndex) else None
+        endog = pd.Series(np.asarray(model.endog, dtype=float).ravel(), index=index)
+        return cls(endog, spec, np.asarray(results.params, dtype=float))
+
+    @property
+    def nbytes(self):
+        return int(self.params.nbytes + self.endog.memory_usage(index=True))
+
+    def filter(self):
+        """The fitted SARIMAXResults, rebuilt by filtering with the stored parameters."""
+        model = sm.tsa.SARIMAX(
+            self.endog,
+            order=tuple(self.spec["order"]),
+            seasonal_order=tuple(self.spec["seasonal_order"]),
+            enforce_stationarity=self.spec["enforce_stationarity"],
+            enforce_invertibility=self.spec["enforce_invertibility"],
+        )
+        return model.filter(self.params)
+
+    def get_forecast(self, steps=1, **kwargs):
+        return self.filter().get_forecast(steps=steps, **kwargs)
+
+def save_compact_model(results, path):
+    """
+    Stores a fitted model (SARIMAXResults or CompactForecastModel) in the compact
+    format: parameters, specification and observed series, a few KB per product.
+    """
+    if not isinstance(results, CompactForecastModel):
+        results = CompactForecastModel.from_results(results)
+    arrays = {
+        "params": results.params,
+        "endog": results.endog.to_numpy(dtype=float),
+        "spec": np.array(json.dumps(results.spec)),
+    }
+    if isinstance(results.endog.index, pd.DatetimeIndex):
+        arrays["dates"] = results.endog.index.values
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+def load_compact_model(path):
+    """
+    Reads a compact file as a CompactForecastModel; no optimisation (refit)
+    takes place, and the Kalman filter runs only once a forecast is requested.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        spec = json.loads(str(data["spec"]))
+        params = data["params"]
+        index = pd.DatetimeIndex(data["dates"], freq=spec["freq"]) if "dates" in data.files else None
+        endog = pd.Series(data["endog"], index=index)
+    return CompactForecastModel(endog, spec, params)
+
+def save_forecast_model(results, sales_data: pd.Series, product_id):
+    """
+    Saves a fitted model together with the fingerprint of its training data.
+    """
+    save_compact_model(results, get_model_path(product_id))
+    with open(get_fingerprint_path(product_id), "w", encoding="utf-8") as f:
+        f.write(series_fingerprint(sales_data))
+
 def train_and_save_forecast_model(sales_data: pd.Series, product_id):
     """
     Trains a SARIMA model and saves it.
     Assumes sales_data is a Series with a monthly DatetimeIndex.
     """
-    if len(sales_data) < 24: # Need enough data for seasonality
+    if len(sales_data) < MIN_HISTORY_MONTHS:
         print(f"Not enough historical data for product {product_id} to train a forecast model.")
         return None
         
     try:
-        # A simple SARIMA model, assuming monthly data with yearly seasonality
-        model = sm.tsa.SARIMAX(
-            sales_data,
-            order=(1, 1, 1),
-            seasonal_order=(1, 1, 1, 12),
-            enforce_stationarity=False,
-            enforce_invertibility=False
-        )
-        results = model.fit(disp=False)
+        results = fit_forecast_model(sales_data)
         
         # Save the fitted model
-        joblib.dump(results, get_model_path(product_id))
+        save_forecast_model(results, sales_data, product_id)
         print(f"Forecast model for product {product_id} trained and saved.")
         return results
     except Exception as e:
         print(f"Error training forecast model for product {product_id}: {e}")
         return None
 
+class ForecastModelCache:
+    """
+    Bounded in-memory LRU cache of fitted forecast models keyed by product id.
+    Every entry remembers the fingerprint of the sales history it was trained on,
+    so a lookup with a different fingerprint is a miss. Entries are evicted in
+    least-recently-used order once either max_entries or max_bytes is exceeded.
+    """
+    def __init__(self, max_entries=256, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # product_id -> (fingerprint, model, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, product_id, fingerprint):
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is None:
+                return None
+            if entry[0] != fingerprint:
+                self._remove(product_id)
+                return None
+            self._entries.move_to_end(product_id)
+            return entry[1]
+
+    def put(self, product_id, fingerprint, model, size):
+        with self._lock:
+            if product_id in self._entries:
+                self._remove(product_id)
+            self._entries[product_id] = (fingerprint, model, size)
+            self._total_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, product_id=None):
+        """Drops one product, or everything if product_id is None."""
+        with self._lock:
+            if product_id is None:
+                self._entries.clear()
+                self._total_bytes = 0
+            elif product_id in self._entries:
+                self._remove(product_id)
+
+    def _remove(self, product_id):
+        _, _, size = self._entries.pop(product_id)
+        self._total_bytes -= size
+
+forecast_model_cache = ForecastModelCache()
+
+def _model_size(model):
+    """In-memory footprint of a cached CompactForecastModel, used for the cache budget."""
+    return model.nbytes
+
+def get_forecast_model(sales_data: pd.Series, product_id):
+    """
+    Returns a model trained on exactly this sales history, using (in order) the
+    in-memory cache, the saved model on disk, or a fresh fit. A saved model whose
+    fingerprint does not match the current history is refitted instead of reused.
+    """
+    fingerprint = series_fingerprint(sales_data)
+    model = forecast_model_cache.get(product_id, fingerprint)
+    if model is not None:
+        return model
+
+    if read_saved_fingerprint(product_id) == fingerprint:
+        model = load_forecast_model(product_id)
+    else:
+        model = train_and_save_forecast_model(sales_data, product_id)
+
+    if model is not None:
+        # Only the parameters and the series are cached, not the filtered results
+        if not isinstance(model, CompactForecastModel):
+            model = CompactForecastModel.from_results(model)
+        forecast_model_cache.put(product_id, fingerprint, model, _model_size(model))
+    return model
+
+def split_sales_by_product(monthly_sales_df: pd.DataFrame) -> dict:
+    """
+    Splits the long monthly sales frame (indeks, date, sales) into one
+    date-indexed Series per product, in the same shape the UI passes to
+    train_and_save_forecast_model.
+    """
+    if monthly_sales_df is None or monthly_sales_df.empty:
+        return {}
+    ordered = monthly_sales_df.sort_values("date", kind="stable")
+    return {
+        product_id: group.set_index("date")["sales"]
+        for product_id, group in ordered.groupby("indeks", sort=False, observed=True)
+    }
+
+def sales_matrix(monthly_sales_df: pd.DataFrame):
+    """
+    Pivots the long (indeks, date, sales) frame into a dense product x month matrix.
+    Returns (product_ids, months, sales, first): months are month starts from the
+    first to the last month in the data, sales[i, t] sums product i's sales in month
+    t (0 without a row), first[i] is the position of its first month - earlier
+    months are not part of its history.
+    """
+    df = monthly_sales_df.dropna(subset=["date", "indeks"])  # e.g. a blank GSM1 cell in the sales file
+    dates = pd.to_datetime(df["date"])
+    codes, product_ids = pd.factorize(df["indeks"])
+    month_codes = (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+    if not len(month_codes):
+        return product_ids, pd.DatetimeIndex([], freq="MS"), np.zeros((0, 0)), np.zeros(0, dtype=np.int64)
+    start = month_codes.min()
+    columns = month_codes - start
+    span = int(columns.max()) + 1
+    values = pd.to_numeric(df["sales"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    sales = np.bincount(codes * span + columns, weights=values, minlength=len(product_ids) * span)
+    first = pd.Series(columns).groupby(codes).min().to_numpy()
+    months = pd.date_range(pd.Timestamp(year=int(start // 12), month=int(start % 12) + 1, day=1), periods=span, freq="MS")
+    return product_ids, months, sales.reshape(len(product_ids), span), first
+
+def _ses(sales, first, alphas=SES_ALPHAS):
+    """
+    Simple exponential smoothing of every row, run for all alphas at once. Returns the
+    final level (the flat forecast) of the alpha with the lowest one-step squared error.
+    """
+    n, months = sales.shape
+    alphas = np.asarray(alphas, dtype=float)[:, None]
+    level = np.broadcast_to(sales[np.arange(n), np.minimum(first, months - 1)], (len(alphas), n)).copy()
+    sse = np.zeros((len(alphas), n))
+    for t in range(months):
+        error = np.where(t > first, sales[:, t] - level, 0.0)
+        sse += error ** 2
+        level += alphas * error
+    best = sse.argmin(axis=0)
+    return level[best, np.arange(n)]
+
+def _holt_winters(sales, first, steps, m=SEASON_LENGTH, alpha=0.3, beta=0.05, gamma=0.2, phi=0.9):
+    """
+    Additive Holt-Winters with a damped trend for rows with at least two seasons of
+    history, initialised from their first two seasons. Returns (rows, steps) forecasts.
+    """
+    n, months = sales.shape
+    rows = np.arange(n)
+    first_seasons = np.take_along_axis(sales, first[:, None] + np.arange(2 * m), axis=1)
+    level = first_seasons[:, :m].mean(axis=1)
+    trend = (first_seasons[:, m:].mean(axis=1) - level) / m
+    season = first_seasons[:, :m] - level[:, None]  # indexed by (t - first) % m
+    for t in range(months):
+        active = t >= first + m
+        position = (t - first) % m
+        s = season[rows, position]
+        y = sales[:, t]
+        new_level = alpha * (y - s) + (1 - alpha) * (level + phi * trend)
+        new_trend = beta * (new_level - level) + (1 - beta) * phi * trend
+        season[rows, position] = np.where(active, gamma * (y - new_level) + (1 - gamma) * s, s)
+        level, trend = np.where(active, new_level, level), np.where(active, new_trend, trend)
+    horizon = np.arange(1, steps + 1)
+    damping = np.cumsum(phi ** horizon)
+    positions = (months - first[:, None] + horizon - 1) % m
+    return level[:, None] + damping * trend[:, None] + np.take_along_axis(season, positions, axis=1)
+
+def _croston(sales, first, alpha=CROSTON_ALPHA):
+    """
+    Croston's method with the Syntetos-Boylan bias correction: demand sizes and
+    intervals between demands are smoothed separately. Returns the flat forecast per row.
+    """
+    n, months = sales.shape
+    size, interval = np.zeros(n), np.ones(n)
+    since_demand, seen = np.zeros(n), np.zeros(n, dtype=bool)
+    for t in range(months):
+        active = t >= first
+        since_demand += active
+        y = sales[:, t]
+        demand = active & (y > 0)
+        update = demand & seen
+        size = np.where(update, size + alpha * (y - size), np.where(demand, y, size))
+        interval = np.where(update, interval + alpha * (since_demand - interval), np.where(demand, since_demand, interval))
+        seen |= demand
+        since_demand[demand] = 0
+    return np.where(seen, (1 - alpha / 2) * size / interval, 0.0)
+
+class BatchForecast:
+    """
+    Monthly sales forecasts of many products (rows of sales, columns from start),
+    with the method used for each product.
+    """
+    def __init__(self, product_ids, start, sales, methods):
+        self.product_ids = pd.Index(product_ids)
+        self.dates = pd.date_range(start, periods=sales.shape[1], freq="MS")
+        self.sales = sales
+        self.methods = methods
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def sales_forecast(self, product_id) -> pd.Series:
+        return pd.Series(self.sales[self.product_ids.get_loc(product_id)], index=self.dates)
+
+    def stock_forecast(self, product_id, current_stock):
+        """(forecast_df, stockout_date) of one product, like generate_forecast."""
+        return stock_forecast(self.sales_forecast(product_id), current_stock)
+
+    def summary(self, current_stock: pd.Series = None) -> pd.DataFrame:
+        """
+        One row per product: method, next month's and next 12 months' sales and, with
+        current_stock (stock levels indexed by indeks), the month stock runs out.
+        """
+        rounded = self.sales.round()
+        summary = pd.DataFrame({
+            "indeks": self.product_ids,
+            "method": self.methods,
+            "forecast_next_month": rounded[:, 0] if rounded.shape[1] else np.nan,
+            "forecast_12_months": rounded[:, :12].sum(axis=1),
+        })
+        if current_stock is not None:
+            stock = current_stock[~current_stock.index.duplicated()].reindex(self.product_ids).to_numpy(dtype=float)
+            out = stock[:, None] - rounded.cumsum(axis=1) <= 0
+            months = out.argmax(axis=1)
+            summary["stockout_date"] = np.where(out.any(axis=1), self.dates.to_numpy()[months], np.datetime64("NaT"))
+        return summary
+
+def forecast_batch(monthly_sales_df: pd.DataFrame, steps=FORECAST_STEPS) -> BatchForecast:
+    """
+    Forecasts every product in monthly_sales_df at once, with array operations over
+    the product x month matrix (sales_matrix): Croston for intermittent demand,
+    damped Holt-Winters for products with two full seasons, simple exponential
+    smoothing for everything else - so short histories get a forecast too.
+    """
+    product_ids, months, sales, first = sales_matrix(monthly_sales_df)
+    with profiling.stage("forecast_batch", rows=len(product_ids)):
+        n_months = sales.shape[1]
+        history = n_months - first
+        nonzero = ((sales > 0) & (np.arange(n_months) >= first[:, None])).sum(axis=1)
+        intermittent = (nonzero > 0) & (history / np.maximum(nonzero, 1) > INTERMITTENT_ADI)
+        seasonal = ~intermittent & (history >= 2 * SEASON_LENGTH)
+
+        forecasts = np.repeat(_ses(sales, first)[:, None], steps, axis=1)
+        methods = np.full(len(product_ids), METHOD_SES, dtype=object)
+        if intermittent.any():
+            forecasts[intermittent] = _croston(sales[intermittent], first[intermittent])[:, None]
+            methods[intermittent] = METHOD_CROSTON
+        if seasonal.any():
+            forecasts[seasonal] = _holt_winters(sales[seasonal], first[seasonal], steps, **HOLT_WINTERS_PARAMS)
+            methods[seasonal] = METHOD_HOLT_WINTERS
+    start = months[-1] + pd.offsets.MonthBegin(1) if len(months) else pd.Timestamp.now().normalize()
+    return BatchForecast(product_ids, start, np.clip(forecasts, 0, None), methods)
+
+def forecast_catalog(monthly_sales_df: pd.DataFrame, current_stock: pd.Series = None, steps=FORECAST_STEPS):
+    """BatchForecast.summary of every product - the whole catalog in one pass."""
+    return forecast_batch(monthly_sales_df, steps).summary(current_stock)
+
+def _train_forecast_task(product_id, sales_data: pd.Series):
+    """
+    Runs in a pool process. Returns (product_id, error message or None) so that
+    only a short status - not the fitted model - travels back to the parent.
+    """
+    try:
+        results = fit_forecast_model(sales_data)
+        save_forecast_model(results, sales_data, product_id)
+        return product_id, None
+    except Exception as e:
+        return product_id, str(e)
+
+def train_forecast_models_batch(monthly_sales_df: pd.DataFrame, max_workers=None, force=False,
+                                progress_callback=None, should_cancel=None):
+    """
+    Trains and saves forecast models for every eligible product in parallel.
+
+    monthly_sales_df is the long frame returned by process_data_files. Products with
+    fewer than MIN_HISTORY_MONTHS months are skipped, as are products whose saved
+    model was trained on the same sales history (unless force=True).
+    progress_callback(progress, message) gets the share (0..1) of products done after
+    every finished fit. Once should_cancel() returns True, fits not yet started are
+    cancelled and TaskCancelled is raised after the running ones finish (models
+    already saved stay on disk; see common.cancellation).
+
+    Returns a dict with lists 'trained', 'up_to_date', 'not_enough_data'
+    and a dict 'failed' mapping product id to the error message.
+    """
+    summary = {"trained": [], "up_to_date": [], "not_enough_data": [], "failed": {}}
+
+    to_train = {}
+    for product_id, sales_data in split_sales_by_product(monthly_sales_df).items():
+        if len(sales_data) < MIN_HISTORY_MONTHS:
+            summary["not_enough_data"].append(product_id)
+        elif not force and is_forecast_model_up_to_date(sales_data, product_id):
+            summary["up_to_date"].append(product_id)
+        else:
+            to_train[product_id] = sales_data
+
+    total = len(to_train)
+    print(f"Batch forecast training: {total} to train, {len(summary['up_to_date'])} up to date, "
+          f"{len(summary['not_enough_data'])} with too little history.")
+    if not total:
+        return summary
+
+    checkpoint(should_cancel, progress_callback, 0.0, f"Trenowanie prognoz 0/{total}")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_train_forecast_task, product_id, sales_data)
+                   for product_id, sales_data in to_train.items()]
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                product_id, error = future.result()
+                if error is None:
+                    summary["trained"].append(product_id)
+                else:
+                    summary["failed"][product_id] = error
+                    print(f"Error training forecast model for product {product_id}: {error}")
+                checkpoint(should_cancel, progress_callback, done / total, f"Trenowanie prognoz {done}/{total}")
+        except TaskCancelled:
+            for future in futures:
+                future.cancel()
+            print(f"Batch forecast training cancelled after {len(summary['trained'])} trained.")
+            raise
+
+    print(f"Batch forecast training finished: {len(summary['trained'])} trained, {len(summary['failed'])} failed.")
+    return summary
+
 def load_forecast_model(product_id):
     """
     Loads a previously trained forecast model for a specific product.
     """
     model_path = get_model_path(product_id)
     if os.path.exists(model_path):
-        return joblib.load(model_path)
+        return load_compact_model(model_path)
+    legacy_path = get_legacy_model_path(product_id)
+    if os.path.exists(legacy_path):
+        return joblib.load(legacy_path)
     return None
 
-def generate_forecast(model, current_stock: int, start_date: datetime, steps=24):
+def migrate_legacy_forecast_models(remove_legacy=True):
+    """
+    One-shot conversion of every pickled .joblib model in FORECAST_MODEL_DIR to
+    the compact format. Fingerprint files are left untouched.
+    Returns a dict with the number of 'migrated' models and 'failed' paths.
+    """
+    summary = {"migrated": 0, "failed": []}
+    prefix = "forecast_model_"
+    for legacy_path in sorted(glob.glob(os.path.join(FORECAST_MODEL_DIR, f"{prefix}*.joblib"))):
+        product_id = os.path.basename(legacy_path)[len(prefix):-len(".joblib")]
+        try:
+            save_compact_model(joblib.load(legacy_path), get_model_path(product_id))
+        except Exception as e:
+            print(f"Error migrating forecast model {legacy_path}: {e}")
+            summary["failed"].append(legacy_path)
+            continue
+        if remove_legacy:
+            os.remove(legacy_path)
+        summary["migrated"] += 1
+    print(f"Migrated {summary['migrated']} forecast models to the compact format, {len(summary['failed'])} failed.")
+    return summary
+
+def generate_forecast(model, current_stock: int, start_date: datetime = None, steps=24):
     """
     Generates a forecast of stock levels.
     """
     # Get forecast of sales
     forecast_object = model.get_forecast(steps=steps)
-    forecast_sales = forecast_object.predicted_mean
-    
+    return stock_forecast(forecast_object.predicted_mean, current_stock)
+
+def stock_forecast(forecast_sales: pd.Series, current_stock):
+    """
+    Turns forecast monthly sales (indexed by date) into stock levels and the
+    estimated stockout date (None within the horizon).
+    """
     # Create a DataFrame for the forecast
     forecast_df = pd.DataFrame({
         'forecasted_sales': forecast_sales.round().astype(int)
@@ -71,3 +570,22 @@ def generate_forecast(model, current_stock: int, start_date: datetime, steps=24)
         stockout_date = stockout_candidates.index[0]
         
     return forecast_df, stockout_date
+
+def forecast_for_product(sales_data: pd.Series, product_id, current_stock, use_sarimax=False):
+    """
+    Stock forecast for one product, as one task (module-level, so it can also run
+    in a worker process). Uses the batch engine, so every product with sales gets a
+    forecast; with use_sarimax, products with enough history get a SARIMAX model
+    (fitted or cached) instead.
+    """
+    if use_sarimax and len(sales_data) >= MIN_HISTORY_MONTHS:
+        model = get_forecast_model(sales_data, product_id)
+        if model:
+            return generate_forecast(model, current_stock)
+    if sales_data.empty:
+        return None, None
+    product_sales = pd.DataFrame({"indeks": product_id, "date": sales_data.index, "sales": sales_data.to_numpy()})
+    return forecast_batch(product_sales).stock_forecast(product_id, current_stock)
+
+if __name__ == "__main__":
+    migrate_legacy_forecast_models()
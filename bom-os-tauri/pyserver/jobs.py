@@ -0,0 +1,165 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job at a checkpoint after cancellation was requested."""
+
+
+class Job:
+    """
+    One background task. The task function receives the job and reports progress
+    through job.report(), which is also the point where a cancellation request
+    takes effect (work between checkpoints cannot be interrupted).
+    """
+    def __init__(self, kind, key=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.error_status = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0  # bumped on every change, for waiting subscribers
+        self.future = None
+        self._cancel_requested = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_requested.is_set()
+
+    def _update(self, **changes):
+        with self._changed:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def checkpoint(self):
+        if self._cancel_requested.is_set():
+            raise JobCancelled()
+
+    def report(self, progress, message=None):
+        """Records progress (0..1) and stops the job here if it was cancelled."""
+        self.checkpoint()
+        self._update(progress=float(progress), message=message if message is not None else self.message)
+
+    def wait_for_change(self, seen_version, timeout=None):
+        """Blocks until the job changes after seen_version (or it is finished, or timeout); returns the version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != seen_version or self.finished, timeout)
+            return self.version
+
+    def to_dict(self, include_result=True):
+        state = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error is not None:
+            state["error"] = self.error
+        if include_result and self.status == DONE:
+            state["result"] = self.result
+        return state
+
+
+class JobManager:
+    """
+    Runs jobs on a thread pool. Submitting with a dedup key while a job with the
+    same key is still queued or running returns that job instead of starting a
+    new one. Finished jobs are kept (up to max_finished) so clients can fetch results.
+    """
+    def __init__(self, max_workers=2, max_finished=200):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()  # job_id -> Job
+        self._active_by_key = {}  # dedup key -> Job still queued or running
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, key=None, **kwargs):
+        """Schedules fn(job, *args, **kwargs); returns (job, created) - created is False for a deduplicated job."""
+        with self._lock:
+            if key is not None:
+                active = self._active_by_key.get(key)
+                if active is not None and not active.cancel_requested:
+                    return active, False
+            job = Job(kind, key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active_by_key[key] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job, True
+
+    def _run(self, job, fn, args, kwargs):
+        try:
+            job.checkpoint()
+            job._update(status=RUNNING, started_at=time.time())
+            result = fn(job, *args, **kwargs)
+            job._update(status=DONE, progress=1.0, result=result, finished_at=time.time())
+        except JobCancelled:
+            job._update(status=CANCELLED, finished_at=time.time())
+        except Exception as e:
+            job._update(status=FAILED, error=getattr(e, "message", None) or str(e),
+                        error_status=getattr(e, "status", None), finished_at=time.time())
+        finally:
+            self._release(job)
+
+    def _release(self, job):
+        with self._lock:
+            if job.key is not None and self._active_by_key.get(job.key) is job:
+                del self._active_by_key[job.key]
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """Requests cancellation; a queued job is cancelled at once, a running one at its next checkpoint."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job._cancel_requested.set()
+        if job.future is not None and job.future.cancel():
+            job._update(status=CANCELLED, finished_at=time.time())
+            self._release(job)
+        else:
+            job._update(message="Anulowanie...")
+        return job
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
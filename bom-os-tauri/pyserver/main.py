@@ -16,28 +16,38 @@ from PySide6.QtWidgets import (
     QHBoxLayout,
     QSplitter,
     QStatusBar,
+    QCheckBox,
 )
 
 # --- Importy: próbuj jako pakiet i jako moduły lokalne (uruchamiane bez -m) ---
 try:  # uruchomione jako pakiet: python -m twojpakiet.main
     from . import ai_logic
+    from .feedback_store import FeedbackStore
     from .pandas_model import PandasModel
     from .chart_widget import ChartWidget
     from .feedback_dialog import FeedbackDialog
     from . import forecasting_logic
-    from .worker import Worker
+    from .worker import Worker, ProcessWorker, TaskScheduler, shutdown_process_pool
     from .common import data_processing
+    from .common import profiling
 except Exception:  # uruchomione lokalnie: python main.py
     import ai_logic  # type: ignore
+    from feedback_store import FeedbackStore  # type: ignore
     from pandas_model import PandasModel  # type: ignore
     from chart_widget import ChartWidget  # type: ignore
     from feedback_dialog import FeedbackDialog  # type: ignore
     import forecasting_logic  # type: ignore
-    from worker import Worker  # type: ignore
+    from worker import Worker, ProcessWorker, TaskScheduler, shutdown_process_pool  # type: ignore
     from common import data_processing  # type: ignore
+    from common import profiling  # type: ignore
 
-FEEDBACK_LOG_PATH = "feedback_log.csv"
+FEEDBACK_DB_PATH = "feedback.sqlite3"
+FEEDBACK_LOG_PATH = "feedback_log.csv"  # written by older versions; migrated into FEEDBACK_DB_PATH
+# Ścieżka zrzutu cProfile przy włączonym profilowaniu (opcjonalnie, np. BOM_OS_CPROFILE=last_run.prof)
+CPROFILE_PATH_ENV = "BOM_OS_CPROFILE"
 REQUIRED_COLS = {"indeks", "stan"}
+# Seria wczytań plików w tym odstępie uruchamia jedno przetwarzanie
+PROCESSING_DEBOUNCE_MS = 300
 
 
 class MainWindow(QMainWindow):
@@ -48,6 +58,9 @@ class MainWindow(QMainWindow):
         self.setGeometry(100, 100, 1600, 900)
         self.threadpool = QThreadPool()
         print(f"Multithreading with maximum {self.threadpool.maxThreadCount()} threads")
+        # Nowsze zadanie danego rodzaju zastępuje starsze; kontrolki wracają, gdy nic nie działa
+        self.scheduler = TaskScheduler(self.threadpool, self)
+        self.scheduler.idle.connect(self.on_task_finished)
 
         # --- AI Model & Data Storage ---
         self.df: pd.DataFrame = pd.DataFrame()
@@ -55,6 +68,13 @@ class MainWindow(QMainWindow):
         self.ai_model = None
         self.ai_encoder = None
         self.ai_importances: Optional[pd.DataFrame] = None
+        self.ai_model_version = None
+        self.ai_training_stats = None
+        # Ponowne przetworzenie ocenia modelem tylko wiersze o nowych wartościach cech
+        self.prediction_cache = ai_logic.PredictionCache()
+        # Korekty użytkownika działają od razu, bez douczania modelu
+        self.feedback_store = FeedbackStore(FEEDBACK_DB_PATH, legacy_csv_path=FEEDBACK_LOG_PATH)
+        self.corrections = ai_logic.CorrectionLayer(self.feedback_store)
 
         try:
             model_data = ai_logic.load_model()
@@ -63,9 +83,7 @@ class MainWindow(QMainWindow):
             model_data = None
 
         if model_data:
-            self.ai_model = model_data.get("model")
-            self.ai_encoder = model_data.get("encoder")
-            self.ai_importances = model_data.get("importances")
+            self.set_ai_model(model_data)
 
         # --- Layouts ---
         main_layout = QHBoxLayout()
@@ -86,16 +104,27 @@ class MainWindow(QMainWindow):
         self.btn_update_chart = QPushButton("Generuj Wykres")
         self.btn_export_data = QPushButton("Eksportuj do CSV")
         self.btn_forecast = QPushButton("Generuj Prognozę")
-
-        self.control_buttons = [
+        self.btn_train_forecasts = QPushButton("Prognozy (wszystkie)")
+        self.btn_export_profile = QPushButton("Eksportuj Profil (JSON)")
+        self.chk_profiling = QCheckBox("Profiluj zadania")
+        self.chk_process_pool = QCheckBox("Zadania w osobnych procesach")
+        # Domyślnie szybkie prognozy wsadowe; SARIMAX (wolny, per produkt) tylko na życzenie
+        self.chk_sarimax = QCheckBox("Dokładniejsze prognozy (SARIMAX)")
+
+        # Wczytywanie pliku w trakcie przetwarzania zastępuje trwający przebieg nowym
+        self.load_buttons = [
             self.btn_load_stany,
             self.btn_load_bomy,
             self.btn_load_minimum,
             self.btn_load_sprzedaz,
+        ]
+        self.control_buttons = self.load_buttons + [
             self.btn_train_ai,
             self.btn_update_chart,
             self.btn_export_data,
             self.btn_forecast,
+            self.btn_train_forecasts,
+            self.btn_export_profile,
         ]
 
         self.btn_load_stany.clicked.connect(lambda: self.load_file("stany"))
@@ -106,6 +135,8 @@ class MainWindow(QMainWindow):
         self.btn_update_chart.clicked.connect(self.update_chart)
         self.btn_export_data.clicked.connect(self.export_data)
         self.btn_forecast.clicked.connect(self.run_forecasting_worker)
+        self.btn_train_forecasts.clicked.connect(self.run_batch_forecast_training)
+        self.btn_export_profile.clicked.connect(self.export_profile)
 
         for w in [
             self.btn_load_stany,
@@ -116,10 +147,14 @@ class MainWindow(QMainWindow):
             left_panel_layout.addWidget(w)
 
         left_panel_layout.addSpacing(30)
-        for w in [self.btn_train_ai, self.btn_update_chart, self.btn_forecast]:
+        for w in [self.btn_train_ai, self.btn_update_chart, self.btn_forecast, self.btn_train_forecasts, self.chk_sarimax]:
             left_panel_layout.addWidget(w)
         left_panel_layout.addSpacing(30)
         left_panel_layout.addWidget(self.btn_export_data)
+        left_panel_layout.addSpacing(30)
+        left_panel_layout.addWidget(self.chk_process_pool)
+        left_panel_layout.addWidget(self.chk_profiling)
+        left_panel_layout.addWidget(self.btn_export_profile)
         left_panel_layout.addStretch()
 
         # --- Right Panel (Data Display) ---
@@ -151,11 +186,45 @@ class MainWindow(QMainWindow):
 
         # --- File Paths Storage ---
         self.file_paths = {"stany": None, "bomy": None, "minimum": None, "sprzedaz": None}
+        self._shown_profile = None
 
     # -------------------- Helpers --------------------
-    def set_controls_enabled(self, enabled: bool) -> None:
+    def set_controls_enabled(self, enabled: bool, keep=()) -> None:
         for button in self.control_buttons:
-            button.setEnabled(enabled)
+            if button not in keep:
+                button.setEnabled(enabled)
+
+    def profiled_task(self, fn, label: str):
+        """Zwraca fn opakowaną w nagrywanie etapów, jeśli profilowanie jest włączone."""
+        if not self.chk_profiling.isChecked():
+            return fn
+        return profiling.profiled(fn, label, cprofile_path=os.environ.get(CPROFILE_PATH_ENV))
+
+    def set_ai_model(self, model_data) -> None:
+        self.ai_model = model_data.get("model")
+        self.ai_encoder = model_data.get("encoder")
+        self.ai_importances = model_data.get("importances")
+        self.ai_model_version = model_data.get("version")
+        self.ai_training_stats = model_data.get("training_stats")
+
+    def refresh_ai_model(self) -> None:
+        """Przejmuje nowszą aktywną wersję modelu, np. wytrenowaną w sidecarze - bez restartu aplikacji."""
+        try:
+            model_data = ai_logic.load_model()
+        except Exception as e:
+            print(f"Warning: could not load AI model: {e}")
+            return
+        if model_data and model_data.get("version") != self.ai_model_version:
+            self.set_ai_model(model_data)
+
+    def make_worker(self, fn, label: str, *args, **kwargs):
+        """
+        Worker dla zadania: w puli procesów (jeśli zaznaczono i profilowanie jest wyłączone -
+        pomiary etapów zbiera tylko bieżący proces), w przeciwnym razie w wątku.
+        """
+        if self.chk_process_pool.isChecked() and not self.chk_profiling.isChecked():
+            return ProcessWorker(fn, *args, **kwargs)
+        return Worker(self.profiled_task(fn, label), *args, **kwargs)
 
     def validate_df_columns(self, df: pd.DataFrame) -> bool:
         missing = REQUIRED_COLS - set(df.columns)
@@ -176,19 +245,26 @@ class MainWindow(QMainWindow):
             print(f"Załadowano plik '{file_type}': {path}")
             self.run_data_processing_worker()
 
-    def run_data_processing_worker(self) -> None:
+    def run_data_processing_worker(self, delay_ms: int = PROCESSING_DEBOUNCE_MS) -> None:
         # Przynajmniej 'stany' są wymagane do sensownego połączenia
         if not self.file_paths["stany"]:
             return
 
-        self.set_controls_enabled(False)
+        self.set_controls_enabled(False, keep=self.load_buttons)
         self.statusBar().showMessage("Przetwarzanie danych...")
 
-        worker = Worker(data_processing.process_data_files, **self.file_paths)
-        worker.signals.result.connect(self.on_processing_result)
-        worker.signals.finished.connect(self.on_task_finished)
-        worker.signals.error.connect(self.on_task_error)
-        self.threadpool.start(worker)
+        # Worker powstaje dopiero po odczekaniu - z aktualnymi ścieżkami plików. Przetwarzanie
+        # zawsze idzie w wątku: pamięć podręczna etapów żyje w tym procesie, w puli procesów
+        # każde przeładowanie wczytywałoby od nowa wszystkie pliki.
+        self.scheduler.submit(
+            "processing",
+            lambda: Worker(self.profiled_task(data_processing.process_data_files, "Przetwarzanie"), **self.file_paths),
+            on_result=self.on_processing_result,
+            on_error=self.on_task_error,
+            on_progress=self.on_task_progress,
+            delay_ms=delay_ms,
+            checkpoints=True,
+        )
 
     def on_processing_result(self, result: Tuple[pd.DataFrame, pd.DataFrame]) -> None:
         try:
@@ -203,10 +279,16 @@ class MainWindow(QMainWindow):
                 return
 
             # Predykcja alertów, jeśli model jest dostępny
+            self.refresh_ai_model()
             try:
                 if self.ai_model is not None and self.ai_encoder is not None:
-                    predictions = ai_logic.predict_with_model(self.ai_model, self.ai_encoder, self.df)
+                    predictions, probabilities = ai_logic.predict_with_probabilities(
+                        self.ai_model, self.ai_encoder, self.df, self.prediction_cache, self.ai_model_version,
+                        corrections=self.corrections,
+                    )
                     self.df["ai_alert"] = predictions
+                    # Pewność predykcji - pozwala posortować tabelę od najbardziej wątpliwych alertów
+                    self.df["ai_confidence"] = probabilities.max(axis=1).round(3)
             except Exception as e:
                 print(f"Prediction failed: {e}")
 
@@ -226,18 +308,30 @@ class MainWindow(QMainWindow):
         self.set_controls_enabled(False)
         self.statusBar().showMessage("Trenowanie modelu AI...")
 
-        worker = Worker(ai_logic.train_and_save_model, self.df, FEEDBACK_LOG_PATH)
-        worker.signals.result.connect(self.on_training_result)
-        worker.signals.finished.connect(self.on_task_finished)
-        worker.signals.error.connect(self.on_task_error)
-        self.threadpool.start(worker)
+        self.scheduler.submit(
+            "training",
+            lambda: self.make_worker(ai_logic.train_and_save_model, "Trenowanie AI", self.df, self.feedback_store),
+            on_result=self.on_training_result,
+            on_error=self.on_task_error,
+            on_progress=self.on_task_progress,
+            checkpoints=True,
+        )
 
     def on_training_result(self, model_data):
         if model_data:
-            self.ai_model = model_data.get("model")
-            self.ai_encoder = model_data.get("encoder")
-            self.ai_importances = model_data.get("importances")
-            QMessageBox.information(self, "Sukces", "Model AI został pomyślnie douczony i zapisany.")
+            self.set_ai_model(model_data)
+            self.prediction_cache.clear()  # wyniki poprzedniego modelu są nieaktualne
+            message = "Model AI został pomyślnie douczony i zapisany."
+            stats = model_data.get("training_stats")
+            if stats:
+                message += (
+                    f"\n\nWiersze treningowe: {stats['rows_used']} z {stats['rows_total']}"
+                    f"{' (próbka warstwowa)' if stats['sampled'] else ''}\n"
+                    f"Czas uczenia: {stats['fit_s']:.1f} s\n"
+                    f"Szczyt pamięci: {stats['peak_memory_mb'] if stats['peak_memory_mb'] is not None else 'n/d'} MB\n"
+                    f"Dokładność (zbiór testowy): {stats['accuracy']:.2%}"
+                )
+            QMessageBox.information(self, "Sukces", message)
             self.update_chart()  # Update chart with new importances
             self.run_data_processing_worker()  # Refresh data to show new predictions
         else:
@@ -268,7 +362,8 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Brak Zaznaczenia", "Proszę zaznaczyć wiersz w tabeli, aby wygenerować prognozę.")
             return
 
-        row = selected_indexes[0].row()
+        # wiersz widoku -> pozycja w ramce (tabela może być posortowana)
+        row = self.table_view.model().sourceRow(selected_indexes[0].row())
         try:
             product_id = self.df.iloc[row]["indeks"]
             current_stock = self.df.iloc[row]["stan"]
@@ -294,20 +389,15 @@ class MainWindow(QMainWindow):
         self.set_controls_enabled(False)
         self.statusBar().showMessage(f"Generowanie prognozy dla produktu {product_id}...")
 
-        def forecast_task(sales_data, prod_id, stock):
-            model = forecasting_logic.load_forecast_model(prod_id)
-            if not model:
-                model = forecasting_logic.train_and_save_forecast_model(sales_data, prod_id)
-
-            if model:
-                return forecasting_logic.generate_forecast(model, stock)
-            return None, None
-
-        worker = Worker(forecast_task, sales_series, product_id, current_stock)
-        worker.signals.result.connect(self.on_forecast_result)
-        worker.signals.finished.connect(self.on_task_finished)
-        worker.signals.error.connect(self.on_task_error)
-        self.threadpool.start(worker)
+        self.scheduler.submit(
+            "forecast",
+            lambda: self.make_worker(
+                forecasting_logic.forecast_for_product, "Prognoza", sales_series, product_id, current_stock,
+                use_sarimax=self.chk_sarimax.isChecked(),
+            ),
+            on_result=self.on_forecast_result,
+            on_error=self.on_task_error,
+        )
 
     def on_forecast_result(self, result) -> None:
         forecast_df, stockout_date = result if isinstance(result, tuple) else (None, None)
@@ -331,6 +421,77 @@ class MainWindow(QMainWindow):
         else:
             QMessageBox.critical(self, "Błąd Prognozy", "Nie udało się wygenerować prognozy.")
 
+    def run_batch_forecast_training(self) -> None:
+        if self.monthly_sales_df is None or self.monthly_sales_df.empty:
+            QMessageBox.warning(self, "Brak Danych", "Najpierw wczytaj plik sprzedaży.")
+            return
+
+        if not self.chk_sarimax.isChecked():
+            self.run_catalog_forecast()
+            return
+
+        self.set_controls_enabled(False)
+        self.statusBar().showMessage("Trenowanie modeli prognoz dla wszystkich produktów...")
+
+        # Zawsze w wątku: zadanie samo uruchamia pulę procesów, a wątek daje postęp i anulowanie
+        self.scheduler.submit(
+            "forecast_batch",
+            lambda: Worker(
+                self.profiled_task(forecasting_logic.train_forecast_models_batch, "Prognozy wsadowe"),
+                self.monthly_sales_df,
+            ),
+            on_result=self.on_batch_forecast_training_result,
+            on_error=self.on_task_error,
+            on_progress=self.on_task_progress,
+            checkpoints=True,
+        )
+
+    def run_catalog_forecast(self) -> None:
+        """Prognoza wszystkich produktów naraz (wektorowo) - wyniki trafiają do kolumn tabeli."""
+        self.set_controls_enabled(False)
+        self.statusBar().showMessage("Prognozowanie sprzedaży wszystkich produktów...")
+
+        stock = None
+        if not self.df.empty and REQUIRED_COLS <= set(self.df.columns):
+            stock = self.df.drop_duplicates("indeks").set_index("indeks")["stan"]
+        self.scheduler.submit(
+            "forecast_batch",
+            lambda: self.make_worker(forecasting_logic.forecast_catalog, "Prognozy wsadowe", self.monthly_sales_df, stock),
+            on_result=self.on_catalog_forecast_result,
+            on_error=self.on_task_error,
+        )
+
+    def on_catalog_forecast_result(self, summary: pd.DataFrame) -> None:
+        if not self.df.empty and "indeks" in self.df.columns:
+            by_product = summary.set_index("indeks")
+            self.df["prognoza_12m"] = self.df["indeks"].map(by_product["forecast_12_months"])
+            if "stockout_date" in by_product.columns:
+                self.df["brak_zapasu"] = self.df["indeks"].map(by_product["stockout_date"])
+            self.table_view.setModel(PandasModel(self.df))
+
+        methods = summary["method"].value_counts()
+        QMessageBox.information(
+            self,
+            "Prognozy Gotowe",
+            f"Prognozy dla {len(summary)} produktów:\n"
+            f"Holt-Winters (sezonowe): {methods.get(forecasting_logic.METHOD_HOLT_WINTERS, 0)}\n"
+            f"Croston (sprzedaż sporadyczna): {methods.get(forecasting_logic.METHOD_CROSTON, 0)}\n"
+            f"Wygładzanie wykładnicze (krótka historia): {methods.get(forecasting_logic.METHOD_SES, 0)}",
+        )
+
+    def on_batch_forecast_training_result(self, summary) -> None:
+        failed = summary.get("failed", {})
+        message = (
+            f"Wytrenowano: {len(summary.get('trained', []))}\n"
+            f"Aktualne (pominięte): {len(summary.get('up_to_date', []))}\n"
+            f"Za krótka historia: {len(summary.get('not_enough_data', []))}\n"
+            f"Błędy: {len(failed)}"
+        )
+        if failed:
+            details = "\n".join(f"{pid}: {err}" for pid, err in list(failed.items())[:10])
+            message += f"\n\nPierwsze błędy:\n{details}"
+        QMessageBox.information(self, "Prognozy Wytrenowane", message)
+
     # -------------------- Export & Feedback --------------------
     def export_data(self) -> None:
         if self.df.empty:
@@ -346,12 +507,26 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "Błąd Eksportu", f"Nie udało się zapisać pliku:\n{e}")
 
+    def export_profile(self) -> None:
+        recorder = profiling.last_run()
+        if recorder is None:
+            QMessageBox.warning(self, "Brak Profilu", "Włącz 'Profiluj zadania' i uruchom dowolne zadanie.")
+            return
+
+        path, _ = QFileDialog.getSaveFileName(self, "Eksportuj profil", "profil.json", "JSON Files (*.json)")
+        if path:
+            try:
+                recorder.to_json(path)
+                QMessageBox.information(self, "Sukces", f"Profil został zapisany do:\n{path}")
+            except Exception as e:
+                QMessageBox.critical(self, "Błąd Eksportu", f"Nie udało się zapisać profilu:\n{e}")
+
     def open_feedback_dialog(self, index: QModelIndex) -> None:
         if "ai_alert" not in self.df.columns:
             QMessageBox.information(self, "Informacja", "Kolumna 'ai_alert' nie istnieje. Najpierw wytrenuj model i dokonaj predykcji.")
             return
 
-        row = index.row()
+        row = self.table_view.model().sourceRow(index.row())
         try:
             row_data = self.df.iloc[row].to_dict()
         except Exception:
@@ -368,26 +543,47 @@ class MainWindow(QMainWindow):
         print(f"Otrzymano korektę dla wiersza {row_index}. Nowy alert: {corrected_label}")
 
         try:
-            feedback_df = self.df.iloc[[row_index]].copy()
-            feedback_df["alert"] = corrected_label
+            # Zapis w magazynie korekt; korekta obowiązuje od następnej predykcji
+            self.corrections.add(self.df.iloc[[row_index]], corrected_label)
+        except Exception as e:
+            QMessageBox.critical(self, "Błąd Zapisu", f"Nie udało się zapisać feedbacku: {e}")
+            return
 
-            # Save feedback to a log file
-            mode = "a" if os.path.exists(FEEDBACK_LOG_PATH) else "w"
-            header = not os.path.exists(FEEDBACK_LOG_PATH)
-            feedback_df.to_csv(FEEDBACK_LOG_PATH, mode=mode, header=header, index=False)
+        # Poprawiony wiersz od razu w tabeli - bez ponownej predykcji całej tabeli
+        self.df.loc[self.df.index[row_index], "ai_alert"] = corrected_label
+        if "ai_confidence" in self.df.columns:
+            self.df.loc[self.df.index[row_index], "ai_confidence"] = 1.0
+        model = self.table_view.model()
+        if isinstance(model, PandasModel):
+            model.refreshData()
 
+        stats = {"training_stats": self.ai_training_stats}
+        if self.corrections.needs_retraining(stats) and not self.scheduler.is_busy("training"):
             QMessageBox.information(
                 self,
                 "Dziękujemy!",
-                "Twoja informacja zwrotna została zapisana i zostanie użyta do douczenia modelu.",
+                f"Zebrano {self.corrections.pending(stats)} korekt od ostatniego treningu - model zostanie douczony.",
+            )
+            self.train_ai_model()
+        else:
+            QMessageBox.information(
+                self,
+                "Dziękujemy!",
+                "Korekta została zastosowana i zostanie użyta przy douczaniu modelu.",
             )
-        except Exception as e:
-            QMessageBox.critical(self, "Błąd Zapisu", f"Nie udało się zapisać feedbacku: {e}")
 
     # -------------------- Common task hooks --------------------
+    def on_task_progress(self, progress: float, message: str) -> None:
+        self.statusBar().showMessage(f"{message}... {progress:.0%}")
+
     def on_task_finished(self) -> None:
         self.set_controls_enabled(True)
-        self.statusBar().showMessage("Gotowy.", 2000)  # 2 sekundy
+        recorder = profiling.last_run()
+        if self.chk_profiling.isChecked() and recorder is not None and recorder is not self._shown_profile:
+            self._shown_profile = recorder
+            self.statusBar().showMessage(recorder.summary(), 15000)
+        else:
+            self.statusBar().showMessage("Gotowy.", 2000)  # 2 sekundy
 
     def on_task_error(self, error_tuple) -> None:
         # spodziewany format: (exc_type, exc_value, traceback_str)
@@ -412,6 +608,7 @@ def main() -> None:
     except FileNotFoundError:
         print(f"Warning: Stylesheet '{style_path}' not found.")
 
+    app.aboutToQuit.connect(shutdown_process_pool)
     window = MainWindow()
     window.show()
     sys.exit(app.exec())
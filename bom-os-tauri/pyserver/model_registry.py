@@ -0,0 +1,156 @@
+"""
+Versioned storage of trained AI models.
+
+Every training run is written as a new version directory under versions/ and
+the ACTIVE file names the version in use. Both steps are atomic renames, so a
+crash mid-write never leaves a half-written model behind the pointer, and any
+process (the Qt app, the sidecar) picks up a newly activated version on its
+next current() call without a restart.
+
+Sharing one copy of the model between processes is out of scope: every
+process loads its own copy, because scikit-learn copies the tree node arrays
+when unpickling and memory-mapping the artifact would not share them.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+import joblib
+
+ACTIVE_FILE = "ACTIVE"
+VERSIONS_DIR = "versions"
+ARTIFACT_NAME = "model.joblib"
+KEEP_VERSIONS = 5
+
+
+def new_version_id():
+    """Version ids sort in creation order: timestamp plus a random suffix."""
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def _fsync(path):
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+class ModelRegistry:
+    """
+    Model versions in root/versions/<version>/model.joblib plus the root/ACTIVE
+    pointer. current() returns the active model and swaps in a newly activated
+    version; callers keep whatever model_data they already hold, so predictions
+    in flight are never blocked or changed under them.
+    """
+    def __init__(self, root, keep_versions=KEEP_VERSIONS):
+        self.root = root
+        self.keep_versions = keep_versions
+        self._current = None  # (version, model_data) of the last model served
+        self._load_lock = threading.Lock()
+
+    @property
+    def versions_dir(self):
+        return os.path.join(self.root, VERSIONS_DIR)
+
+    def artifact_path(self, version):
+        return os.path.join(self.versions_dir, version, ARTIFACT_NAME)
+
+    def versions(self):
+        """Stored versions, oldest first."""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(name for name in os.listdir(self.versions_dir) if not name.startswith("."))
+
+    def active_version(self):
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def save(self, model_data, activate=True):
+        """Writes model_data as a new version (model_data['version'], created if missing); returns the version."""
+        version = model_data.setdefault("version", new_version_id())
+        os.makedirs(self.versions_dir, exist_ok=True)
+        # Written next to its final place under a hidden name, then renamed in one step
+        staging = tempfile.mkdtemp(prefix=f".{version}.", dir=self.versions_dir)
+        try:
+            artifact = os.path.join(staging, ARTIFACT_NAME)
+            joblib.dump(model_data, artifact)
+            _fsync(artifact)
+            os.replace(staging, os.path.join(self.versions_dir, version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if activate:
+            self.activate(version)
+            with self._load_lock:
+                self._current = (version, model_data)
+            self.prune()
+        return version
+
+    def activate(self, version):
+        """Points ACTIVE at a stored version (also a rollback); other processes follow on their next current()."""
+        if not os.path.exists(self.artifact_path(version)):
+            raise FileNotFoundError(f"Unknown model version: {version}")
+        pointer = os.path.join(self.root, ACTIVE_FILE)
+        staging = f"{pointer}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(staging, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(staging, pointer)
+
+    def load(self, version):
+        model_data = joblib.load(self.artifact_path(version))
+        model_data["version"] = version
+        return model_data
+
+    def current(self):
+        """
+        The active model data, or None. A newly activated version is loaded by one
+        caller; concurrent callers keep getting the previous model until it is ready.
+        """
+        version = self.active_version()
+        current = self._current
+        if version is None:
+            self._current = None
+            return None
+        if current is not None and current[0] == version:
+            return current[1]
+        if not self._load_lock.acquire(blocking=current is None):
+            return current[1]
+        try:
+            if self._current is not None and self._current[0] == version:
+                return self._current[1]
+            try:
+                model_data = self.load(version)
+            except Exception as e:
+                print(f"Could not load model version {version}: {e}")
+                return current[1] if current is not None else None
+            print(f"AI model version {version} loaded.")
+            self._current = (version, model_data)
+            return model_data
+        finally:
+            self._load_lock.release()
+
+    def import_file(self, path, remove=False):
+        """Stores a model pickled by older versions (a single joblib file) as a new active version."""
+        model_data = joblib.load(path)
+        model_data.pop("version", None)
+        version = self.save(model_data)
+        if remove:
+            os.remove(path)
+        return version
+
+    def prune(self):
+        """Removes all but the newest keep_versions versions; the active one is always kept."""
+        active = self.active_version()
+        for version in self.versions()[:-self.keep_versions or None]:
+            if version == active:
+                continue
+            try:
+                shutil.rmtree(os.path.join(self.versions_dir, version))
+            except OSError as e:  # e.g. still memory-mapped by another process on Windows
+                print(f"Could not remove model version {version}: {e}")
@@ -1,17 +1,38 @@
+from collections import OrderedDict
+
+import numpy as np
 from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex
 import pandas as pd
 
 class PandasModel(QAbstractTableModel):
-    """A model to interface a pandas DataFrame with a QTableView."""
+    """
+    A model to interface a pandas DataFrame with a QTableView.
+
+    The frame is never copied: sorting keeps a permutation of row positions,
+    display strings are formatted per block of rows on first paint and cached,
+    and rows are handed to the view in batches (canFetchMore/fetchMore).
+    Use sourceRow() to map a view row back to a position in the frame.
+    """
+    BLOCK_ROWS = 1024  # display strings are formatted and cached per block of view rows
+    MAX_CACHED_BLOCKS = 2048
+    FETCH_BATCH = 10_000  # rows added to the view per fetchMore
+
     def __init__(self, dataframe: pd.DataFrame, parent=None):
         super().__init__(parent)
+        self._set_frame(dataframe)
+
+    def _set_frame(self, dataframe: pd.DataFrame):
         self._dataframe = dataframe
+        self._order = None  # view row -> frame position; None means the frame order
+        self._sort_cache = {}  # (column, ascending) -> permutation
+        self._display = OrderedDict()  # (column, block) -> display strings
+        self._loaded = min(len(dataframe), self.FETCH_BATCH)
 
     def rowCount(self, parent=QModelIndex()):
-        """Return the number of rows in the model."""
+        """Return the number of rows handed to the view so far."""
         if parent.isValid():
             return 0
-        return len(self._dataframe)
+        return self._loaded
 
     def columnCount(self, parent=QModelIndex()):
         """Return the number of columns in the model."""
@@ -19,11 +40,46 @@ class PandasModel(QAbstractTableModel):
             return 0
         return len(self._dataframe.columns)
 
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < len(self._dataframe)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.FETCH_BATCH, len(self._dataframe) - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def sourceRow(self, row: int) -> int:
+        """Position in the DataFrame of the given view row."""
+        return int(self._order[row]) if self._order is not None else row
+
+    def _display_block(self, column: int, block: int):
+        key = (column, block)
+        strings = self._display.get(key)
+        if strings is None:
+            start = block * self.BLOCK_ROWS
+            stop = min(start + self.BLOCK_ROWS, len(self._dataframe))
+            values = self._dataframe.iloc[:, column].array
+            # Formatting the extension array's scalars gives the same text as str(df.iloc[row, col])
+            values = values[start:stop] if self._order is None else values[self._order[start:stop]]
+            strings = [str(value) for value in values]
+            self._display[key] = strings
+            if len(self._display) > self.MAX_CACHED_BLOCKS:
+                self._display.popitem(last=False)
+        else:
+            self._display.move_to_end(key)
+        return strings
+
     def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
         """Return data from the DataFrame."""
         if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
             return None
-        return str(self._dataframe.iloc[index.row(), index.column()])
+        block, offset = divmod(index.row(), self.BLOCK_ROWS)
+        return self._display_block(index.column(), block)[offset]
 
     def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.ItemDataRole.DisplayRole):
         """Return header data."""
@@ -31,11 +87,57 @@ class PandasModel(QAbstractTableModel):
             if orientation == Qt.Orientation.Horizontal:
                 return str(self._dataframe.columns[section])
             if orientation == Qt.Orientation.Vertical:
-                return str(self._dataframe.index[section])
+                return str(self._dataframe.index[self.sourceRow(section)])
         return None
 
+    def _permutation(self, column: int, ascending: bool):
+        key = (column, ascending)
+        order = self._sort_cache.get(key)
+        if order is None:
+            values = self._dataframe.iloc[:, column].reset_index(drop=True)
+            try:
+                ordered = values.sort_values(ascending=ascending, kind="stable", na_position="last")
+            except TypeError:  # mixed types in one column - compare as text
+                ordered = values.astype(str).sort_values(ascending=ascending, kind="stable", na_position="last")
+            order = ordered.index.to_numpy()
+            self._sort_cache[key] = order
+        return order
+
+    def sort(self, column: int, order=Qt.SortOrder.AscendingOrder):
+        """Sort the view by a column (column < 0 restores the frame order)."""
+        if column >= self.columnCount() or self._dataframe.empty:
+            return
+        new_order = None if column < 0 else self._permutation(column, order == Qt.SortOrder.AscendingOrder)
+
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        sources = [self.sourceRow(index.row()) for index in persistent]
+
+        self._order = new_order
+        self._display.clear()
+        if new_order is not None:
+            view_row_of = np.empty(len(new_order), dtype=np.int64)
+            view_row_of[new_order] = np.arange(len(new_order))
+        else:
+            view_row_of = None
+
+        # Selection and current index follow their rows; rows not loaded yet are dropped
+        new_indexes = []
+        for index, source in zip(persistent, sources):
+            row = int(view_row_of[source]) if view_row_of is not None else source
+            new_indexes.append(self.index(row, index.column()) if row < self._loaded else QModelIndex())
+        self.changePersistentIndexList(persistent, new_indexes)
+        self.layoutChanged.emit()
+
+    def refreshData(self):
+        """Call after values of the frame were changed in place (cached strings and sort orders are dropped)."""
+        self._display.clear()
+        self._sort_cache = {}
+        if self._loaded and len(self._dataframe.columns):
+            self.dataChanged.emit(self.index(0, 0), self.index(self._loaded - 1, len(self._dataframe.columns) - 1))
+
     def setDataFrame(self, dataframe: pd.DataFrame):
         """Set a new DataFrame to the model."""
         self.beginResetModel()
-        self._dataframe = dataframe
+        self._set_frame(dataframe)
         self.endResetModel()
@@ -0,0 +1,121 @@
+"""
+Moving DataFrames between processes without pickling them.
+
+Frames (and Series) found in task arguments and results are written as Arrow IPC
+streams into shared-memory blocks; only the block names cross the process
+boundary. The receiving side reads the frame back and releases the block.
+Anything else - and frames Arrow cannot represent - is pickled as usual.
+"""
+import os
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import pandas as pd
+
+try:  # without pyarrow frames are pickled like everything else
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+MIN_SHARED_BYTES = 64 * 1024  # smaller frames are cheaper to pickle
+
+
+class SharedFrameRef:
+    """Picklable handle of a frame stored in a shared-memory block."""
+    def __init__(self, name, size, series_name=None, is_series=False):
+        self.name = name
+        self.size = size
+        self.series_name = series_name
+        self.is_series = is_series
+
+
+def _to_shared(obj):
+    is_series = isinstance(obj, pd.Series)
+    frame = obj.to_frame(name="__series__") if is_series else obj
+    if pa is None or frame.memory_usage(deep=False).sum() < MIN_SHARED_BYTES:
+        return obj
+    try:
+        table = pa.Table.from_pandas(frame)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError, ValueError):
+        return obj  # e.g. object columns mixing numbers and text
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    buffer = sink.getvalue()
+
+    block = shared_memory.SharedMemory(name=f"bomos_{os.getpid()}_{uuid.uuid4().hex[:12]}", create=True,
+                                       size=max(buffer.size, 1))
+    try:
+        block.buf[:buffer.size] = memoryview(buffer).cast("B")
+        ref = SharedFrameRef(block.name, buffer.size, obj.name if is_series else None, is_series)
+    finally:
+        block.close()
+    # The receiving process unlinks the block; the creator's resource tracker must not
+    # unlink it too (or warn about a leak) when the creating process exits.
+    resource_tracker.unregister(block._name, "shared_memory")
+    return ref
+
+
+def _from_shared(ref: SharedFrameRef):
+    block = shared_memory.SharedMemory(name=ref.name)
+    try:
+        # One copy out of the block, so it can be released before the frame is used
+        data = pa.py_buffer(bytes(block.buf[:ref.size]))
+    finally:
+        block.close()
+        block.unlink()
+    frame = pa.ipc.open_stream(data).read_all().to_pandas()
+    if ref.is_series:
+        series = frame["__series__"]
+        series.name = ref.series_name
+        return series
+    return frame
+
+
+def pack(obj):
+    """Replaces DataFrames/Series (also inside tuples, lists and dicts) with shared-memory handles."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return _to_shared(obj)
+    if isinstance(obj, tuple):
+        return tuple(pack(item) for item in obj)
+    if isinstance(obj, list):
+        return [pack(item) for item in obj]
+    if isinstance(obj, dict):
+        return {key: pack(value) for key, value in obj.items()}
+    return obj
+
+
+def unpack(obj):
+    """Inverse of pack(); every shared-memory block is read once and released."""
+    if isinstance(obj, SharedFrameRef):
+        return _from_shared(obj)
+    if isinstance(obj, tuple):
+        return tuple(unpack(item) for item in obj)
+    if isinstance(obj, list):
+        return [unpack(item) for item in obj]
+    if isinstance(obj, dict):
+        return {key: unpack(value) for key, value in obj.items()}
+    return obj
+
+
+def release(obj):
+    """Frees the blocks of a packed object that will never be unpacked (e.g. a failed task)."""
+    if isinstance(obj, SharedFrameRef):
+        try:
+            block = shared_memory.SharedMemory(name=obj.name)
+            block.close()
+            block.unlink()
+        except FileNotFoundError:
+            pass
+    elif isinstance(obj, (tuple, list)):
+        for item in obj:
+            release(item)
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            release(value)
+
+
+def run_packed(fn, packed_args, packed_kwargs):
+    """Entry point in the worker process: unpack the arguments, run fn, pack its result."""
+    return pack(fn(*unpack(packed_args), **unpack(packed_kwargs)))
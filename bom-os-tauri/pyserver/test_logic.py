@@ -1,7 +1,17 @@
 import unittest
+import json
 import pandas as pd
+import numpy as np
+import joblib
 import os
 import shutil
+import tempfile
+import threading
+import time
+import glob
+import multiprocessing
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
 
 # Dodaj ścieżkę do modułów, aby testy mogły je znaleźć
 import sys
@@ -9,10 +19,36 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
 # Importuj moduły do testowania
 from common import data_processing
+from common import profiling
+from common.cancellation import TaskCancelled, checkpoint
 from pyserver import ai_logic
+from pyserver.common import cancellation as package_cancellation  # klasa wyjątku widziana przez moduły pakietu
+from pyserver import forecasting_logic
+from pyserver import app as sidecar
+from pyserver import jobs
+from pyserver import dataset_store
+from pyserver import shared_frames
+from pyserver import model_registry
+from pyserver import feedback_store
+
+try:
+    from PySide6.QtCore import Qt, QCoreApplication, QThreadPool
+    from pyserver.pandas_model import PandasModel
+    from pyserver.worker import Worker, TaskScheduler
+except ImportError:  # PySide6 jest potrzebny tylko aplikacji desktopowej
+    PandasModel = None
 
 class TestDataProcessing(unittest.TestCase):
 
+    def setUp(self):
+        data_processing.clear_processing_cache()
+        self.original_snapshot_dir = data_processing.SNAPSHOT_DIR
+        data_processing.SNAPSHOT_DIR = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(data_processing.SNAPSHOT_DIR)
+        data_processing.SNAPSHOT_DIR = self.original_snapshot_dir
+
     def test_process_data_files_robustness(self):
         """Testuje, czy przetwarzanie danych jest odporne na brakujące pliki."""
         # Scenariusz: podano tylko plik stanów, reszta to `None`
@@ -42,6 +78,50 @@ class TestDataProcessing(unittest.TestCase):
         # Posprzątaj
         os.remove(stany_path)
 
+    def test_process_data_files_records_stages(self):
+        """Testuje, czy przetwarzanie zapisuje czasy i pamięć poszczególnych etapów."""
+        stany_path = os.path.join(data_processing.SNAPSHOT_DIR, "stany.csv")
+        pd.DataFrame({
+            "Indeks": ["A1", "B2"],
+            "Name": ["Produkt A", "Produkt B"],
+            "Ilość na stanie": [10, 5],
+        }).to_csv(stany_path, index=False)
+
+        with profiling.recording("test") as recorder:
+            data_processing.process_data_files(stany_path, None, None, None)
+
+        names = [s["stage"] for s in recorder.stages]
+        self.assertIn("read_stany", names)
+        self.assertIn("alerts", names)
+        self.assertIs(profiling.last_run(), recorder)
+        stany_stage = recorder.stages[names.index("read_stany")]
+        self.assertEqual(stany_stage["rows"], 2)
+        self.assertGreaterEqual(stany_stage["wall_s"], 0.0)
+        self.assertIn("read_stany", recorder.summary())
+
+    def test_progress_and_cancellation_checkpoints(self):
+        """Testuje raportowanie postępu i przerwanie przetwarzania na punkcie kontrolnym."""
+        stany_path = os.path.join(data_processing.SNAPSHOT_DIR, "stany.csv")
+        pd.DataFrame({"Indeks": ["A1"], "Name": ["Produkt A"], "Ilość na stanie": [10]}).to_csv(stany_path, index=False)
+
+        progress = []
+        data_processing.process_data_files(
+            stany_path, None, None, None, progress_callback=lambda p, message: progress.append(p)
+        )
+        self.assertEqual(progress[0], 0.0)
+        self.assertEqual(progress[-1], 1.0)
+        self.assertEqual(progress, sorted(progress))
+
+        # Anulowanie po pierwszym etapie: wyjątek zamiast pustych ramek, nic nie trafia do pamięci etapów
+        data_processing.clear_processing_cache()
+        with self.assertRaises(TaskCancelled):
+            data_processing.process_data_files(
+                stany_path, None, None, None,
+                progress_callback=lambda p, message: progress.append(p), should_cancel=lambda: progress[-1] > 0
+            )
+        with self.assertRaises(TaskCancelled):
+            data_processing.fuzzy_match(["Produkt A"], ["Produkt A"], should_cancel=lambda: True)
+
     def test_dynamic_sales_column_detection(self):
         """Testuje, czy funkcja poprawnie wykrywa kolumny sprzedaży."""
         stany_df = pd.DataFrame({"Indeks": ["A1"], "Name": ["Produkt A"], "Ilość na stanie": [100]})
@@ -70,6 +150,208 @@ class TestDataProcessing(unittest.TestCase):
         os.remove(sprzedaz_path)
 
 
+    def test_fuzzy_match_matches_extract_one(self):
+        """Testuje, czy macierzowe dopasowanie daje te same wyniki co extractOne w pętli."""
+        from rapidfuzz import process, fuzz
+        known = ["Śruba M8 ocynk", "Nakrętka M8", "Podkładka M10", "Obudowa czarna", "Kabel 2m", "Kabel 3m"]
+        new = ["sruba M8 ocynk", "Nakretka M8", "Kabel 2m czarny", "Obudowa czarna duża", "Coś innego", "Kabel"]
+
+        expected = {}
+        for name in new:
+            match = process.extractOne(name, known, scorer=fuzz.token_set_ratio)
+            if match and match[1] > 80:
+                expected[name] = match[0]
+
+        self.assertEqual(data_processing.fuzzy_match(new, known), expected)
+        self.assertEqual(data_processing.fuzzy_match(new, known, blocking=True, max_token_share=1.0), expected)
+        # Blokowanie: bez wspólnego tokenu z żadnym kandydatem (literówki) - pełne przeszukanie
+        self.assertEqual(data_processing.fuzzy_match(["Obudwa czarnaa"], known, blocking=True),
+                         {"Obudwa czarnaa": "Obudowa czarna"})
+        self.assertEqual(data_processing.fuzzy_match(new, []), {})
+
+
+    def test_match_cache_is_incremental_and_exact(self):
+        """Testuje, czy pamięć dopasowań daje te same wyniki co liczenie od zera."""
+        cache_dir = tempfile.mkdtemp()
+        cache_path = os.path.join(cache_dir, "fuzzy_match_cache.joblib")
+        try:
+            known = ["Kabel 2m", "Kabel 3m", "Obudowa czarna", "Nakrętka M8"]
+            new = ["Kabel 2m czarny", "Obudowa czarna duża", "Nakretka M8", "Coś innego"]
+            runs = [
+                (new, known),
+                (new + ["Kabel 3m biały"], known),                # nowa nazwa BOM
+                (new, known + ["Kabel 2m czarny"]),              # nowy, lepszy kandydat
+                (new, [k for k in known if k != "Obudowa czarna"]),  # usunięte dopasowanie
+                (new, list(reversed(known))),                   # zmiana kolejności
+            ]
+            for run_new, run_known in runs:
+                cached = data_processing.FuzzyMatchCache(cache_path).match(run_new, run_known)
+                self.assertEqual(cached, data_processing.fuzzy_match(run_new, run_known))
+            self.assertTrue(os.path.exists(cache_path))
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+    def test_reload_recomputes_only_changed_file(self):
+        """Testuje, czy po zmianie jednego pliku wczytywany jest ponownie tylko ten plik."""
+        stany_path, minimum_path = "test_stany.csv", "test_minimum.csv"
+        pd.DataFrame({"Indeks": ["A1", "B2"], "Name": ["Produkt A", "Produkt B"],
+                      "Ilość na stanie": [10, 5]}).to_csv(stany_path, index=False)
+        pd.DataFrame({"Indeks": ["A1", "B2"], "Minimum": [1, 1]}).to_csv(minimum_path, index=False)
+
+        read_paths = []
+        original_read = data_processing.read_input_file
+        def counting_read(path, *args, **kwargs):
+            read_paths.append(path)
+            return original_read(path, *args, **kwargs)
+        data_processing.read_input_file = counting_read
+        try:
+            data_processing.process_data_files(stany_path, None, minimum_path, None)
+            self.assertEqual(read_paths.count(stany_path), 1)
+
+            pd.DataFrame({"Indeks": ["A1", "B2"], "Minimum": [1, 20]}).to_csv(minimum_path, index=False)
+            os.utime(minimum_path, ns=(0, 0))  # wymuś inny czas modyfikacji
+            read_paths.clear()
+            df, _ = data_processing.process_data_files(stany_path, None, minimum_path, None)
+            self.assertEqual(read_paths, [minimum_path])
+            self.assertEqual(df.iloc[1]["alert"], "Stan poniżej minimum – zleć BOM!")
+        finally:
+            data_processing.read_input_file = original_read
+            os.remove(stany_path)
+            os.remove(minimum_path)
+
+
+    def test_snapshot_reload_projects_columns(self):
+        """Testuje odczyt z migawki kolumnowej z ograniczeniem do wybranych kolumn."""
+        if data_processing.feather is None:
+            self.skipTest("pyarrow nie jest zainstalowany")
+        sprzedaz_path = "test_sprzedaz_snapshot.csv"
+        pd.DataFrame({"GSM1": ["A1", "B2"], "Opis": ["x", "y"], "Sty-23": [1, 2], "Lut-23": [3, 4]}) \
+            .to_csv(sprzedaz_path, index=False)
+        try:
+            first = data_processing.read_input_file(sprzedaz_path)
+            self.assertTrue(os.path.exists(data_processing.snapshot_path(sprzedaz_path)))
+            projected = data_processing.read_input_file(sprzedaz_path, usecols=lambda c: c != "Opis")
+            self.assertEqual(list(projected.columns), ["GSM1", "Sty-23", "Lut-23"])
+            pd.testing.assert_frame_equal(projected, first[["GSM1", "Sty-23", "Lut-23"]], check_dtype=False)
+        finally:
+            os.remove(sprzedaz_path)
+
+
+    def test_streaming_sales_matches_in_memory(self):
+        """Testuje, czy strumieniowe przetwarzanie sprzedaży daje ten sam wynik co w pamięci."""
+        sprzedaz_path = "test_sprzedaz_stream.csv"
+        n = 2500
+        pd.DataFrame({
+            "GSM1": [f"SKU-{i}" for i in range(n)],
+            "Name": [f"Produkt {i}" for i in range(n)],
+            "Jan-23": [i % 7 for i in range(n)],
+            "Feb-23": [float(i % 5) if i % 100 else None for i in range(n)],
+            "Mar-24": [i % 3 for i in range(n)],
+        }).to_csv(sprzedaz_path, index=False)
+        try:
+            expected = data_processing.aggregate_sales(pd.read_csv(sprzedaz_path))
+            # limit wymusza kilka porcji po 1000 wierszy
+            actual = data_processing.aggregate_sales_streaming(sprzedaz_path, memory_limit_mb=0.01)
+            pd.testing.assert_frame_equal(actual[0], expected[0])
+            pd.testing.assert_frame_equal(actual[1], expected[1])
+        finally:
+            os.remove(sprzedaz_path)
+
+
+    def test_streaming_sales_peak_memory(self):
+        """Testuje, czy strumieniowe przetwarzanie sprzedaży nie trzyma w pamięci drugiej kopii ramki długiej."""
+        sprzedaz_path = "test_sprzedaz_peak.csv"
+        n = 10000
+        months = [f"{month}-{year}" for year in (23, 24) for month in
+                  ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")]
+        pd.DataFrame({"GSM1": [f"SKU-{i}" for i in range(n)], **{m: np.arange(n) % 7 for m in months}}
+                     ).to_csv(sprzedaz_path, index=False)
+        tracemalloc.start()
+        try:
+            result = data_processing.aggregate_sales_streaming(sprzedaz_path, memory_limit_mb=0.5)
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            os.remove(sprzedaz_path)
+        self.assertEqual(len(result[1]), n * len(months))
+        # wcześniej porcje były odkładane i sklejane na końcu - szczyt ok. 2x wyniku
+        self.assertLess(peak, 1.5 * retained)
+
+
+    def test_compact_mode_keeps_values(self):
+        """Testuje, czy tryb kompaktowy zmienia tylko typy kolumn, a nie wartości."""
+        stany_path, sprzedaz_path = "test_stany.csv", "test_sprzedaz_compact.csv"
+        pd.DataFrame({"Indeks": [f"A{i}" for i in range(6)], "Name": [f"Produkt {i}" for i in range(6)],
+                      "Ilość na stanie": [10, 0, 300, 10, 5, 7]}).to_csv(stany_path, index=False)
+        pd.DataFrame({"GSM1": ["A0", "A1"], "Mar-23": [1, 2], "Apr-23": [3, 4]}).to_csv(sprzedaz_path, index=False)
+        try:
+            df, monthly = data_processing.process_data_files(stany_path, None, None, sprzedaz_path)
+            data_processing.clear_processing_cache()
+            compact_df, compact_monthly = data_processing.process_data_files(
+                stany_path, None, None, sprzedaz_path, compact=True
+            )
+            self.assertIsInstance(compact_df["alert"].dtype, pd.CategoricalDtype)
+            self.assertIsInstance(compact_monthly["indeks"].dtype, pd.CategoricalDtype)
+            self.assertEqual(compact_df["stan"].dtype, "int16")
+            pd.testing.assert_frame_equal(compact_df.astype(df.dtypes), df)
+            pd.testing.assert_frame_equal(compact_monthly.astype(monthly.dtypes), monthly)
+        finally:
+            os.remove(stany_path)
+            os.remove(sprzedaz_path)
+
+
+    def test_synthetic_benchmark_data(self):
+        """Testuje, czy generator danych benchmarku jest deterministyczny i zgodny z potokiem."""
+        from benchmarks import generate_data
+        first = generate_data.generate_frames(skus=50, months=24, seed=7)
+        second = generate_data.generate_frames(skus=50, months=24, seed=7)
+        for kind in first:
+            pd.testing.assert_frame_equal(first[kind], second[kind])
+
+        data_dir = tempfile.mkdtemp()
+        try:
+            paths = generate_data.write_dataset(data_dir, skus=50, months=24, seed=7)
+            df, monthly_sales_df = data_processing.process_data_files(**paths, match_cache_path=None)
+            self.assertEqual(len(df), 50)
+            self.assertEqual(len(monthly_sales_df), 50 * 24)
+        finally:
+            shutil.rmtree(data_dir)
+
+
+    def test_pipeline_mapping_matches_extract_one(self):
+        """Testuje, czy dopasowanie nazw w potoku (też przez pamięć dopasowań) daje wyniki extractOne."""
+        from rapidfuzz import process, fuzz
+        from benchmarks import generate_data
+        data_dir = tempfile.mkdtemp()
+        mappings = []
+        original_finalize = data_processing.finalize_frame
+        def capturing_finalize(df, mapping, *args, **kwargs):
+            mappings.append(mapping)
+            return original_finalize(df, mapping, *args, **kwargs)
+        data_processing.finalize_frame = capturing_finalize
+        try:
+            paths = generate_data.write_dataset(data_dir, skus=300, months=24, seed=3)
+            # Co trzeci produkt znika ze stanów - jego nazwy z BOM-ów mają tylko podobnych kandydatów
+            stany = pd.read_csv(paths["stany_path"]).iloc[lambda df: np.arange(len(df)) % 3 != 0]
+            stany.to_csv(paths["stany_path"], index=False)
+            known = stany["Name"].unique()
+            expected = {}
+            for name in pd.read_csv(paths["bomy_path"])["Nazwa"].unique():  # literówki i małe litery
+                match = process.extractOne(name, known, scorer=fuzz.token_set_ratio)
+                if match and match[1] > 80:
+                    expected[name] = match[0]
+
+            data_processing.process_data_files(**paths, match_cache_path=None)
+            data_processing.process_data_files(**paths, match_cache_path=os.path.join(data_dir, "cache.joblib"))
+            self.assertEqual(len(mappings), 2)
+            for mapping in mappings:
+                self.assertEqual(mapping, expected)
+        finally:
+            data_processing.finalize_frame = original_finalize
+            shutil.rmtree(data_dir)
+
+
 class TestAILogic(unittest.TestCase):
     
     def setUp(self):
@@ -83,19 +365,24 @@ class TestAILogic(unittest.TestCase):
         if os.path.exists(self.model_dir):
             shutil.rmtree(self.model_dir)
 
-    def test_train_and_predict(self):
-        """Testuje, czy model AI może być trenowany i używany do predykcji."""
+    def training_frame(self, repeat=2, with_indeks=True):
+        """Ramka treningowa: 10 wierszy cech powtórzonych repeat razy, trzy typy alertów."""
         df = pd.DataFrame({
-            "indeks": [f"SKU-{i}" for i in range(20)],
-            "stan": [10, 2, 30, 5, 8, 1, 50, 6, 9, 4] * 2,
-            "minimum": [5, 3, 20, 10, 10, 2, 40, 5, 8, 5] * 2,
-            "ilośćBom": [1, 0, 1, 1, 0, 1, 1, 0, 0, 1] * 2,
-            "sprzedaż": [100, 20, 50, 15, 30, 5, 120, 25, 40, 10] * 2,
-            "alert": ["OK", "Stan poniżej minimum – zleć BOM!", "OK", "Brak produktu – pilnie BOM!","OK"] * 4
+            "indeks": [f"SKU-{i}" for i in range(10 * repeat)],
+            "stan": [10, 2, 30, 5, 8, 1, 50, 6, 9, 4] * repeat,
+            "minimum": [5, 3, 20, 10, 10, 2, 40, 5, 8, 5] * repeat,
+            "ilośćBom": [1, 0, 1, 1, 0, 1, 1, 0, 0, 1] * repeat,
+            "sprzedaż": [100, 20, 50, 15, 30, 5, 120, 25, 40, 10] * repeat,
+            "alert": ["OK", "Stan poniżej minimum – zleć BOM!", "OK", "Brak produktu – pilnie BOM!", "OK"] * (2 * repeat),
         })
+        return df if with_indeks else df.drop(columns="indeks")
+
+    def test_train_and_predict(self):
+        """Testuje, czy model AI może być trenowany i używany do predykcji."""
+        df = self.training_frame()
         
         # Trenowanie
-        model_data = ai_logic.train_and_save_model(df, feedback_log_path="non_existent_file.csv")
+        model_data = ai_logic.train_and_save_model(df)
         self.assertIsNotNone(model_data, "Trenowanie nie zwróciło danych modelu")
         
         # Wczytywanie
@@ -108,5 +395,739 @@ class TestAILogic(unittest.TestCase):
         predictions = ai_logic.predict_with_model(model, encoder, df)
         self.assertEqual(len(predictions), len(df), "Liczba predykcji nie zgadza się z liczbą wierszy")
 
+    def test_training_subsample_keeps_every_alert_type(self):
+        """Testuje trening na próbce warstwowej w limicie wierszy i zwracane statystyki uczenia."""
+        n = 2000
+        alerts = np.where(np.arange(n) % 4 == 0, "Stan poniżej minimum – zleć BOM!", "OK")
+        alerts[:3] = "Brak produktu – pilnie BOM!"  # rzadka klasa nie może zniknąć z próbki
+        df = pd.DataFrame({
+            "stan": np.arange(n) % 50,
+            "minimum": np.arange(n) % 7,
+            "ilośćBom": np.arange(n) % 2,
+            "sprzedaż": np.arange(n) % 90,
+            "alert": alerts,
+        })
+        model_data = ai_logic.train_and_save_model(df, max_rows=400, n_jobs=2)
+        stats = model_data["training_stats"]
+        self.assertTrue(stats["sampled"])
+        self.assertEqual(stats["rows_total"], n)
+        self.assertLessEqual(stats["rows_used"], 400)
+        self.assertGreater(stats["fit_s"], 0)
+        self.assertIn("accuracy", stats)
+        self.assertEqual(set(model_data["encoder"].classes_), set(alerts))
+        self.assertEqual(len(model_data["model"].classes_), 3)
+        self.assertEqual(len(model_data["importances"]), len(ai_logic.FEATURES))
+
+        sample = ai_logic.stratified_sample(model_data["encoder"].transform(alerts), 400)
+        self.assertTrue((np.diff(sample) > 0).all())
+        self.assertIsNone(ai_logic.stratified_sample(np.zeros(10, dtype=int), 400))
+        self.assertLess(ai_logic.estimate_training_rows(1, n_jobs=1), ai_logic.estimate_training_rows(10, n_jobs=1))
+
+    def test_corrections_apply_without_retraining(self):
+        """Testuje warstwę korekt: natychmiastowe nadpisanie predykcji, próg dryfu i wyzerowanie po douczeniu."""
+        df = self.training_frame(repeat=10)
+        ai_logic.ensure_model_dir_exists()
+        store = feedback_store.FeedbackStore(os.path.join(self.model_dir, "feedback.sqlite3"))
+        model_data = ai_logic.train_and_save_model(df, store)
+        model, encoder = model_data["model"], model_data["encoder"]
+        corrections = ai_logic.CorrectionLayer(store)
+        self.assertFalse(corrections.needs_retraining(model_data))
+
+        started = time.perf_counter()
+        for row in range(0, 96, 2):  # kilkadziesiąt korekt
+            corrections.add(df.iloc[[row]], "Brak produktu – pilnie BOM!")
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertEqual(len(corrections), 48)
+
+        changed = df.copy()
+        changed.loc[2, "stan"] = 999  # wiersz zmienił się od korekty - obowiązuje znowu model
+        labels, probabilities = ai_logic.predict_with_probabilities(
+            model, encoder, changed, ai_logic.PredictionCache(), model_data["version"], corrections=corrections)
+        plain, _ = ai_logic.predict_with_probabilities(model, encoder, changed)
+        classes = list(ai_logic.class_labels(model, encoder))
+        self.assertEqual(labels[0], "Brak produktu – pilnie BOM!")
+        self.assertEqual(probabilities[0, classes.index("Brak produktu – pilnie BOM!")], 1.0)
+        self.assertEqual(labels[2], plain[2])
+        self.assertEqual(list(labels[1::2]), list(plain[1::2]))
+        streamed = np.concatenate([chunk for _, chunk, _ in ai_logic.iter_predictions(
+            model, encoder, changed, chunk_rows=7, corrections=corrections)])
+        self.assertEqual(list(streamed), list(labels))
+
+        # Inny proces widzi korekty z magazynu; 48 korekt na 100 wierszy przekracza próg dryfu
+        other = ai_logic.CorrectionLayer(feedback_store.FeedbackStore(store.path))
+        self.assertEqual(other.pending(model_data), 48)
+        self.assertTrue(other.needs_retraining(model_data))
+        # Model bez statystyk treningu (np. ze starszej wersji) - tylko limit liczby korekt
+        legacy = {"model": model, "encoder": encoder}
+        self.assertFalse(other.needs_retraining(legacy))
+        self.assertTrue(other.needs_retraining(legacy, max_pending=48))
+        retrained = ai_logic.train_and_save_model(df, store)
+        self.assertEqual(retrained["training_stats"]["feedback_rows"], 48)
+        self.assertFalse(other.needs_retraining(retrained))
+
+    def test_feedback_store_latest_corrections_and_csv_migration(self):
+        """Testuje magazyn korekt: migrację starego CSV, ostatnią korektę indeksu i trening z wielokrotnymi korektami."""
+        data_dir = tempfile.mkdtemp()
+        try:
+            df = self.training_frame()
+            csv_path = os.path.join(data_dir, "feedback_log.csv")
+            df.iloc[[0, 1]].assign(alert="Brak produktu – pilnie BOM!").to_csv(csv_path, index=False)
+            store = feedback_store.FeedbackStore(os.path.join(data_dir, "feedback.sqlite3"), legacy_csv_path=csv_path)
+
+            self.assertEqual(store.count(), 2)  # zmigrowane przy pierwszym użyciu
+            self.assertFalse(os.path.exists(csv_path))
+            self.assertTrue(os.path.exists(csv_path + ".migrated"))
+
+            # Ten sam indeks poprawiany kilka razy - liczy się ostatnia korekta
+            store.add(df.iloc[[0]], "OK")
+            store.add(df.iloc[[0, 2]], "Stan poniżej minimum – zleć BOM!")
+            self.assertEqual(store.count(), 5)
+            latest = store.latest().set_index("indeks")
+            self.assertEqual(len(latest), 3)
+            self.assertEqual(latest.loc["SKU-0", "alert"], "Stan poniżej minimum – zleć BOM!")
+            self.assertEqual(latest.loc["SKU-1", "alert"], "Brak produktu – pilnie BOM!")
+            self.assertEqual(list(store.latest(since_id=3)["indeks"]), ["SKU-0", "SKU-2"])
+            exported = store.export()
+            self.assertEqual(list(exported["id"]), [1, 2, 3, 4, 5])
+            self.assertEqual(list(exported.columns[4:]), ai_logic.FEATURES)
+
+            model_data = ai_logic.train_and_save_model(df, store)
+            self.assertIsNotNone(model_data)
+            self.assertEqual(model_data["training_stats"]["feedback_rows"], 5)
+            self.assertEqual(feedback_store.FeedbackStore(os.path.join(data_dir, "brak.sqlite3")).count(), 0)
+            self.assertFalse(os.path.exists(os.path.join(data_dir, "brak.sqlite3")))
+        finally:
+            shutil.rmtree(data_dir)
+
+    def test_prediction_cache_scores_only_new_rows(self):
+        """Testuje, czy pamięć predykcji ocenia modelem tylko nowe wektory cech i czyści się po zmianie modelu."""
+        df = self.training_frame(with_indeks=False)
+        model_data = ai_logic.train_and_save_model(df)
+        model, encoder, version = model_data["model"], model_data["encoder"], model_data["version"]
+        cache = ai_logic.PredictionCache()
+
+        expected = ai_logic.predict_with_model(model, encoder, df)
+        cached = ai_logic.predict_with_model(model, encoder, df, cache, version)
+        self.assertEqual(list(cached), list(expected))
+        self.assertEqual(cache.misses, 10)  # każdy wektor cech występuje dwa razy
+
+        changed = df.copy()
+        changed.loc[3, "minimum"] = 0
+        cached = ai_logic.predict_with_model(model, encoder, changed, cache, version)
+        self.assertEqual(list(cached), list(ai_logic.predict_with_model(model, encoder, changed)))
+        self.assertEqual((cache.hits, cache.misses), (19, 1))
+
+        ai_logic.predict_with_model(model, encoder, df, cache, "nowy-model")
+        self.assertEqual((cache.hits, cache.misses), (0, 10))
+
+    def test_model_registry_versions_and_hot_reload(self):
+        """Testuje wersjonowany zapis modeli, wskaźnik aktywnej wersji i przejęcie nowej wersji bez restartu."""
+        df = self.training_frame(with_indeks=False)
+        first = ai_logic.train_and_save_model(df)
+        # Drugi "proces" - osobny rejestr na tym samym katalogu
+        other = model_registry.ModelRegistry(ai_logic.MODEL_DIR)
+        loaded = other.current()
+        self.assertEqual(loaded["version"], first["version"])
+        self.assertIsNot(loaded, first)  # wczytany z dysku, nie obiekt z pamięci pierwszego rejestru
+
+        second = ai_logic.train_and_save_model(df)
+        self.assertEqual(ai_logic.registry.versions(), sorted([first["version"], second["version"]]))
+        self.assertIs(ai_logic.load_model(), second)
+        self.assertEqual(other.current()["version"], second["version"])
+        self.assertEqual(list(loaded["model"].predict(df[ai_logic.FEATURES])), list(first["model"].predict(df[ai_logic.FEATURES])))
+
+        ai_logic.registry.activate(first["version"])  # powrót do poprzedniej wersji
+        self.assertEqual(other.current()["version"], first["version"])
+        self.assertFalse([name for name in os.listdir(ai_logic.registry.versions_dir) if name.startswith(".")])
+
+    def test_legacy_model_file_is_imported(self):
+        """Testuje przeniesienie modelu zapisanego jednym plikiem (starsze wersje) do rejestru."""
+        ai_logic.ensure_model_dir_exists()
+        joblib.dump({"model": "stary-model", "encoder": None, "importances": None}, ai_logic.MODEL_PATH)
+        model_data = ai_logic.load_model()
+        self.assertEqual(model_data["model"], "stary-model")
+        self.assertEqual(ai_logic.registry.active_version(), model_data["version"])
+        self.assertFalse(os.path.exists(ai_logic.MODEL_PATH))
+
+    def test_training_progress_and_cancellation(self):
+        """Testuje raportowanie postępu treningu i anulowanie przed zapisem (aktywny model bez zmian)."""
+        df = pd.DataFrame({
+            "stan": list(range(40)),
+            "minimum": [10] * 40,
+            "ilośćBom": [1, 0] * 20,
+            "sprzedaż": [i * 3 for i in range(40)],
+            "alert": ["Stan poniżej minimum – zleć BOM!"] * 10 + ["OK"] * 30,
+        })
+        progress = []
+        model_data = ai_logic.train_and_save_model(df, progress_callback=lambda p, message: progress.append(p))
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual((progress[0], progress[-1]), (0.0, 0.95))
+
+        with self.assertRaises(package_cancellation.TaskCancelled):
+            ai_logic.train_and_save_model(df, progress_callback=lambda p, message: progress.append(p),
+                                          should_cancel=lambda: progress[-1] >= 0.9)
+        self.assertEqual(ai_logic.registry.versions(), [model_data["version"]])
+        self.assertIs(ai_logic.load_model(), model_data)
+
+    def test_chunked_predictions_with_probabilities(self):
+        """Testuje, czy predykcja porcjami w wielu wątkach daje te same etykiety i prawdopodobieństwa."""
+        df = pd.DataFrame({
+            "stan": list(range(40)),
+            "minimum": [10] * 40,
+            "ilośćBom": [1, 0] * 20,
+            "sprzedaż": [i * 3 for i in range(40)],
+            "alert": ["Brak produktu – pilnie BOM!"] * 10 + ["Stan poniżej minimum – zleć BOM!"] * 10 + ["OK"] * 20,
+        })
+        model_data = ai_logic.train_and_save_model(df)
+        model, encoder = model_data["model"], model_data["encoder"]
+
+        labels, probabilities = ai_logic.predict_with_probabilities(model, encoder, df, chunk_rows=7, max_workers=3)
+        self.assertEqual(list(labels), list(encoder.inverse_transform(model.predict(df[ai_logic.FEATURES]))))
+        self.assertEqual(probabilities.shape, (40, 3))
+        self.assertTrue(((probabilities.max(axis=1) > 0) & (probabilities.max(axis=1) <= 1)).all())
+
+        chunks = list(ai_logic.iter_predictions(model, encoder, df, chunk_rows=15, max_workers=2))
+        self.assertEqual([start for start, _, _ in chunks], [0, 15, 30])
+        self.assertEqual([label for _, chunk, _ in chunks for label in chunk], list(labels))
+        classes = list(ai_logic.class_labels(model, encoder))
+        self.assertEqual([classes[i] for i in chunks[0][2].argmax(axis=1)], list(chunks[0][1]))
+
+class TestForecastingLogic(unittest.TestCase):
+
+    def setUp(self):
+        self.product_ids = ["TEST-FC-LONG", "TEST-FC-SHORT"]
+        dates = pd.date_range("2021-01-01", periods=30, freq="MS")
+        self.monthly_sales_df = pd.concat([
+            pd.DataFrame({"indeks": "TEST-FC-LONG", "date": dates, "sales": [10 + (i % 12) for i in range(30)]}),
+            pd.DataFrame({"indeks": "TEST-FC-SHORT", "date": dates[:6], "sales": [5] * 6}),
+        ], ignore_index=True)
+
+    def tearDown(self):
+        for product_id in self.product_ids:
+            for path in (forecasting_logic.get_model_path(product_id),
+                         forecasting_logic.get_legacy_model_path(product_id),
+                         forecasting_logic.get_fingerprint_path(product_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def test_batch_training_skips_up_to_date_models(self):
+        """Testuje trenowanie wsadowe prognoz i pomijanie aktualnych modeli."""
+        progress = []
+        summary = forecasting_logic.train_forecast_models_batch(
+            self.monthly_sales_df, max_workers=2,
+            progress_callback=lambda p, message: progress.append((p, message))
+        )
+        self.assertEqual(summary["trained"], ["TEST-FC-LONG"])
+        self.assertEqual(summary["not_enough_data"], ["TEST-FC-SHORT"])
+        self.assertEqual(summary["failed"], {})
+        self.assertEqual(progress, [(0.0, "Trenowanie prognoz 0/1"), (1.0, "Trenowanie prognoz 1/1")])
+        self.assertIsNotNone(forecasting_logic.load_forecast_model("TEST-FC-LONG"))
+
+        # Anulowanie przed startem - żaden model nie jest trenowany
+        with self.assertRaises(forecasting_logic.TaskCancelled):
+            forecasting_logic.train_forecast_models_batch(self.monthly_sales_df, max_workers=2, force=True,
+                                                          should_cancel=lambda: True)
+
+        summary = forecasting_logic.train_forecast_models_batch(self.monthly_sales_df, max_workers=2)
+        self.assertEqual(summary["trained"], [])
+        self.assertEqual(summary["up_to_date"], ["TEST-FC-LONG"])
+
+    def test_vectorized_batch_forecasts_every_product(self):
+        """Testuje prognozy wsadowe: metoda dobrana do historii, prognoza także dla krótkich i sporadycznych sprzedaży."""
+        dates = pd.date_range("2021-01-01", periods=30, freq="MS")
+        sales = pd.concat([
+            self.monthly_sales_df,
+            pd.DataFrame({"indeks": "TEST-FC-INTERMITTENT", "date": dates, "sales": [0, 0, 6, 0, 0, 0, 6, 0, 0, 6] * 3}),
+            pd.DataFrame({"indeks": "TEST-FC-NEW", "date": dates[-3:], "sales": [4, 4, 4]}),
+        ], ignore_index=True)
+        batch = forecasting_logic.forecast_batch(sales, steps=12)
+        methods = dict(zip(batch.product_ids, batch.methods))
+        self.assertEqual(methods["TEST-FC-LONG"], forecasting_logic.METHOD_HOLT_WINTERS)
+        self.assertEqual(methods["TEST-FC-INTERMITTENT"], forecasting_logic.METHOD_CROSTON)
+        self.assertEqual(methods["TEST-FC-NEW"], forecasting_logic.METHOD_SES)
+        self.assertEqual(batch.dates[0], pd.Timestamp("2023-07-01"))
+
+        # Sezonowość 10..21 powtarza się co 12 miesięcy - kolejny miesiąc to 16
+        long_forecast = batch.sales_forecast("TEST-FC-LONG")
+        self.assertAlmostEqual(long_forecast.iloc[0], 16, delta=1)
+        self.assertGreater(long_forecast.iloc[5], long_forecast.iloc[6])
+        self.assertAlmostEqual(batch.sales_forecast("TEST-FC-NEW").iloc[0], 4)
+        intermittent = batch.sales_forecast("TEST-FC-INTERMITTENT")
+        self.assertTrue(1 < intermittent.iloc[0] < 3)  # ok. 6 sztuk co 3-4 miesiące
+
+        stock = pd.Series({"TEST-FC-LONG": 100, "TEST-FC-SHORT": 3, "TEST-FC-INTERMITTENT": 1000, "TEST-FC-NEW": 10})
+        summary = forecasting_logic.forecast_catalog(sales, stock).set_index("indeks")
+        self.assertEqual(len(summary), 4)
+        for product_id in stock.index:
+            _, stockout_date = batch.stock_forecast(product_id, stock[product_id])
+            expected = pd.NaT if stockout_date is None else pd.Timestamp(stockout_date)
+            self.assertEqual(summary.loc[product_id, "stockout_date"] is pd.NaT, expected is pd.NaT)
+            if expected is not pd.NaT:
+                self.assertEqual(summary.loc[product_id, "stockout_date"], expected)
+
+        # Wiersz bez indeksu (pusta komórka GSM1) jest pomijany, nie psuje prognoz całego katalogu
+        with_blank = pd.concat([sales, pd.DataFrame({"indeks": [None], "date": [dates[0]], "sales": [7]})],
+                               ignore_index=True)
+        self.assertEqual(len(forecasting_logic.forecast_catalog(with_blank, stock)), 4)
+
+        # Krótka historia (6 miesięcy) - wcześniej brak prognozy, teraz wygładzanie wykładnicze
+        short = self.monthly_sales_df[self.monthly_sales_df["indeks"] == "TEST-FC-SHORT"].set_index("date")["sales"]
+        forecast_df, stockout_date = forecasting_logic.forecast_for_product(short, "TEST-FC-SHORT", 12)
+        self.assertEqual(list(forecast_df["forecasted_sales"][:3]), [5, 5, 5])
+        self.assertEqual(stockout_date, pd.Timestamp("2021-09-01"))
+        self.assertFalse(os.path.exists(forecasting_logic.get_model_path("TEST-FC-SHORT")))
+
+    def test_model_cache_lru_and_staleness(self):
+        """Testuje eksmisję LRU oraz unieważnianie modeli po zmianie historii sprzedaży."""
+        cache = forecasting_logic.ForecastModelCache(max_entries=2, max_bytes=100)
+        cache.put("A", "fp-a", "model-a", 10)
+        cache.put("B", "fp-b", "model-b", 10)
+        self.assertEqual(cache.get("A", "fp-a"), "model-a")
+        cache.put("C", "fp-c", "model-c", 10)  # B jest najdawniej używany
+        self.assertIsNone(cache.get("B", "fp-b"))
+        self.assertIsNone(cache.get("A", "fp-changed"))
+        cache.put("D", "fp-d", "model-d", 95)  # przekroczony limit bajtów
+        self.assertEqual(len(cache), 1)
+
+        sales = self.monthly_sales_df[self.monthly_sales_df["indeks"] == "TEST-FC-LONG"].set_index("date")["sales"]
+        model = forecasting_logic.get_forecast_model(sales, "TEST-FC-LONG")
+        self.assertIsNotNone(model)
+        self.assertIs(forecasting_logic.get_forecast_model(sales, "TEST-FC-LONG"), model)
+        # W pamięci tylko parametry i szereg (kilka KB), filtr Kalmana dopiero przy prognozie
+        self.assertLess(forecasting_logic.forecast_model_cache.total_bytes, 10_000)
+        self.assertEqual(len(model.get_forecast(steps=6).predicted_mean), 6)
+
+        changed_sales = sales.copy()
+        changed_sales.iloc[-1] += 1
+        self.assertIsNot(forecasting_logic.get_forecast_model(changed_sales, "TEST-FC-LONG"), model)
+        forecasting_logic.forecast_model_cache.invalidate()
+
+    def test_compact_model_roundtrip_and_migration(self):
+        """Testuje odtworzenie modelu z kompaktowego zapisu oraz migrację plików .joblib."""
+        sales = self.monthly_sales_df[self.monthly_sales_df["indeks"] == "TEST-FC-LONG"].set_index("date")["sales"]
+        results = forecasting_logic.fit_forecast_model(sales)
+        expected = results.get_forecast(steps=6).predicted_mean
+
+        forecasting_logic.joblib.dump(results, forecasting_logic.get_legacy_model_path("TEST-FC-LONG"))
+        summary = forecasting_logic.migrate_legacy_forecast_models()
+        self.assertGreaterEqual(summary["migrated"], 1)
+        self.assertFalse(os.path.exists(forecasting_logic.get_legacy_model_path("TEST-FC-LONG")))
+
+        restored = forecasting_logic.load_forecast_model("TEST-FC-LONG")
+        actual = restored.get_forecast(steps=6).predicted_mean
+        pd.testing.assert_series_equal(actual, expected, check_exact=False)
+
+
+class TestSidecar(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.original_snapshot_dir = sidecar.data_processing.SNAPSHOT_DIR
+        sidecar.data_processing.SNAPSHOT_DIR = os.path.join(self.data_dir, "snapshots")
+        self.original_export_dir = sidecar.EXPORT_DIR
+        sidecar.EXPORT_DIR = os.path.join(self.data_dir, "exports")
+        if os.path.exists(ai_logic.MODEL_DIR):
+            shutil.rmtree(ai_logic.MODEL_DIR)
+        self.client = sidecar.app.test_client()
+
+    def tearDown(self):
+        sidecar.data_processing.SNAPSHOT_DIR = self.original_snapshot_dir
+        sidecar.EXPORT_DIR = self.original_export_dir
+        shutil.rmtree(self.data_dir)
+        if os.path.exists(ai_logic.MODEL_DIR):
+            shutil.rmtree(ai_logic.MODEL_DIR)
+
+    def test_dataset_handle_flow(self):
+        """Testuje, czy kolejne wywołania sidecara korzystają z danych zapisanych pod dataset_id."""
+        stany_path = os.path.join(self.data_dir, "stany.csv")
+        pd.DataFrame({
+            "Indeks": [f"SKU-{i}" for i in range(10)],
+            "Name": [f"Produkt {i}" for i in range(10)],
+            "Ilość na stanie": [0, 5, 0, 7, 0, 9, 0, 3, 0, 4],
+        }).to_csv(stany_path, index=False)
+
+        response = self.client.post("/process", json={"stany": stany_path, "limit": 3})
+        self.assertEqual(response.status_code, 200)
+        processed = response.get_json()
+        dataset_id = processed["dataset_id"]
+        self.assertEqual(processed["row_count"], 10)
+        self.assertEqual(len(processed["rows"]), 3)
+
+        self.assertEqual(self.client.post("/predict", json={"dataset_id": dataset_id}).status_code, 409)
+        self.assertEqual(self.client.post("/train", json={"dataset_id": dataset_id}).status_code, 200)
+
+        predicted = self.client.post("/predict", json={"dataset_id": dataset_id}).get_json()
+        self.assertEqual(sum(predicted["ai_alert_counts"].values()), 10)
+        self.assertIn("ai_alert", predicted["rows"][0])
+
+        exported = self.client.post("/export", json={"dataset_id": dataset_id, "path": "raporty/export.csv"}).get_json()
+        self.assertEqual(exported["path"], os.path.realpath(os.path.join(sidecar.EXPORT_DIR, "raporty", "export.csv")))
+        self.assertEqual(len(pd.read_csv(exported["path"])), 10)
+        for outside in (os.path.join(self.data_dir, "export.csv"), "../export.csv"):
+            response = self.client.post("/export", json={"dataset_id": dataset_id, "path": outside})
+            self.assertEqual(response.status_code, 403)
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, "export.csv")))
+
+        self.assertEqual(self.client.post("/forecast", json={"dataset_id": dataset_id, "indeks": "SKU-1"}).status_code, 404)
+        self.assertEqual(self.client.post("/train", json={"dataset_id": "nieznany"}).status_code, 404)
+
+    def test_only_frontend_origins_are_allowed(self):
+        """Testuje, czy sidecar odrzuca żądania stron spoza aplikacji (inny nagłówek Origin)."""
+        stany_path = os.path.join(self.data_dir, "stany.csv")
+        pd.DataFrame({"Indeks": ["A1"], "Name": ["Produkt A"], "Ilość na stanie": [3]}).to_csv(stany_path, index=False)
+
+        stored = len(sidecar.datasets)
+        response = self.client.post("/process", json={"stany": stany_path}, headers={"Origin": "https://example.com"})
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn("Access-Control-Allow-Origin", response.headers)
+        self.assertEqual(len(sidecar.datasets), stored)  # pliku nie wczytano
+        preflight = self.client.options("/process", headers={"Origin": "https://example.com"})
+        self.assertEqual(preflight.status_code, 403)
+
+        response = self.client.post("/process", json={"stany": stany_path}, headers={"Origin": "tauri://localhost"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Access-Control-Allow-Origin"], "tauri://localhost")
+        self.assertEqual(self.client.get("/health").status_code, 200)  # bez Origin - klient lokalny
+
+    def test_feedback_correction_and_drift_retraining(self):
+        """Testuje, czy korekta z /feedback od razu zmienia predykcję, a przekroczenie progu dryfu douczą model."""
+        stany_path = os.path.join(self.data_dir, "stany.csv")
+        pd.DataFrame({
+            "Indeks": [f"SKU-{i}" for i in range(10)],
+            "Name": [f"Produkt {i}" for i in range(10)],
+            "Ilość na stanie": [0, 5, 0, 7, 0, 9, 0, 3, 0, 4],
+        }).to_csv(stany_path, index=False)
+        store = feedback_store.FeedbackStore(os.path.join(self.data_dir, "feedback.sqlite3"))
+        original = sidecar.feedback_store, sidecar.corrections
+        sidecar.feedback_store, sidecar.corrections = store, ai_logic.CorrectionLayer(store)
+        try:
+            dataset_id = self.client.post("/process", json={"stany": stany_path}).get_json()["dataset_id"]
+            self.assertEqual(self.client.post("/train", json={"dataset_id": dataset_id}).status_code, 200)
+            version = ai_logic.load_model()["version"]
+
+            response = self.client.post("/feedback", json={"dataset_id": dataset_id, "indeks": "SKU-1",
+                                                         "alert": "Brak produktu – pilnie BOM!"})
+            self.assertEqual(response.status_code, 200)
+            result = response.get_json()
+            self.assertEqual(result["corrected_rows"], 1)
+            df = sidecar.datasets.get(dataset_id).df
+            row = df[df["indeks"] == "SKU-1"].iloc[0]
+            self.assertEqual((row["ai_alert"], row["ai_confidence"]), ("Brak produktu – pilnie BOM!", 1.0))
+
+            # 1 korekta na 10 wierszy treningowych przekracza próg - trening w tle
+            self.assertIn("retraining", result)
+            job = sidecar.jobs.get(result["retraining"]["job_id"])
+            while not job.finished:
+                job.wait_for_change(job.version)
+            self.assertNotEqual(ai_logic.load_model()["version"], version)
+            self.assertEqual(sidecar.corrections.pending(ai_logic.load_model()), 0)
+
+            missing = self.client.post("/feedback", json={"dataset_id": dataset_id, "indeks": "BRAK", "alert": "OK"})
+            self.assertEqual(missing.status_code, 404)
+        finally:
+            sidecar.feedback_store, sidecar.corrections = original
+
+    def test_train_with_single_alert_type_is_rejected(self):
+        """Testuje, czy trening na danych z jednym typem alertu kończy się błędem 422, a nie 500."""
+        stany_path = os.path.join(self.data_dir, "stany.csv")
+        pd.DataFrame({
+            "Indeks": ["SKU-0", "SKU-1", "SKU-2"],
+            "Name": ["Produkt 0", "Produkt 1", "Produkt 2"],
+            "Ilość na stanie": [5, 7, 9],
+        }).to_csv(stany_path, index=False)
+        dataset_id = self.client.post("/process", json={"stany": stany_path}).get_json()["dataset_id"]
+
+        response = self.client.post("/train", json={"dataset_id": dataset_id})
+        self.assertEqual(response.status_code, 422)
+        self.assertIn("2 różne alerty", response.get_json()["error"])
+        self.assertIsNone(ai_logic.load_model())
+
+    def test_forecasts_without_sarimax(self):
+        """Testuje prognozę krótkiej historii i prognozy wszystkich produktów zbioru przez sidecar."""
+        stany_path = os.path.join(self.data_dir, "stany.csv")
+        pd.DataFrame({
+            "Indeks": ["SKU-0", "SKU-1"],
+            "Name": ["Produkt 0", "Produkt 1"],
+            "Ilość na stanie": [12, 100],
+        }).to_csv(stany_path, index=False)
+        dataset_id = self.client.post("/process", json={"stany": stany_path}).get_json()["dataset_id"]
+        dates = pd.date_range("2023-01-01", periods=6, freq="MS")
+        sidecar.datasets.get(dataset_id).monthly_sales_df = pd.DataFrame({
+            "indeks": ["SKU-0"] * 6 + ["SKU-1"] * 6, "date": list(dates) * 2, "sales": [5] * 6 + [0, 3, 0, 0, 3, 0],
+        })
+
+        forecast = self.client.post("/forecast", json={"dataset_id": dataset_id, "indeks": "SKU-0"})
+        self.assertEqual(forecast.status_code, 200)
+        self.assertEqual(forecast.get_json()["stockout_date"], "2023-09-01")
+
+        batch = self.client.post("/forecast/batch", json={"dataset_id": dataset_id}).get_json()
+        self.assertEqual(batch["product_count"], 2)
+        by_product = {row["indeks"]: row for row in batch["forecasts"]}
+        self.assertEqual(by_product["SKU-0"]["stockout_date"], "2023-09-01")
+        self.assertEqual(by_product["SKU-1"]["method"], "croston")
+        self.assertIsNone(by_product["SKU-1"]["stockout_date"])
+
+    def test_rows_window_sort_filter_search(self):
+        """Testuje okno wierszy z sortowaniem, filtrami i wyszukiwaniem po nazwie/indeksie."""
+        stany_path = os.path.join(self.data_dir, "stany.csv")
+        pd.DataFrame({
+            "Indeks": [f"SKU-{i}" for i in range(30)],
+            "Name": [f"{'Śruba' if i % 3 == 0 else 'Kabel'} M{i}" for i in range(30)],
+            "Ilość na stanie": [i % 4 for i in range(30)],
+        }).to_csv(stany_path, index=False)
+        dataset_id = self.client.post("/process", json={"stany": stany_path}).get_json()["dataset_id"]
+        df = sidecar.datasets.get(dataset_id).df
+
+        page = self.client.post("/rows", json={
+            "dataset_id": dataset_id, "offset": 2, "limit": 5, "sort": "stan", "descending": True,
+        }).get_json()
+        expected = df.sort_values("stan", ascending=False, kind="stable")["indeks"].tolist()[2:7]
+        self.assertEqual([row["indeks"] for row in page["rows"]], expected)
+        self.assertEqual(page["total"], 30)
+
+        filtered = self.client.post("/rows", json={
+            "dataset_id": dataset_id, "limit": 100, "filters": {"alert": df["alert"].iloc[0]}, "search": "śruba m1",
+        }).get_json()
+        expected = df[(df["alert"] == df["alert"].iloc[0]) & df["nazwa"].str.lower().str.contains("śruba m1")]
+        self.assertEqual(sorted(row["indeks"] for row in filtered["rows"]), sorted(expected["indeks"]))
+        self.assertEqual(filtered["total"], len(expected))
+
+        self.assertEqual(self.client.post("/rows", json={"dataset_id": dataset_id, "sort": "brak"}).status_code, 400)
+
+    def test_search_index_with_large_alphabet(self):
+        """Testuje wyszukiwanie, gdy kody trygramów nie mieszczą się w upakowanej parze (trygram, wiersz)."""
+        names = ["".join(chr(0x4E00 + (i * 7 + j) % 1500) for j in range(12)) for i in range(400)]
+        df = pd.DataFrame({"indeks": [f"SKU-{i}" for i in range(400)], "nazwa": names})
+        index = dataset_store.SearchIndex(df)
+        self.assertGreaterEqual(index._alphabet_size ** 3, 2**31)
+        for query in [name[4:8] for name in names[::7]] + ["sku-1", "brak"]:
+            expected = np.flatnonzero((df["nazwa"] + " " + df["indeks"].str.lower()).str.contains(query, regex=False))
+            np.testing.assert_array_equal(index.search(query), expected)
+
+    def test_arrow_stream_negotiation(self):
+        """Testuje, czy odpowiedzi tabelaryczne są dostępne jako strumień Arrow, z JSON-em jako domyślnym formatem."""
+        import pyarrow as pa
+        stany_path = os.path.join(self.data_dir, "stany.csv")
+        pd.DataFrame({
+            "Indeks": ["A1", "B2", "C3"],
+            "Name": ["Produkt A", "Produkt B", "Produkt C"],
+            "Ilość na stanie": [10, 0, 5],
+        }).to_csv(stany_path, index=False)
+        dataset_id = self.client.post("/process", json={"stany": stany_path}).get_json()["dataset_id"]
+
+        as_json = self.client.post("/rows", json={"dataset_id": dataset_id})
+        self.assertEqual(as_json.mimetype, "application/json")
+
+        as_arrow = self.client.post("/rows", json={"dataset_id": dataset_id},
+                                    headers={"Accept": sidecar.ARROW_STREAM_MIMETYPE})
+        self.assertEqual(as_arrow.mimetype, sidecar.ARROW_STREAM_MIMETYPE)
+        table = pa.ipc.open_stream(as_arrow.data).read_all()
+        meta = json.loads(table.schema.metadata[sidecar.ARROW_METADATA_KEY])
+        self.assertEqual(meta["total"], 3)
+        self.assertEqual(table.column("indeks").to_pylist(), [row["indeks"] for row in as_json.get_json()["rows"]])
+        self.assertEqual(table.column("stan").to_pylist(), [row["stan"] for row in as_json.get_json()["rows"]])
+
+    def test_prediction_stream(self):
+        """Testuje strumieniowanie predykcji porcjami (Arrow i linie JSON) i zapis kolumn w zbiorze danych."""
+        import pyarrow as pa
+        stany_path = os.path.join(self.data_dir, "stany.csv")
+        pd.DataFrame({
+            "Indeks": [f"SKU-{i}" for i in range(10)],
+            "Name": [f"Produkt {i}" for i in range(10)],
+            "Ilość na stanie": [0, 5, 0, 7, 0, 9, 0, 3, 0, 4],
+        }).to_csv(stany_path, index=False)
+        dataset_id = self.client.post("/process", json={"stany": stany_path}).get_json()["dataset_id"]
+        self.assertEqual(self.client.post("/predict/stream", json={"dataset_id": dataset_id}).status_code, 409)
+        self.client.post("/train", json={"dataset_id": dataset_id})
+
+        streamed = self.client.post("/predict/stream", json={"dataset_id": dataset_id, "chunk_rows": 4},
+                                    headers={"Accept": sidecar.ARROW_STREAM_MIMETYPE})
+        batches = list(pa.ipc.open_stream(streamed.data))
+        self.assertEqual([batch.num_rows for batch in batches], [4, 4, 2])
+        table = pa.Table.from_batches(batches)
+        self.assertEqual(table.column("row").to_pylist(), list(range(10)))
+        self.assertEqual(json.loads(table.schema.metadata[sidecar.ARROW_METADATA_KEY])["row_count"], 10)
+
+        lines = self.client.post("/predict/stream", json={"dataset_id": dataset_id, "chunk_rows": 4}).get_data(as_text=True)
+        meta, *chunks = [json.loads(line) for line in lines.splitlines()]
+        self.assertEqual([chunk["start"] for chunk in chunks], [0, 4, 8])
+        rows = [row for chunk in chunks for row in chunk["rows"]]
+        self.assertEqual([row["ai_alert"] for row in rows], table.column("ai_alert").to_pylist())
+        self.assertTrue(set(row["ai_alert"] for row in rows) <= set(meta["classes"]))
+
+        stored = sidecar.datasets.get(dataset_id).df
+        self.assertEqual(stored["ai_alert"].tolist(), table.column("ai_alert").to_pylist())
+        self.assertEqual(stored["ai_confidence"].tolist(), table.column("ai_confidence").to_pylist())
+
+    def test_async_job_dedup_and_cancel(self):
+        """Testuje zadania w tle: zwrot id, współdzielenie identycznych zadań i anulowanie."""
+        manager = jobs.JobManager(max_workers=1)
+        release = threading.Event()
+
+        def slow_task(job):
+            job.report(0.5, "połowa")
+            release.wait(5)
+            job.report(0.9)
+            return "gotowe"
+
+        first, created = manager.submit("test", slow_task, key="A")
+        same, created_again = manager.submit("test", slow_task, key="A")
+        queued, _ = manager.submit("test", slow_task, key="B")
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertIs(first, same)
+
+        self.assertEqual(manager.cancel(queued.id).status, jobs.CANCELLED)  # jeszcze w kolejce
+        first.wait_for_change(0, timeout=5)
+        manager.cancel(first.id)  # w trakcie - zatrzyma się na najbliższym punkcie kontrolnym
+        release.set()
+        first.future.result(timeout=5)
+        self.assertEqual(first.status, jobs.CANCELLED)
+
+        again, created = manager.submit("test", slow_task, key="A")
+        self.assertTrue(created)
+        again.future.result(timeout=5)
+        self.assertEqual((again.status, again.result), (jobs.DONE, "gotowe"))
+        manager.shutdown()
+
+        stany_path = os.path.join(self.data_dir, "stany.csv")
+        pd.DataFrame({
+            "Indeks": [f"SKU-{i}" for i in range(10)],
+            "Name": [f"Produkt {i}" for i in range(10)],
+            "Ilość na stanie": [0, 5, 0, 7, 0, 9, 0, 3, 0, 4],
+        }).to_csv(stany_path, index=False)
+        dataset_id = self.client.post("/process", json={"stany": stany_path}).get_json()["dataset_id"]
+        submitted = self.client.post("/train", json={"dataset_id": dataset_id, "async": True})
+        self.assertEqual(submitted.status_code, 202)
+        events = self.client.get(f"/jobs/{submitted.get_json()['job_id']}/events").get_data(as_text=True)
+        final = json.loads(events.strip().split("\n\n")[-1][len("data: "):])
+        self.assertEqual(final["status"], jobs.DONE)
+        self.assertTrue(final["result"]["trained"])
+
+
+@unittest.skipIf(PandasModel is None, "Brak PySide6")
+class TestPandasModel(unittest.TestCase):
+
+    def test_sort_and_display_cache(self):
+        """Testuje sortowanie przez permutację wierszy, teksty komórek i stopniowe dokładanie wierszy."""
+        df = pd.DataFrame({"indeks": ["a", "b", "c", "d", "e"], "stan": [3.0, None, 1.0, 2.0, 1.0]})
+        model = PandasModel(df)
+        self.assertEqual(model.data(model.index(1, 1)), str(df.iloc[1, 1]))
+
+        model.sort(1, Qt.SortOrder.AscendingOrder)
+        self.assertEqual([model.data(model.index(r, 0)) for r in range(5)], ["c", "e", "d", "a", "b"])
+        self.assertEqual(model.sourceRow(0), 2)
+        model.sort(1, Qt.SortOrder.DescendingOrder)
+        self.assertEqual([model.data(model.index(r, 0)) for r in range(5)], ["a", "d", "c", "e", "b"])
+        model.sort(-1)
+        self.assertEqual(model.sourceRow(3), 3)
+        self.assertIs(model._dataframe, df)
+
+        model.FETCH_BATCH = 2
+        model.setDataFrame(df)
+        self.assertEqual(model.rowCount(), 2)
+        while model.canFetchMore():
+            model.fetchMore()
+        self.assertEqual(model.rowCount(), 5)
+
+
+@unittest.skipIf(PandasModel is None, "Brak PySide6")
+class TestTaskScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.scheduler = TaskScheduler(QThreadPool.globalInstance())
+        self.idle = []
+        self.scheduler.idle.connect(lambda: self.idle.append(True))
+
+    def wait_idle(self, timeout=10):
+        deadline = time.time() + timeout
+        while not self.idle and time.time() < deadline:
+            self.app.processEvents()
+            time.sleep(0.005)
+        self.assertTrue(self.idle, "Zadania nie zakończyły się na czas")
+
+    def test_debounce_and_stale_results(self):
+        """Testuje łączenie serii zgłoszeń w jedno zadanie i pomijanie wyników starszych generacji."""
+        created, results = [], []
+        for value in (1, 2, 3):
+            self.scheduler.submit(
+                "processing",
+                lambda value=value: created.append(value) or Worker(lambda v: v * 10, value),
+                on_result=results.append, delay_ms=50,
+            )
+        self.wait_idle()
+        self.assertEqual(created, [3])
+        self.assertEqual(results, [30])
+
+        # Wolniejsze starsze zadanie zostaje anulowane na punkcie kontrolnym, jego wynik nie dociera
+        def slow_task(value, progress_callback=None, should_cancel=None):
+            for step in range(200):
+                checkpoint(should_cancel, progress_callback, step / 200)
+                time.sleep(0.005)
+            return value
+
+        results.clear()
+        self.idle.clear()
+        self.scheduler.submit("processing", lambda: Worker(slow_task, "stary"), on_result=results.append, checkpoints=True)
+        self.scheduler.submit("processing", lambda: Worker(lambda: "nowy"), on_result=results.append)
+        self.wait_idle()
+        self.assertEqual(results, ["nowy"])
+        self.assertFalse(self.scheduler.is_busy())
+
+
+    def test_processing_reuses_stage_cache_through_scheduler(self):
+        """Testuje, czy ponowne przetwarzanie zgłoszone przez planistę korzysta z pamięci podręcznej etapów."""
+        data_dir = tempfile.mkdtemp()
+        stany_path = os.path.join(data_dir, "stany.csv")
+        pd.DataFrame({"Indeks": ["A1", "B2"], "Name": ["Produkt A", "Produkt B"],
+                      "Ilość na stanie": [10, 5]}).to_csv(stany_path, index=False)
+
+        read_paths, results = [], []
+        original_read = data_processing.read_input_file
+        def counting_read(path, *args, **kwargs):
+            read_paths.append(path)
+            return original_read(path, *args, **kwargs)
+        data_processing.read_input_file = counting_read
+        try:
+            for _ in range(2):
+                self.idle.clear()
+                self.scheduler.submit(
+                    "processing",
+                    lambda: Worker(data_processing.process_data_files, stany_path, None, None, None),
+                    on_result=results.append, checkpoints=True,
+                )
+                self.wait_idle()
+            self.assertEqual([path for path in read_paths if path], [stany_path])  # drugi raz bez odczytu
+            self.assertEqual(len(results), 2)
+            pd.testing.assert_frame_equal(results[0][0], results[1][0])
+        finally:
+            data_processing.read_input_file = original_read
+            shutil.rmtree(data_dir)
+
+
+    def test_frames_cross_process_through_shared_memory(self):
+        """Testuje przekazanie ramek do procesu roboczego i z powrotem przez pamięć współdzieloną."""
+        df = pd.DataFrame({
+            "indeks": [f"P{i:05d}" for i in range(20000)],
+            "stan": [float(i % 17) for i in range(20000)],
+        })
+        series = df.set_index("indeks")["stan"]
+        small = pd.DataFrame({"a": [1, 2]})
+
+        packed = shared_frames.pack((df, {"series": series, "small": small}))
+        self.assertIsInstance(packed[0], shared_frames.SharedFrameRef)
+        self.assertIs(packed[1]["small"], small)  # małe ramki są zwyczajnie serializowane
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            result = pool.submit(shared_frames.run_packed, pd.DataFrame.copy, (packed[0],), {}).result()
+        self.assertIsInstance(result, shared_frames.SharedFrameRef)
+        pd.testing.assert_frame_equal(shared_frames.unpack(result), df)
+
+        restored = shared_frames.unpack(packed[1])
+        pd.testing.assert_series_equal(restored["series"], series)
+        shared_frames.release(packed)  # bloki już zwolnione - bez błędu
+        self.assertEqual(glob.glob("/dev/shm/bomos_*"), [])
+
 if __name__ == '__main__':
     unittest.main()
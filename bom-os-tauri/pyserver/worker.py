@@ -1,7 +1,21 @@
-from PySide6.QtCore import QObject, QRunnable, Signal, Slot
+from PySide6.QtCore import QObject, QRunnable, QTimer, Signal, Slot
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
 import traceback
 import sys
 
+try:
+    from . import shared_frames
+    from .common.cancellation import TaskCancelled
+except ImportError:
+    import shared_frames  # type: ignore
+    from common.cancellation import TaskCancelled  # type: ignore
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
 class WorkerSignals(QObject):
     '''
     Defines the signals available from a running worker thread.
@@ -12,10 +26,13 @@ class WorkerSignals(QObject):
         `tuple` (exctype, value, traceback.format_exc())
     result
         `object` data returned from processing, anything
+    progress
+        `float` progress (0..1), `str` description of the current stage
     '''
     finished = Signal()
     error = Signal(tuple)
     result = Signal(object)
+    progress = Signal(float, str)
 
 class Worker(QRunnable):
     '''
@@ -35,15 +52,36 @@ class Worker(QRunnable):
         self.args = args
         self.kwargs = kwargs
         self.signals = WorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        '''
+        Requests cancellation. A worker that has not started yet skips its callback;
+        a running callback stops at its next checkpoint if it was given is_cancelled
+        as should_cancel (see common.cancellation). Either way only finished is emitted.
+        '''
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def report_progress(self, progress, message=""):
+        '''Progress callback for the task function; emitted as the progress signal.'''
+        self.signals.progress.emit(float(progress), message)
 
     @Slot()
     def run(self):
         '''
         Initialise the runner function with passed args, kwargs.
         '''
+        if self.is_cancelled():
+            self.signals.finished.emit()
+            return
         # Retrieve args/kwargs here; and fire processing using them
         try:
             result = self.fn(*self.args, **self.kwargs)
+        except TaskCancelled:
+            pass
         except:
             traceback.print_exc()
             exctype, value = sys.exc_info()[:2]
@@ -52,3 +90,173 @@ class Worker(QRunnable):
             self.signals.result.emit(result)  # Return the result of the processing
         finally:
             self.signals.finished.emit()  # Done
+
+
+def get_process_pool(max_workers=None):
+    '''
+    Persistent pool of worker processes shared by all ProcessWorkers.
+    Processes are spawned (not forked) so they never inherit Qt or thread state.
+    '''
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+
+class ProcessWorker(Worker):
+    '''
+    Worker that runs the callback in the persistent process pool instead of a
+    thread, so CPU-bound work does not hold the GUI's GIL and tasks run in parallel.
+    The callback must be a module-level function. DataFrames in the arguments and
+    the result travel through shared memory (see shared_frames), not pickling.
+    Signals are the same as for Worker. Callables cannot be sent to the worker
+    process, so the task gets no progress or cancellation checkpoints; cancel()
+    only skips a task that has not started yet.
+    '''
+
+    @Slot()
+    def run(self):
+        if self.is_cancelled():
+            self.signals.finished.emit()
+            return
+        packed_args = packed_kwargs = None
+        try:
+            packed_args = shared_frames.pack(self.args)
+            packed_kwargs = shared_frames.pack(self.kwargs)
+            future = get_process_pool().submit(shared_frames.run_packed, self.fn, packed_args, packed_kwargs)
+            result = shared_frames.unpack(future.result())
+        except:
+            # Blocks of arguments the worker process never read are freed here
+            shared_frames.release((packed_args, packed_kwargs))
+            if isinstance(sys.exc_info()[1], BrokenProcessPool):
+                shutdown_process_pool()  # a crashed worker process; the next task starts a fresh pool
+            traceback.print_exc()
+            exctype, value = sys.exc_info()[:2]
+            self.signals.error.emit((exctype, value, traceback.format_exc()))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class TaskScheduler(QObject):
+    '''
+    Runs Workers keyed by task kind (e.g. "processing", "training").
+
+    Every submit() starts a new generation of its kind: a submission still waiting
+    for its debounce delay is replaced (so a burst becomes one run built by the
+    last factory), a running worker of that kind is cancelled, and result, error
+    and progress signals of any older generation are dropped - a slower earlier
+    run can no longer overwrite a newer result. idle is emitted when no task is
+    running or waiting.
+    '''
+    idle = Signal()
+
+    def __init__(self, threadpool, parent=None):
+        super().__init__(parent)
+        self.threadpool = threadpool
+        self._generations = {}  # kind -> latest generation
+        self._pending = {}  # kind -> (generation, make_worker, callbacks, checkpoints) waiting for its timer
+        self._timers = {}  # kind -> debounce QTimer
+        self._running = {}  # id(worker) -> (worker, kind, generation); also keeps the workers alive
+
+    def submit(self, kind, make_worker, on_result=None, on_error=None, on_progress=None,
+               delay_ms=0, checkpoints=False):
+        '''
+        Schedules make_worker() - called only when the task actually starts, so a
+        debounced task sees the latest state. checkpoints=True passes the worker's
+        report_progress/is_cancelled to the task as progress_callback/should_cancel
+        (thread workers only). Returns the generation of the submitted task.
+        '''
+        generation = self._generations.get(kind, 0) + 1
+        self._generations[kind] = generation
+        self._cancel_running(kind)
+        self._pending[kind] = (generation, make_worker, (on_result, on_error, on_progress), checkpoints)
+        timer = self._timer(kind)
+        if delay_ms > 0:
+            timer.start(delay_ms)  # restarting the timer is the debounce
+        else:
+            timer.stop()
+            self._start(kind)
+        return generation
+
+    def cancel(self, kind):
+        '''Cancels the pending and running tasks of a kind; their signals are dropped.'''
+        self._generations[kind] = self._generations.get(kind, 0) + 1
+        self._pending.pop(kind, None)
+        if kind in self._timers:
+            self._timers[kind].stop()
+        self._cancel_running(kind)
+        if not self.is_busy():
+            self.idle.emit()
+
+    def is_current(self, kind, generation):
+        return self._generations.get(kind) == generation
+
+    def is_busy(self, kind=None):
+        if kind is None:
+            return bool(self._pending or self._running)
+        return kind in self._pending or any(k == kind for _, k, _ in self._running.values())
+
+    def _timer(self, kind):
+        timer = self._timers.get(kind)
+        if timer is None:
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.timeout.connect(lambda: self._start(kind))
+            self._timers[kind] = timer
+        return timer
+
+    def _cancel_running(self, kind):
+        for worker, running_kind, _ in self._running.values():
+            if running_kind == kind:
+                worker.cancel()
+
+    def _start(self, kind):
+        pending = self._pending.pop(kind, None)
+        if pending is None:
+            return
+        generation, make_worker, (on_result, on_error, on_progress), checkpoints = pending
+        try:
+            worker = make_worker()
+        except Exception:
+            traceback.print_exc()
+            exctype, value = sys.exc_info()[:2]
+            self._deliver(kind, generation, on_error, (exctype, value, traceback.format_exc()))
+            if not self.is_busy():
+                self.idle.emit()
+            return
+        if checkpoints and not isinstance(worker, ProcessWorker):
+            worker.kwargs["progress_callback"] = worker.report_progress
+            worker.kwargs["should_cancel"] = worker.is_cancelled
+
+        worker.signals.result.connect(lambda result: self._deliver(kind, generation, on_result, result))
+        worker.signals.error.connect(lambda error: self._deliver(kind, generation, on_error, error))
+        worker.signals.progress.connect(
+            lambda progress, message: self._deliver(kind, generation, on_progress, progress, message, quiet=True)
+        )
+        worker.signals.finished.connect(lambda: self._finished(worker))
+        self._running[id(worker)] = (worker, kind, generation)
+        self.threadpool.start(worker)
+
+    def _deliver(self, kind, generation, callback, *args, quiet=False):
+        if not self.is_current(kind, generation):
+            if not quiet:
+                print(f"Pominięto wynik nieaktualnego zadania '{kind}' (generacja {generation}).")
+            return
+        if callback is not None:
+            callback(*args)
+
+    def _finished(self, worker):
+        self._running.pop(id(worker), None)
+        if not self.is_busy():
+            self.idle.emit()
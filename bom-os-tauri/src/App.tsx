@@ -1,8 +1,22 @@
-
 import React, { useState } from 'react'
+import { RecordBatchReader, tableFromIPC } from 'apache-arrow'
 
 type TableRow = Record<string, any>
 
+const API = 'http://127.0.0.1:5005'
+const ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+const INPUT_FILES = ['stany', 'bomy', 'minimum', 'sprzedaz'] as const
+const PAGE_SIZE = 100
+
+type RowQuery = {
+  offset: number
+  sort: string | null
+  descending: boolean
+  filters: Record<string, string>
+  search: string
+}
+const FIRST_PAGE: RowQuery = { offset: 0, sort: null, descending: false, filters: {}, search: '' }
+
 async function postJSON(url: string, payload: any) {
   const res = await fetch(url, {
     method: 'POST',
@@ -13,19 +27,134 @@ async function postJSON(url: string, payload: any) {
   return res.json()
 }
 
+// Tabele przychodzą kolumnowo (Arrow IPC) – metadane odpowiedzi są w metadanych schematu.
+// Serwer bez pyarrow odpowiada zwykłym JSON-em, który też jest obsługiwany.
+async function postTable(url: string, payload: any) {
+  const res = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'Accept': `${ARROW_STREAM}, application/json;q=0.9` },
+    body: JSON.stringify(payload)
+  })
+  if (!res.ok) throw new Error(await res.text())
+  if (!(res.headers.get('Content-Type') || '').startsWith(ARROW_STREAM)) return res.json()
+  const table = tableFromIPC(new Uint8Array(await res.arrayBuffer()))
+  const meta = JSON.parse(table.schema.metadata.get('bom_os') || '{}')
+  return { ...meta, rows: table.toArray().map(row => row.toJSON()) }
+}
+
+// Predykcja przychodzi porcjami (paczki Arrow albo linie JSON) – onRows dostaje każdą gotową porcję,
+// a wynikiem są metadane odpowiedzi (klasy, ważności cech modelu)
+async function streamPredictions(payload: any, onRows: (rows: TableRow[]) => void): Promise<any> {
+  const res = await fetch(`${API}/predict/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'Accept': `${ARROW_STREAM}, application/x-ndjson;q=0.9` },
+    body: JSON.stringify(payload)
+  })
+  if (!res.ok) throw new Error(await res.text())
+  if ((res.headers.get('Content-Type') || '').startsWith(ARROW_STREAM)) {
+    const reader = await RecordBatchReader.from(res)
+    await reader.open()  // schemat z metadanymi jest znany przed pierwszą paczką
+    const meta = JSON.parse(reader.schema.metadata.get('bom_os') || '{}')
+    for await (const batch of reader) onRows(batch.toArray().map(row => row.toJSON()))
+    return meta
+  }
+  const lines = res.body!.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let meta: any = null
+  for (let chunk = await lines.read(); !chunk.done; chunk = await lines.read()) {
+    buffer += decoder.decode(chunk.value, { stream: true })
+    const complete = buffer.split('\n')
+    buffer = complete.pop() || ''
+    for (const line of complete.filter(Boolean)) {
+      if (meta === null) meta = JSON.parse(line)  // pierwsza linia to metadane
+      else onRows(JSON.parse(line).rows)
+    }
+  }
+  return meta || {}
+}
+
 export default function App() {
+  const [paths, setPaths] = useState<Record<string, string>>({ stany: '', bomy: '', minimum: '', sprzedaz: '' })
+  // Przetworzona tabela zostaje na serwerze – kolejne wywołania podają tylko jej identyfikator
+  const [datasetId, setDatasetId] = useState<string | null>(null)
+  const [rowCount, setRowCount] = useState<number>(0)
+  const [facets, setFacets] = useState<Record<string, string[]>>({})
+  const [query, setQuery] = useState<RowQuery>(FIRST_PAGE)
+  const [total, setTotal] = useState<number>(0)
   const [rows, setRows] = useState<TableRow[]>([])
   const [status, setStatus] = useState<string>('Gotowy')
   const [aiInfo, setAiInfo] = useState<any>(null)
+  const [selectedRowIndex, setSelectedRowIndex] = useState<number | null>(null)
+  const [jobId, setJobId] = useState<string | null>(null)
+
+  // Trenowanie i prognoza działają na serwerze jako zadania w tle – postęp przychodzi strumieniem zdarzeń
+  const runJob = async (url: string, payload: any, label: string) => {
+    const job = await postJSON(url, { ...payload, async: true })
+    setJobId(job.job_id)
+    return new Promise<any>((resolve, reject) => {
+      const events = new EventSource(`${API}/jobs/${job.job_id}/events`)
+      events.onmessage = (e) => {
+        const state = JSON.parse(e.data)
+        setStatus(`${label} ${Math.round(state.progress * 100)}% ${state.message}`)
+        if (['done', 'failed', 'cancelled'].includes(state.status)) {
+          events.close()
+          setJobId(null)
+          if (state.status === 'done') resolve(state.result)
+          else reject(new Error(state.error || 'Zadanie zostało anulowane'))
+        }
+      }
+      events.onerror = () => {
+        events.close()
+        setJobId(null)
+        reject(new Error('Utracono połączenie z zadaniem'))
+      }
+    })
+  }
+
+  const handleCancel = async () => {
+    if (!jobId) return
+    try {
+      await postJSON(`${API}/jobs/${jobId}/cancel`, {})
+    } catch (e:any) {
+      setStatus(e.message)
+    }
+  }
+
+  // Tabela pokazuje tylko okno wierszy; sortowanie, filtry i wyszukiwanie liczy serwer
+  const loadRows = async (next: RowQuery, id: string | null = datasetId) => {
+    if (!id) return
+    setQuery(next)
+    try {
+      const data = await postTable(`${API}/rows`, { dataset_id: id, limit: PAGE_SIZE, ...next })
+      setRows(data.rows || [])
+      setTotal(data.total ?? 0)
+      setSelectedRowIndex(null)
+    } catch (e:any) {
+      setStatus(e.message)
+    }
+  }
+
+  const toggleSort = (column: string) => {
+    const descending = query.sort === column ? !query.descending : false
+    loadRows({ ...query, offset: 0, sort: column, descending })
+  }
+
+  const setFilter = (column: string, value: string) => {
+    loadRows({ ...query, offset: 0, filters: { ...query.filters, [column]: value } })
+  }
 
   const handleProcess = async () => {
     setStatus('Przetwarzanie...')
     try {
-      // w dev – podpinamy się do localhost:5005
-      const data = await postJSON('http://127.0.0.1:5005/process', {
-        stany: null, bomy: null, minimum: null, sprzedaz: null
-      })
+      const data = await postTable(`${API}/process`, { ...paths, limit: PAGE_SIZE })
+      setDatasetId(data.dataset_id)
+      setRowCount(data.row_count ?? 0)
+      setFacets(data.facets || {})
+      setQuery(FIRST_PAGE)
+      setTotal(data.row_count ?? 0)
       setRows(data.rows || [])
+      setSelectedRowIndex(null)
       setStatus('OK')
     } catch (e:any) {
       setStatus(e.message)
@@ -33,9 +162,13 @@ export default function App() {
   }
 
   const handleTrain = async () => {
+    if (!datasetId) {
+      setStatus('Błąd: Najpierw przetwórz pliki.')
+      return
+    }
     setStatus('Trenowanie...')
     try {
-      const data = await postJSON('http://127.0.0.1:5005/train', {})
+      const data = await runJob(`${API}/train`, { dataset_id: datasetId }, 'Trenowanie...')
       setAiInfo(data)
       setStatus('Model zaktualizowany')
     } catch (e:any) {
@@ -44,11 +177,29 @@ export default function App() {
   }
 
   const handlePredict = async () => {
+    if (!datasetId) {
+      setStatus('Błąd: Najpierw przetwórz pliki.')
+      return
+    }
     setStatus('Predykcja...')
     try {
-      const data = await postJSON('http://127.0.0.1:5005/predict', { rows })
-      setRows(data.rows || rows)
-      setAiInfo({ importances: data.importances || null })
+      // Widoczne wiersze dostają etykiety, gdy tylko gotowa jest ich porcja
+      let scored = 0
+      const counts: Record<string, number> = {}
+      const meta = await streamPredictions({ dataset_id: datasetId }, chunk => {
+        scored += chunk.length
+        const byIndeks = new Map(chunk.map(r => [String(r.indeks), r]))
+        chunk.forEach(r => { counts[r.ai_alert] = (counts[r.ai_alert] || 0) + 1 })
+        setRows(prev => prev.map(r => {
+          const p = byIndeks.get(String(r.indeks))
+          return p ? { ...r, ai_alert: p.ai_alert, ai_confidence: p.ai_confidence } : r
+        }))
+        setStatus(`Predykcja... ${scored} z ${rowCount}`)
+      })
+      const described = (await (await fetch(`${API}/datasets`)).json()).find((d: any) => d.dataset_id === datasetId)
+      setFacets(described?.facets || facets)
+      await loadRows(query)
+      setAiInfo({ importances: meta.importances, ai_alert_counts: counts })
       setStatus('Gotowe')
     } catch (e:any) {
       setStatus(e.message)
@@ -56,12 +207,15 @@ export default function App() {
   }
 
   const handleForecast = async () => {
+    if (selectedRowIndex === null) {
+      setStatus('Błąd: Proszę zaznaczyć wiersz w tabeli, aby wygenerować prognozę.')
+      return
+    }
     setStatus('Prognozowanie...')
     try {
-      if (!rows.length) throw new Error('Brak danych')
-      const indeks = rows[0]?.indeks
-      const stan = rows[0]?.stan ?? 0
-      const data = await postJSON('http://127.0.0.1:5005/forecast', { indeks, stan })
+      const selectedRow = rows[selectedRowIndex]
+      if (!selectedRow) throw new Error('Brak danych w zaznaczonym wierszu')
+      const data = await runJob(`${API}/forecast`, { dataset_id: datasetId, indeks: selectedRow?.indeks }, 'Prognozowanie...')
       setAiInfo({ forecast: data })
       setStatus('Gotowe')
     } catch (e:any) {
@@ -72,32 +226,75 @@ export default function App() {
   return (
     <div style={{ padding: 16, fontFamily: 'Inter, system-ui, sans-serif' }}>
       <h1>BOM OS – Dashboard (Tauri + React + Flask)</h1>
+      <div style={{ display:'flex', gap:8, marginBottom:12 }}>
+        {INPUT_FILES.map(name => (
+          <input
+            key={name}
+            placeholder={`Ścieżka: ${name}.csv`}
+            value={paths[name]}
+            onChange={e => setPaths({ ...paths, [name]: e.target.value })}
+          />
+        ))}
+      </div>
       <div style={{ display:'flex', gap:8, marginBottom:12 }}>
         <button onClick={handleProcess}>1. Przetwórz</button>
         <button onClick={handleTrain}>2. Trenuj AI</button>
         <button onClick={handlePredict}>3. Predykcja</button>
         <button onClick={handleForecast}>4. Prognoza</button>
+        <button onClick={handleCancel} disabled={!jobId}>Anuluj</button>
       </div>
       <div style={{ marginBottom:12 }}>
         <strong>Status:</strong> {status}
+        {datasetId && <span> – wiersze {total ? query.offset + 1 : 0}–{query.offset + rows.length} z {total} (wszystkich: {rowCount})</span>}
       </div>
 
+      {datasetId && (
+        <div style={{ display:'flex', gap:8, marginBottom:12 }}>
+          <input
+            placeholder='Szukaj w nazwie / indeksie'
+            value={query.search}
+            onChange={e => loadRows({ ...query, offset: 0, search: e.target.value })}
+          />
+          {Object.entries(facets).map(([column, values]) => (
+            <select key={column} value={query.filters[column] ?? ''} onChange={e => setFilter(column, e.target.value)}>
+              <option value=''>{column}: wszystkie</option>
+              {values.map(v => <option key={v} value={v}>{v}</option>)}
+            </select>
+          ))}
+          <button disabled={query.offset === 0} onClick={() => loadRows({ ...query, offset: Math.max(0, query.offset - PAGE_SIZE) })}>‹ Poprzednie</button>
+          <button disabled={query.offset + PAGE_SIZE >= total} onClick={() => loadRows({ ...query, offset: query.offset + PAGE_SIZE })}>Następne ›</button>
+        </div>
+      )}
+
       <div style={{ maxHeight: 300, overflow: 'auto', border: '1px solid #ddd' }}>
-        <table cellPadding={6}>
+        <table cellPadding={6} style={{ width: '100%', borderCollapse: 'collapse' }}>
           <thead>
-            <tr>{rows[0] && Object.keys(rows[0]).map(key => <th key={key}>{key}</th>)}</tr>
+            <tr style={{ textAlign: 'left', background: '#f6f8fa' }}>
+              {rows[0] && Object.keys(rows[0]).map(key => (
+                <th key={key} style={{ padding: '8px', cursor: 'pointer' }} onClick={() => toggleSort(key)}>
+                  {key}{query.sort === key ? (query.descending ? ' ▼' : ' ▲') : ''}
+                </th>
+              ))}
+            </tr>
           </thead>
           <tbody>
             {rows.map((r, i) => (
-              <tr key={i}>
-                {Object.keys(rows[0] || {}).map(k => <td key={k + i}>{String(r[k])}</td>)}
+              <tr
+                key={i}
+                onClick={() => setSelectedRowIndex(i)}
+                style={{
+                  cursor: 'pointer',
+                  backgroundColor: selectedRowIndex === i ? '#e0f7fa' : 'transparent'
+                }}
+              >
+                {Object.keys(rows[0] || {}).map(k => <td key={k + i} style={{ padding: '8px', borderBottom: '1px solid #eee' }}>{String(r[k])}</td>)}
               </tr>
             ))}
           </tbody>
         </table>
       </div>
 
-      <pre style={{ background:'#f6f8fa', padding:12, borderRadius:8 }}>
+      <pre style={{ background:'#f6f8fa', padding:12, borderRadius:8, marginTop: 12 }}>
         {JSON.stringify(aiInfo, null, 2)}
       </pre>
     </div>